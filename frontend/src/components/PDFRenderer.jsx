@@ -183,6 +183,8 @@ function buildHighlightedTextWithSpacing(selectedSpans) {
   return text.trim();
 }
 
+const EMPTY_HIGHLIGHTS = [];
+
 /** Compute rects from spans in unscaled (PDF page) coordinates.
  *  Uses lineIndex grouping so each rect covers exactly one visual line. */
 function getRectsFromSpans(spans, scale) {
@@ -226,6 +228,17 @@ export default function PDFRenderer({
   const [numPages, setNumPages] = useState(0);
   const [loading, setLoading] = useState(true);
 
+  // Group once per highlights change instead of filtering the full list for every page
+  const highlightsByPage = useMemo(() => {
+    const byPage = new Map();
+    for (const h of highlights) {
+      const list = byPage.get(h.page_number);
+      if (list) list.push(h);
+      else byPage.set(h.page_number, [h]);
+    }
+    return byPage;
+  }, [highlights]);
+
   useEffect(() => {
     if (!pdfData) return;
     let cancelled = false;
@@ -265,7 +278,7 @@ export default function PDFRenderer({
           pdf={pdf}
           pageNumber={i + 1}
           scale={scale}
-          pageHighlights={highlights.filter((h) => h.page_number === i + 1)}
+          pageHighlights={highlightsByPage.get(i + 1) ?? EMPTY_HIGHLIGHTS}
           hoveredHighlightId={hoveredHighlightId}
           activeHighlightId={activeHighlightId}
           selectionForPicker={selectionForPicker}
@@ -514,7 +527,12 @@ function PDFPage({
             : hexToRgba(hex, 0.18);
           const hasActions = onHighlightEdit || onHighlightDelete;
           let bbox = null;
-          if (rects.length > 0) {
+          if (rects.length > 0 && h.bbox_top != null) {
+            // Bounding box computed server-side on write (PDF units)
+            const left = h.bbox_left * scale;
+            const top = h.bbox_top * scale;
+            bbox = { left, top, width: h.bbox_right * scale - left, height: h.bbox_bottom * scale - top };
+          } else if (rects.length > 0) {
             const left = Math.min(...rects.map((r) => r.x)) * scale;
             const top = Math.min(...rects.map((r) => r.y)) * scale;
             const right = Math.max(...rects.map((r) => (r.x || 0) + (r.width || 0))) * scale;
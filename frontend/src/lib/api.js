@@ -59,10 +59,74 @@ export const lensesAPI = {
 };
 
 export const libraryAPI = {
-  get: () => api.get('/library/'),
+  /**
+   * Pass { page_size, cursor } for a keyset-paginated page (response includes next_cursor).
+   * { shape: 'normalized' }: rows carry ids and keys; documents, projects and presets come as maps by id.
+   */
+  get: (params) => api.get('/library/', { params }),
+  /**
+   * Ranked server-side search. Params: q, color / project / document (arrays or comma lists),
+   * created_after, created_before, page, page_size. Response: highlights (with rank and
+   * snippet), total_highlights, next_page, facets { colors, projects }, projects.
+   */
+  search: ({ color, project, document, ...params } = {}) =>
+    api.get('/library/', {
+      params: {
+        ...params,
+        color: [].concat(color ?? []).join(',') || undefined,
+        project: [].concat(project ?? []).join(',') || undefined,
+        document: [].concat(document ?? []).join(',') || undefined,
+      },
+    }),
+  /**
+   * The whole library read as a stream (NDJSON), for large exports: resolves to
+   * { projects, total_highlights, highlights, cursor }. onProgress(loaded, total) runs as rows arrive.
+   * Uses fetch because axios cannot read a response body incrementally in the browser.
+   */
+  stream: async ({ onProgress, signal } = {}) => {
+    const token = useAuthStore.getState().token;
+    const res = await fetch(`${api.defaults.baseURL}/library/`, {
+      headers: { Accept: 'application/x-ndjson', ...(token ? { Authorization: `Token ${token}` } : {}) },
+      signal,
+    });
+    if (!res.ok) {
+      if (res.status === 401) useAuthStore.getState().logout();
+      throw new Error(`Library request failed (${res.status})`);
+    }
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+    let header = null;
+    const highlights = [];
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      const lines = (buffer + (value ?? '')).split('\n');
+      buffer = done ? '' : lines.pop();
+      for (const line of lines) {
+        if (!line) continue;
+        if (header) highlights.push(JSON.parse(line));
+        else header = JSON.parse(line);
+      }
+      onProgress?.(highlights.length, header?.total_highlights ?? 0);
+      if (done) break;
+    }
+    return { ...header, highlights, cursor: Number(res.headers.get('X-Highlights-Cursor')) };
+  },
+  /** Highlights changed since `since` (cursor from X-Highlights-Cursor or a previous call), plus deleted ids. */
+  changes: (since, params = {}) => api.get('/library/changes/', { params: { since, ...params } }),
+  /** Search-box completions for the last word of `prefix`: { terms: [{ term, count }] }, most frequent first. */
+  terms: (prefix, limit = 8) => api.get('/library/terms/', { params: { prefix, limit } }),
+};
+
+/** Saved Library searches ({ name, query, colors, projects }); responses include result_count. */
+export const savedSearchesAPI = {
+  list: () => api.get('/saved-searches/'),
+  create: (data) => api.post('/saved-searches/', data),
+  update: (id, data) => api.patch(`/saved-searches/${id}/`, data),
+  delete: (id) => api.delete(`/saved-searches/${id}/`),
 };
 
 export const documentsAPI = {
+  /** { shape: 'normalized' }: { results, presets } with each document's effective_preset id instead of the embedded lens. */
   list: (params) => api.get('/documents/', { params }),
   get: (id) => api.get(`/documents/${id}/`),
   create: (data) => api.post('/documents/', data),
@@ -78,15 +142,40 @@ export const documentsAPI = {
   delete: (id) => api.delete(`/documents/${id}/`),
   /** Permanently remove a removed PDF and all its highlights/notes. Only for docs with deleted_at set. */
   remove: (id) => api.post(`/documents/${id}/remove/`),
+  /** Move documents (with highlights/notes) into another project without re-uploading. */
+  move: (documentIds, projectId) =>
+    api.post('/documents/move/', { document_ids: documentIds, project: projectId }),
+  /** Copy documents into another project, reusing stored PDF bytes. */
+  copy: (documentIds, projectId, { includeHighlights = true } = {}) =>
+    api.post('/documents/copy/', {
+      document_ids: documentIds,
+      project: projectId,
+      include_highlights: includeHighlights,
+    }),
   /** Generate (or return existing) public share link for a document's summary. */
   sharePublic: (id) => api.post(`/documents/${id}/share/`),
-  highlights: (id) => api.get(`/documents/${id}/highlights/`),
+  /** Document, highlights, change cursor and account flags in one request; send If-None-Match to revalidate. */
+  bootstrap: (id, { etag, ...params } = {}) =>
+    api.get(`/documents/${id}/bootstrap/`, {
+      params,
+      headers: etag ? { 'If-None-Match': etag } : {},
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    }),
+  highlights: (id, params) => api.get(`/documents/${id}/highlights/`, { params }),
+  /** Counts per colour and page, note count and last activity, without highlight bodies. */
+  aggregates: (id) => api.get(`/documents/${id}/aggregates/`),
+  /** Highlights changed since `since` for one document, plus deleted ids. */
+  highlightChanges: (id, since, params = {}) =>
+    api.get(`/documents/${id}/highlights/changes/`, { params: { since, ...params } }),
   createHighlight: (documentId, data) =>
     api.post(`/documents/${documentId}/highlights/`, data),
   updateHighlight: (documentId, highlightId, data) =>
     api.patch(`/documents/${documentId}/highlights/${highlightId}/`, data),
   deleteHighlight: (documentId, highlightId) =>
     api.delete(`/documents/${documentId}/highlights/${highlightId}/`),
+  /** Apply ordered create/update/note/delete operations to one document in a single request. */
+  batchHighlights: (documentId, operations) =>
+    api.post(`/documents/${documentId}/highlights/batch/`, { operations }),
 };
 
 export const publicDocumentsAPI = {
@@ -0,0 +1,22 @@
+/**
+ * Expand position_data from list responses requested with ?rects=packed:
+ * { rects_packed: base64 little-endian int32 [x, y, width, height, ...], scale } -> { rects: [...] }.
+ * Any other shape is returned unchanged.
+ */
+export function unpackPositionData(positionData) {
+  if (!positionData || typeof positionData.rects_packed !== 'string') return positionData;
+  const { rects_packed: packed, scale = 100, ...rest } = positionData;
+  const bin = atob(packed);
+  const view = new DataView(new ArrayBuffer(bin.length));
+  for (let i = 0; i < bin.length; i++) view.setUint8(i, bin.charCodeAt(i));
+  const rects = [];
+  for (let off = 0; off + 16 <= bin.length; off += 16) {
+    rects.push({
+      x: view.getInt32(off, true) / scale,
+      y: view.getInt32(off + 4, true) / scale,
+      width: view.getInt32(off + 8, true) / scale,
+      height: view.getInt32(off + 12, true) / scale,
+    });
+  }
+  return { ...rest, rects };
+}
@@ -33,9 +33,11 @@ function groupHighlights(highlights) {
 
 export default function ExportDataPage() {
   const [docxBusy, setDocxBusy] = useState(false);
+  const [progress, setProgress] = useState(null);
   const { data, isLoading, error } = useQuery({
-    queryKey: ['library'],
-    queryFn: async () => (await libraryAPI.get()).data,
+    queryKey: ['library', 'export'],
+    queryFn: ({ signal }) =>
+      libraryAPI.stream({ signal, onProgress: (loaded, total) => setProgress({ loaded, total }) }),
   });
 
   const highlights = data?.highlights ?? [];
@@ -191,6 +193,7 @@ export default function ExportDataPage() {
           <div className="mt-10 flex items-center gap-2 text-slate-500 text-sm">
             <Loader2 className="w-5 h-5 animate-spin" />
             Loading your library…
+            {progress?.total > 0 && ` ${progress.loaded.toLocaleString()} of ${progress.total.toLocaleString()}`}
           </div>
         )}
 
@@ -1,7 +1,7 @@
 import { useState, useMemo, useEffect, useRef, useCallback } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { useQuery } from '@tanstack/react-query';
-import { libraryAPI, lensesAPI } from '../lib/api';
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient, keepPreviousData } from '@tanstack/react-query';
+import { libraryAPI, lensesAPI, savedSearchesAPI } from '../lib/api';
 import AppHeader from '../components/AppHeader';
 import WiseMarkDropdown from '../components/WiseMarkDropdown';
 import { normalizePdfText } from '../lib/pdfText';
@@ -32,23 +32,47 @@ function highlightMatch(str, query) {
   );
 }
 
-const SAVED_SEARCHES_KEY = 'wisemark_saved_searches';
+/** Render server snippet segments ([[text, matched], ...]) with matched terms marked. */
+function renderSegments(segments) {
+  return segments.map(([part, matched], i) =>
+    matched
+      ? <mark key={i} className="bg-yellow-200 rounded-sm px-px">{normalizePdfText(part)}</mark>
+      : normalizePdfText(part)
+  );
+}
+
+const SEARCH_PAGE_SIZE = 50;
+
+// Saved searches used to live in localStorage; they are moved to the server once and the key removed.
+const LEGACY_SAVED_SEARCHES_KEY = 'wisemark_saved_searches';
+let legacySavedSearchesMoving = false; // one move at a time (StrictMode runs effects twice)
 
-function loadSavedSearches() {
+function readLegacySavedSearches() {
   try {
-    const raw = localStorage.getItem(SAVED_SEARCHES_KEY);
-    if (raw != null) {
-      const parsed = JSON.parse(raw);
-      if (Array.isArray(parsed)) return parsed;
-    }
+    const raw = localStorage.getItem(LEGACY_SAVED_SEARCHES_KEY);
+    const parsed = raw != null ? JSON.parse(raw) : null;
+    if (Array.isArray(parsed)) return parsed;
+    localStorage.removeItem(LEGACY_SAVED_SEARCHES_KEY);
+  } catch (_) {}
+  return [];
+}
+
+/** Keep only the searches still to move; the key goes once none are left. */
+function keepLegacySavedSearches(remaining) {
+  try {
+    if (remaining.length) localStorage.setItem(LEGACY_SAVED_SEARCHES_KEY, JSON.stringify(remaining));
+    else localStorage.removeItem(LEGACY_SAVED_SEARCHES_KEY);
   } catch (_) {}
-  return [{ id: 's1', name: 'Margin compression', query: 'margin compression', filters: { categories: [] } }];
 }
 
-function saveSavedSearches(list) {
-  localStorage.setItem(SAVED_SEARCHES_KEY, JSON.stringify(list));
+/** The word being typed at the end of the search box, for completions. */
+function lastWord(str) {
+  const m = str.match(/([^\s"()-]+)$/);
+  return m ? m[1] : '';
 }
 
+const SUGGEST_DELAY_MS = 150;
+
 function ResultCard({ ann, query, hovered, onHover, onLeave, showDoc, onNavigate }) {
   const [copied, setCopied] = useState(false);
   const hex = ann.color_hex || '#94a3b8';
@@ -81,7 +105,9 @@ function ResultCard({ ann, query, hovered, onHover, onLeave, showDoc, onNavigate
           className={`text-xs leading-snug ${text.body} whitespace-pre-line`}
           style={{ fontFamily: "'DM Sans', sans-serif" }}
         >
-          &ldquo;{highlightMatch(normalizePdfText(ann.highlighted_text), query)}&rdquo;
+          &ldquo;{ann.snippet?.text
+            ? renderSegments(ann.snippet.text)
+            : highlightMatch(normalizePdfText(ann.highlighted_text), query)}&rdquo;
         </p>
 
         {ann.note?.content && (
@@ -89,7 +115,9 @@ function ResultCard({ ann, query, hovered, onHover, onLeave, showDoc, onNavigate
             className={`mt-2 text-[11.5px] ${text.muted} leading-snug italic whitespace-pre-line`}
             style={{ fontFamily: "'DM Sans', sans-serif" }}
           >
-            {highlightMatch(normalizePdfText(ann.note.content), query)}
+            {ann.snippet?.note
+              ? renderSegments(ann.snippet.note)
+              : highlightMatch(normalizePdfText(ann.note.content), query)}
           </p>
         )}
 
@@ -136,16 +164,18 @@ function ResultCard({ ann, query, hovered, onHover, onLeave, showDoc, onNavigate
   );
 }
 
-function InsightPanel({ results, colorMap }) {
+function InsightPanel({ results, colorMap, facets }) {
   const catCounts = {};
   const docCounts = {};
   const projectCounts = {};
 
   results.forEach((a) => {
-    catCounts[a.color] = (catCounts[a.color] || 0) + 1;
+    if (!facets) catCounts[a.color] = (catCounts[a.color] || 0) + 1;
     docCounts[a.document_id] = (docCounts[a.document_id] || 0) + 1;
     projectCounts[a.project_id] = (projectCounts[a.project_id] || 0) + 1;
   });
+  // Server facets count every match, not just the pages loaded so far.
+  facets?.colors.forEach((f) => { catCounts[f.color] = f.count; });
 
   const topDocs = Object.entries(docCounts)
     .sort(([, a], [, b]) => b - a)
@@ -203,6 +233,7 @@ function InsightPanel({ results, colorMap }) {
 
 export default function LibraryPage() {
   const navigate = useNavigate();
+  const queryClient = useQueryClient();
   const inputRef = useRef(null);
   const [query, setQuery] = useState('');
   const [activeQuery, setActiveQuery] = useState('');
@@ -210,6 +241,8 @@ export default function LibraryPage() {
   const [projectFilters, setProjectFilters] = useState([]);
   const [groupBy, setGroupBy] = useState('flat');
   const [hoveredId, setHoveredId] = useState(null);
+  const [suggestOpen, setSuggestOpen] = useState(false);
+  const [suggestPrefix, setSuggestPrefix] = useState('');
 
   const { data, isLoading } = useQuery({
     queryKey: ['library'],
@@ -228,7 +261,61 @@ export default function LibraryPage() {
   });
 
   const [selectedLensId, setSelectedLensId] = useState(null);
-  const [savedSearches, setSavedSearches] = useState(loadSavedSearches);
+
+  const { data: savedSearches = [] } = useQuery({
+    queryKey: ['saved-searches'],
+    queryFn: async () => {
+      const { data } = await savedSearchesAPI.list();
+      return data;
+    },
+  });
+
+  const createSavedSearch = useMutation({
+    mutationFn: (data) => savedSearchesAPI.create(data),
+    onSuccess: () => queryClient.invalidateQueries({ queryKey: ['saved-searches'] }),
+  });
+
+  const removeSavedSearch = useMutation({
+    mutationFn: (id) => savedSearchesAPI.delete(id),
+    onSuccess: () => queryClient.invalidateQueries({ queryKey: ['saved-searches'] }),
+  });
+
+  useEffect(() => {
+    if (legacySavedSearchesMoving) return;
+    const legacy = readLegacySavedSearches();
+    if (!legacy.length) return;
+    legacySavedSearchesMoving = true;
+    Promise.allSettled(legacy.map((s) => savedSearchesAPI.create({
+      name: s.name || s.query || 'Untitled search',
+      query: s.query || '',
+      colors: s.filters?.categories || [],
+      projects: s.filters?.projects || [],
+    }))).then((results) => {
+      // Searches the server stored or rejected as invalid (400) are done; the rest are retried next visit
+      const done = (r) => r.status === 'fulfilled' || r.reason?.response?.status === 400;
+      keepLegacySavedSearches(legacy.filter((_, i) => !done(results[i])));
+    }).finally(() => {
+      legacySavedSearchesMoving = false;
+      queryClient.invalidateQueries({ queryKey: ['saved-searches'] });
+    });
+  }, [queryClient]);
+
+  // Completions for the word being typed, after a short pause
+  useEffect(() => {
+    const word = lastWord(query);
+    const t = setTimeout(() => setSuggestPrefix(word.length >= 2 ? word : ''), SUGGEST_DELAY_MS);
+    return () => clearTimeout(t);
+  }, [query]);
+
+  const { data: suggestions = [] } = useQuery({
+    queryKey: ['library-terms', suggestPrefix],
+    queryFn: async () => {
+      const { data } = await libraryAPI.terms(suggestPrefix);
+      return data.terms;
+    },
+    enabled: !!suggestPrefix,
+    placeholderData: keepPreviousData,
+  });
 
   const highlights = data?.highlights || [];
   const projects = data?.projects || [];
@@ -266,34 +353,36 @@ export default function LibraryPage() {
   const handleSearch = useCallback((q) => {
     setQuery(q);
     setActiveQuery(q);
+    setSuggestOpen(false);
   }, []);
 
+  const applySuggestion = useCallback((term) => {
+    const word = lastWord(query);
+    handleSearch(query.slice(0, query.length - word.length) + term);
+    inputRef.current?.focus();
+  }, [query, handleSearch]);
+
   const applySavedSearch = useCallback((s) => {
     setQuery(s.query);
     setActiveQuery(s.query);
-    if (s.filters?.categories?.length) setCategoryFilters(s.filters.categories);
-    if (s.filters?.projects?.length) setProjectFilters(s.filters.projects);
+    if (s.colors?.length) setCategoryFilters(s.colors);
+    if (s.projects?.length) setProjectFilters(s.projects);
   }, []);
 
   const saveCurrentSearch = useCallback(() => {
-    const name = activeQuery || 'Untitled search';
-    const newItem = {
-      id: 's' + Date.now(),
-      name,
+    // Saving the same query and filters again replaces the earlier entry (server-side)
+    createSavedSearch.mutate({
+      name: activeQuery || 'Untitled search',
       query: activeQuery,
-      filters: { categories: [...categoryFilters], projects: [...projectFilters] },
-    };
-    const next = [...savedSearches.filter((s) => s.query !== activeQuery), newItem];
-    setSavedSearches(next);
-    saveSavedSearches(next);
-  }, [activeQuery, categoryFilters, projectFilters, savedSearches]);
+      colors: [...categoryFilters],
+      projects: [...projectFilters],
+    });
+  }, [activeQuery, categoryFilters, projectFilters, createSavedSearch]);
 
   const deleteSavedSearch = useCallback((id, e) => {
     e?.stopPropagation?.();
-    const next = savedSearches.filter((s) => s.id !== id);
-    setSavedSearches(next);
-    saveSavedSearches(next);
-  }, [savedSearches]);
+    removeSavedSearch.mutate(id);
+  }, [removeSavedSearch]);
 
   const toggleCategory = useCallback((key) => {
     setCategoryFilters((prev) =>
@@ -307,25 +396,45 @@ export default function LibraryPage() {
     );
   }, []);
 
-  const results = useMemo(() => {
-    let r = highlights;
-    if (activeQuery) {
-      const q = activeQuery.toLowerCase();
-      r = r.filter(
-        (a) =>
-          a.highlighted_text?.toLowerCase().includes(q) ||
-          a.note?.content?.toLowerCase().includes(q) ||
-          a.color_display_name?.toLowerCase().includes(q)
-      );
-    }
-    if (categoryFilters.length > 0) {
-      r = r.filter((a) => categoryFilters.includes(a.color));
-    }
-    if (projectFilters.length > 0) {
-      r = r.filter((a) => projectFilters.includes(a.project_id));
-    }
-    return r;
-  }, [highlights, activeQuery, categoryFilters, projectFilters]);
+  const hasActiveFilters = categoryFilters.length > 0 || projectFilters.length > 0;
+  const resultsActive = activeQuery || hasActiveFilters;
+
+  // Searches and filters run on the server (ranked, paged); the full library stays cached for browsing.
+  const {
+    data: searchData,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
+    queryKey: ['library-search', activeQuery, categoryFilters, projectFilters],
+    queryFn: async ({ pageParam }) => {
+      const { data } = await libraryAPI.search({
+        q: activeQuery || undefined,
+        color: categoryFilters,
+        project: projectFilters,
+        page: pageParam,
+        page_size: SEARCH_PAGE_SIZE,
+      });
+      return data;
+    },
+    initialPageParam: 1,
+    getNextPageParam: (last) => last.next_page ?? undefined,
+    placeholderData: keepPreviousData,
+    enabled: !!resultsActive,
+  });
+
+  const searchPages = resultsActive ? searchData?.pages : null;
+  const results = useMemo(
+    () => (searchPages ? searchPages.flatMap((p) => p.highlights) : resultsActive ? [] : highlights),
+    [searchPages, resultsActive, highlights]
+  );
+  const resultCount = searchPages ? searchPages[0]?.total_highlights ?? 0 : results.length;
+  // Colour facets ignore the colour filter (to keep other options visible); the insight panel shows only the selection.
+  const facets = useMemo(() => {
+    const f = searchPages?.[0]?.facets;
+    if (!f) return null;
+    return { ...f, colors: f.colors.filter((c) => !categoryFilters.length || categoryFilters.includes(c.color)) };
+  }, [searchPages, categoryFilters]);
 
   const grouped = useMemo(() => {
     if (groupBy === 'document') {
@@ -347,9 +456,6 @@ export default function LibraryPage() {
     return null;
   }, [groupBy, results]);
 
-  const hasActiveFilters = categoryFilters.length > 0 || projectFilters.length > 0;
-  const resultsActive = activeQuery || hasActiveFilters;
-
   const totalDocs = useMemo(() => {
     const ids = new Set(highlights.map((h) => h.document_id));
     return ids.size;
@@ -380,16 +486,34 @@ export default function LibraryPage() {
           </div>
 
           {/* Search bar */}
-          <div className="flex items-center gap-2.5 bg-slate-50 border-[1.5px] border-slate-200 rounded-[10px] px-3.5 py-2.5 mb-3.5 focus-within:border-slate-400 transition-colors">
+          <div className="relative flex items-center gap-2.5 bg-slate-50 border-[1.5px] border-slate-200 rounded-[10px] px-3.5 py-2.5 mb-3.5 focus-within:border-slate-400 transition-colors">
             <Search className="w-[18px] h-[18px] text-slate-400 shrink-0" />
             <input
               ref={inputRef}
               value={query}
-              onChange={(e) => setQuery(e.target.value)}
-              onKeyDown={(e) => { if (e.key === 'Enter') setActiveQuery(query); }}
+              onChange={(e) => { setQuery(e.target.value); setSuggestOpen(true); }}
+              onKeyDown={(e) => {
+                if (e.key === 'Enter') handleSearch(query);
+                if (e.key === 'Escape') setSuggestOpen(false);
+              }}
+              onBlur={() => setSuggestOpen(false)}
               placeholder="Search across all your annotations..."
               className="border-0 bg-transparent outline-none text-[15px] text-slate-900 w-full placeholder:text-slate-400"
             />
+            {suggestOpen && suggestPrefix && suggestions.length > 0 && (
+              <div className="absolute left-0 right-0 top-full mt-1 bg-white border border-slate-200 rounded-[10px] shadow-sm py-1 z-50">
+                {suggestions.map((s) => (
+                  <button
+                    key={s.term}
+                    onMouseDown={(e) => { e.preventDefault(); applySuggestion(s.term); }}
+                    className="w-full flex items-center justify-between px-3.5 py-1.5 text-left text-[13px] text-slate-700 hover:bg-slate-50"
+                  >
+                    <span>{s.term}</span>
+                    <span className="text-[11px] text-slate-400">{s.count}</span>
+                  </button>
+                ))}
+              </div>
+            )}
             {query && (
               <button
                 onClick={() => { setQuery(''); setActiveQuery(''); }}
@@ -399,7 +523,7 @@ export default function LibraryPage() {
               </button>
             )}
             <button
-              onClick={() => setActiveQuery(query)}
+              onClick={() => handleSearch(query)}
               className="bg-slate-800 text-white rounded-lg px-4 py-1.5 text-[13px] font-medium hover:bg-slate-700 shrink-0"
             >
               Search
@@ -422,6 +546,7 @@ export default function LibraryPage() {
                   className="text-xs text-slate-500 bg-white border border-slate-200 rounded-full pl-3 pr-2 py-1 hover:border-slate-400 hover:text-slate-900 transition-colors"
                 >
                   {s.name}
+                  <span className="ml-1.5 text-[11px] text-slate-400">{s.result_count}</span>
                 </button>
                 <button
                   onClick={(e) => deleteSavedSearch(s.id, e)}
@@ -524,7 +649,7 @@ export default function LibraryPage() {
         {highlights.length > 0 && (
           <div className="flex items-center justify-between mb-4">
             <span className="text-[13px] text-slate-500">
-              <strong className="text-slate-900">{results.length}</strong> {resultsActive ? 'result' : 'annotation'}{results.length !== 1 ? 's' : ''}
+              <strong className="text-slate-900">{resultCount}</strong> {resultsActive ? 'result' : 'annotation'}{resultCount !== 1 ? 's' : ''}
               {activeQuery && <> for &ldquo;<strong className="text-slate-900">{activeQuery}</strong>&rdquo;</>}
               {hasActiveFilters && !activeQuery && <span className="text-slate-400"> (filtered)</span>}
             </span>
@@ -556,7 +681,7 @@ export default function LibraryPage() {
         )}
 
         {/* No results - search/filters applied but nothing matched */}
-        {highlights.length > 0 && resultsActive && results.length === 0 && (
+        {highlights.length > 0 && resultsActive && searchPages && results.length === 0 && (
           <div className="text-center py-12 text-slate-400 text-sm">
             No annotations match your search. Try different keywords or clear your filters.
           </div>
@@ -653,13 +778,26 @@ export default function LibraryPage() {
             })}
           </div>
         )}
+
+        {resultsActive && hasNextPage && (
+          <div className="flex justify-center mt-4">
+            <button
+              onClick={() => fetchNextPage()}
+              disabled={isFetchingNextPage}
+              className="text-xs text-slate-500 bg-white border border-slate-200 rounded-full px-4 py-1.5 hover:border-slate-400 hover:text-slate-900 flex items-center gap-1.5 disabled:opacity-60"
+            >
+              {isFetchingNextPage && <Loader2 className="w-3 h-3 animate-spin" />}
+              Load more ({results.length} of {resultCount})
+            </button>
+          </div>
+        )}
         </div>
 
         {/* Search insights - absolute overlay on right, does not shift main content */}
         {results.length > 3 && (
           <div className="absolute right-7 top-5 w-[260px]">
             <div className="sticky top-24">
-              <InsightPanel results={results} colorMap={colorMap} />
+              <InsightPanel results={results} colorMap={colorMap} facets={facets} />
             </div>
           </div>
         )}
@@ -364,9 +364,10 @@ export default function SummaryPage() {
     if (!id) return;
     setDeletingSelected(true);
     try {
-      for (const sid of selectedIds) {
-        await documentsAPI.deleteHighlight(id, sid);
-      }
+      await documentsAPI.batchHighlights(
+        id,
+        [...selectedIds].map((sid) => ({ op: 'delete', id: sid }))
+      );
       queryClient.invalidateQueries({ queryKey: ['highlights', id] });
       setSelectedIds(new Set());
       setPendingDeleteSelected(false);
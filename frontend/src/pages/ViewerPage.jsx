@@ -528,8 +528,11 @@ export default function ViewerPage() {
                     onClick={async () => {
                       const lensId = pendingLensSwitch;
                       setPendingLensSwitch(null);
-                      for (const h of highlights) {
-                        await documentsAPI.deleteHighlight(id, h.id);
+                      if (highlights.length > 0) {
+                        await documentsAPI.batchHighlights(
+                          id,
+                          highlights.map((h) => ({ op: 'delete', id: h.id }))
+                        );
                       }
                       queryClient.invalidateQueries({ queryKey: ['highlights', id] });
                       setActiveHighlightId(null);
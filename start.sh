@@ -20,6 +20,7 @@ if [ -z "$PYTHON" ]; then
 fi
 
 "$PYTHON" manage.py migrate --noinput
+"$PYTHON" manage.py createcachetable
 "$PYTHON" manage.py collectstatic --noinput --clear 2>/dev/null || true
 
 PORT="${PORT:-8000}"
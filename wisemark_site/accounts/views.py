@@ -453,12 +453,10 @@ def logout(request):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def me(request):
-    user = User.objects.select_related('wisemark_account').get(pk=request.user.pk)
+def me_payload(user):
+    """Body of GET /api/auth/me/ for user (also embedded in the document bootstrap response)."""
     account = getattr(user, 'wisemark_account', None)
-    return Response({
+    return {
         'id': user.id,
         'username': user.username,
         'email': getattr(user, 'email', '') or '',
@@ -467,7 +465,14 @@ def me(request):
         'account_type': getattr(account, 'account_type', None) if account else None,
         'trial_expires_at': account.trial_expires_at.isoformat() if account and account.trial_expires_at else None,
         'billing': _billing_payload(account),
-    })
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def me(request):
+    user = User.objects.select_related('wisemark_account').get(pk=request.user.pk)
+    return Response(me_payload(user))
 
 
 @api_view(['POST'])
@@ -1,5 +1,12 @@
+from collections import Counter
+
+from django import forms
 from django.contrib import admin
-from .models import Project, Document, Color, DocumentColor, Highlight, Note
+from django.db import transaction
+
+from . import changes, counters
+from .geometry import bbox_fields, normalize_position_data
+from .models import Project, Document, Color, Highlight, Note
 
 
 @admin.register(Project)
@@ -26,20 +33,51 @@ class ColorAdmin(admin.ModelAdmin):
     search_fields = ('key', 'default_name')
 
 
-@admin.register(DocumentColor)
-class DocumentColorAdmin(admin.ModelAdmin):
-    list_display = ('document', 'color', 'custom_name')
-    list_filter = ('color',)
-    search_fields = ('document__filename', 'custom_name')
+class HighlightAdminForm(forms.ModelForm):
+    def clean_position_data(self):
+        try:
+            return normalize_position_data(self.cleaned_data['position_data'])
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc))
 
 
 @admin.register(Highlight)
 class HighlightAdmin(admin.ModelAdmin):
+    """Saves and deletes go through the same counters and change log as the API."""
+    form = HighlightAdminForm
     list_display = ('document', 'page_number', 'color', 'highlighted_text_preview', 'created_at')
     list_filter = ('document__project', 'color', 'page_number')
     search_fields = ('highlighted_text',)
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_readonly_fields(self, request, obj=None):
+        # Moving a highlight to another document (or account) is not supported
+        return self.readonly_fields + ('document',) if obj else self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        # user is not on the form (editable=False); it always follows the document's owner
+        obj.user_id = obj.document.project.user_id
+        for field, value in bbox_fields(obj.position_data).items():
+            setattr(obj, field, value)
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if not change:
+                counters.highlights_changed({obj.document_id: 1})
+            changes.record_upserts(obj.user_id, [obj])
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Highlight.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset.values_list('user_id', 'document_id', 'id'))
+        with transaction.atomic():
+            queryset.delete()
+            counters.highlights_changed({
+                document_id: -n for document_id, n in Counter(d for _, d, _ in rows).items()
+            })
+            for user_id in {user_id for user_id, _, _ in rows}:
+                changes.record_deletes(user_id, [(d, pk) for u, d, pk in rows if u == user_id])
+
     def highlighted_text_preview(self, obj):
         return (obj.highlighted_text[:60] + '…') if obj.highlighted_text and len(obj.highlighted_text) > 60 else (obj.highlighted_text or '')
     highlighted_text_preview.short_description = 'Highlight'
@@ -47,10 +85,29 @@ class HighlightAdmin(admin.ModelAdmin):
 
 @admin.register(Note)
 class NoteAdmin(admin.ModelAdmin):
+    """Note edits are logged as changes to their highlight, as in the API."""
     list_display = ('highlight', 'content_preview', 'created_at')
     search_fields = ('content',)
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_readonly_fields(self, request, obj=None):
+        return self.readonly_fields + ('highlight',) if obj else self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            changes.record_upserts(obj.highlight.user_id, [obj.highlight])
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Note.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        highlights = list(Highlight.objects.filter(note__in=queryset))
+        with transaction.atomic():
+            queryset.delete()
+            for user_id in {h.user_id for h in highlights}:
+                changes.record_upserts(user_id, [h for h in highlights if h.user_id == user_id])
+
     def content_preview(self, obj):
         return (obj.content[:60] + '…') if obj.content and len(obj.content) > 60 else (obj.content or '')
     content_preview.short_description = 'Note'
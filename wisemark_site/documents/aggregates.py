@@ -0,0 +1,94 @@
+"""
+Per-document highlight aggregates for overview screens.
+
+document_aggregates() returns counts per colour (with lens display names), counts per
+page for the scrollbar heatmap, the note count and the last activity time, without
+loading highlight bodies. The counts come from one GROUP BY over (color_key, page_number)
+and are cached per document; changes._record drops the entry whenever highlights or
+notes of the document are written. Display names are resolved from the preset registry
+on every call, so a lens change never needs an invalidation here.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from rest_framework import serializers
+
+from . import presets
+from .models import Highlight
+
+CACHE_KEY = 'documents:aggregates:{}'
+CACHE_TIMEOUT = 60 * 60
+
+
+def _cache_key(document_id):
+    return CACHE_KEY.format(document_id)
+
+
+def _grouped(document_id):
+    """Counts per (color_key, page_number), rolled up to colours and pages."""
+    rows = (
+        Highlight.objects.filter(document_id=document_id)
+        .order_by()
+        .values('color_key', 'page_number')
+        .annotate(
+            n=Count('id'),
+            notes=Count('note'),
+            stored_name=Max('color_display_name'),
+            last_highlight=Max('updated_at'),
+            last_note=Max('note__updated_at'),
+        )
+    )
+    colors, pages = {}, {}
+    last_activity = None
+    for r in rows:
+        color = colors.setdefault(r['color_key'], {'count': 0, 'note_count': 0, 'stored_name': r['stored_name']})
+        color['count'] += r['n']
+        color['note_count'] += r['notes']
+        pages[r['page_number']] = pages.get(r['page_number'], 0) + r['n']
+        for value in (r['last_highlight'], r['last_note']):
+            if value is not None and (last_activity is None or value > last_activity):
+                last_activity = value
+    return {'colors': colors, 'pages': dict(sorted(pages.items())), 'last_activity_at': last_activity}
+
+
+def document_aggregates(document):
+    """Aggregates for a document, from the cache when possible."""
+    key = _cache_key(document.pk)
+    grouped = cache.get(key)
+    if grouped is None:
+        grouped = _grouped(document.pk)
+        cache.set(key, grouped, CACHE_TIMEOUT)
+
+    preset = presets.effective(document.highlight_preset_id)
+    lens = preset.colors if preset else ()
+    colors = grouped['colors']
+    order = [c.key for c in lens if c.key in colors]
+    order += sorted(k for k in colors if k not in order)
+    by_color = []
+    for key in order:
+        c = preset.by_key.get(key) if preset else None
+        stored = (colors[key]['stored_name'] or '').strip()
+        by_color.append({
+            'color': key,
+            'display_name': c.display_name if c else (f'{stored} (Deleted)' if stored else 'Unknown (Deleted)'),
+            'count': colors[key]['count'],
+            'note_count': colors[key]['note_count'],
+        })
+    last_activity = grouped['last_activity_at']
+    return {
+        'document_id': document.pk,
+        'highlight_count': sum(c['count'] for c in by_color),
+        'note_count': sum(c['note_count'] for c in by_color),
+        'last_activity_at': serializers.DateTimeField().to_representation(last_activity) if last_activity else None,
+        'by_color': by_color,
+        'page_counts': grouped['pages'],
+    }
+
+
+def invalidate(document_ids):
+    """Drop cached aggregates for these documents now and again once the transaction commits."""
+    keys = [_cache_key(pk) for pk in set(document_ids)]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
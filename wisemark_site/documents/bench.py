@@ -0,0 +1,347 @@
+"""
+Helpers for the benchmark management commands (benchmark_storage, ...).
+
+Benchmarks run against the configured database inside a throwaway user that is
+deleted afterwards. S3 is replaced by LocalS3, an in-memory stand-in with
+injectable latency, so runs need no AWS credentials and are repeatable.
+"""
+import contextlib
+import io
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from . import s3_storage
+
+
+class LocalS3:
+    """
+    In-memory, thread-safe subset of the boto3 S3 client used by s3_storage.
+
+    latency: seconds added to every call (network round trip).
+    bandwidth: bytes/second for object bodies on put/get (None = unlimited).
+    """
+
+    def __init__(self, latency=0.0, bandwidth=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.objects = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _wait(self, nbytes=0):
+        delay = self.latency
+        if self.bandwidth and nbytes:
+            delay += nbytes / self.bandwidth
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.calls += 1
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        self._wait(len(data))
+        with self._lock:
+            self.objects[Key] = (data, timezone.now())
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        with self._lock:
+            entry = self.objects.get(Key)
+        if entry is None:
+            self._wait()
+            raise KeyError(Key)
+        self._wait(len(entry[0]))
+        return {'Body': io.BytesIO(entry[0]), 'ContentLength': len(entry[0])}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._wait()
+        with self._lock:
+            self.objects.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._wait()
+        with self._lock:
+            for obj in Delete['Objects']:
+                self.objects.pop(obj['Key'], None)
+        return {}
+
+    def get_paginator(self, name):
+        stub = self
+
+        class _Paginator:
+            def paginate(self, Bucket, Prefix='', PageSize=1000, **kwargs):
+                with stub._lock:
+                    items = sorted(
+                        (k, v[1], len(v[0])) for k, v in stub.objects.items() if k.startswith(Prefix)
+                    )
+                for start in range(0, len(items), PageSize):
+                    stub._wait()
+                    yield {
+                        'Contents': [
+                            {'Key': k, 'LastModified': modified, 'Size': size}
+                            for k, modified, size in items[start:start + PageSize]
+                        ],
+                    }
+
+        return _Paginator()
+
+
+@contextlib.contextmanager
+def use_local_s3(stub, bucket='wisemark-bench'):
+    """Route s3_storage through `stub` (and enable S3 uploads) for the duration of the block."""
+    with mock.patch.object(settings, 'AWS_STORAGE_BUCKET_NAME', bucket), \
+            mock.patch.object(s3_storage, '_get_client', lambda: stub):
+        yield stub
+
+
+@contextlib.contextmanager
+def s3_disabled():
+    """Force new uploads into Postgres for the duration of the block."""
+    with mock.patch.object(settings, 'AWS_STORAGE_BUCKET_NAME', None):
+        yield
+
+
+def synthetic_pdf(size_bytes, seed=0):
+    """A structurally valid one-page PDF padded to roughly size_bytes with an incompressible stream."""
+    rng = random.Random(seed)
+    head = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    objects = [
+        b'1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n',
+        b'2 0 obj\n<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n',
+        b'3 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>\nendobj\n',
+    ]
+    overhead = len(head) + sum(len(o) for o in objects) + 200
+    pad_len = max(0, size_bytes - overhead)
+    padding = rng.randbytes(pad_len) if pad_len else b''
+    objects.append(
+        b'4 0 obj\n<< /Length %d >>\nstream\n' % pad_len + padding + b'\nendstream\nendobj\n'
+    )
+    body = head
+    offsets = []
+    for obj in objects:
+        offsets.append(len(body))
+        body += obj
+    xref = len(body)
+    body += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    body += b''.join(b'%010d 00000 n \n' % off for off in offsets)
+    body += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return body
+
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def latency_summary(samples):
+    """p50/p95/p99/mean/max in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None, 'max': None}
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        'p50': ms(percentile(ordered, 50)),
+        'p95': ms(percentile(ordered, 95)),
+        'p99': ms(percentile(ordered, 99)),
+        'mean': ms(sum(ordered) / len(ordered)),
+        'max': ms(ordered[-1]),
+    }
+
+
+def _current_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Not Linux: fall back to the process high-water mark
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    """Samples resident set size in a background thread; `.peak` is the highest value seen (bytes)."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _current_rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss_bytes())
+
+
+def run_concurrent(fn, concurrency, iterations, setup=None):
+    """
+    Call fn(i) for i in range(iterations) from `concurrency` threads.
+    If setup is given, fn receives setup(i) instead; setup time is not measured.
+    Returns a dict with per-call durations, errors, wall time and peak RSS.
+    Each worker thread keeps one DB connection for the whole run.
+    """
+    durations = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(iterations))
+
+    def call(i):
+        arg = setup(i) if setup else i
+        start = time.perf_counter()
+        try:
+            fn(arg)
+        except Exception as e:  # recorded, not raised: one failure shouldn't abort a run
+            with lock:
+                errors.append(repr(e))
+        else:
+            elapsed = time.perf_counter() - start
+            with lock:
+                durations.append(elapsed)
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                call(i)
+        finally:
+            connection.close()
+
+    with RssSampler() as rss:
+        wall_start = time.perf_counter()
+        if concurrency <= 1:
+            for i in range(iterations):
+                call(i)
+        else:
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        wall = time.perf_counter() - wall_start
+    return {
+        'durations': durations,
+        'errors': errors,
+        'wall_seconds': wall,
+        'peak_rss_bytes': rss.peak,
+    }
+
+
+def environment_info():
+    """Metadata stored with every result file so runs can be compared."""
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'db_vendor': connection.vendor,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+@contextlib.contextmanager
+def bench_account(username_prefix='bench'):
+    """A throwaway paid user with one project; the user (and everything it owns) is deleted on exit."""
+    from django.contrib.auth import get_user_model
+    from accounts.models import Account
+    from .models import Project
+
+    User = get_user_model()
+    username = f'{username_prefix}-{os.getpid()}-{int(time.time() * 1000)}'
+    user = User.objects.create(username=username, email=f'{username}@bench.invalid')
+    Account.objects.create(user=user, account_type=Account.PAID)
+    project = Project.objects.create(user=user, name='Benchmark')
+    try:
+        yield user, project
+    finally:
+        user.delete()
+
+
+_WORDS = (
+    'revenue margin guidance churn pipeline backlog capex covenant dilution ebitda '
+    'cohort retention pricing headcount runway forecast segment leverage liquidity'
+).split()
+
+
+def _browser_rect(rng):
+    """A rect with the float noise pdf.js text-layer maths produces (scaled then divided back)."""
+    scale = rng.choice((1.0, 1.25, 1.5, 2.0))
+    x, y = rng.uniform(50, 500) * scale, rng.uniform(40, 760) * scale
+    width, height = rng.uniform(20, 480) * scale, rng.uniform(8, 14) * scale
+    return {'x': x / scale, 'y': y / scale, 'width': width / scale, 'height': height / scale}
+
+
+def seed_highlights(project, documents=1, per_document=1000, pages=40, seed=0):
+    """
+    Bulk-create documents with browser-shaped highlights (1-4 rects each, ~30% with notes)
+    under project. Returns the created Document rows.
+    """
+    from .geometry import bbox_fields
+    from . import counters, presets
+    from .models import Document, Highlight, Note
+
+    rng = random.Random(seed)
+    preset = presets.default()
+    colors = [(c.key, c.display_name) for c in preset.colors] if preset else [('yellow', 'Yellow')]
+    docs = Document.objects.bulk_create([
+        Document(
+            project=project,
+            pdf_hash=f'{seed:08x}{i:056x}',
+            filename=f'Benchmark {i + 1}.pdf',
+            file_size=0,
+        )
+        for i in range(documents)
+    ])
+    counters.documents_added(project.pk, len(docs))
+    for doc in docs:
+        highlights = []
+        for _ in range(per_document):
+            color_key, display_name = rng.choice(colors)
+            position_data = {'rects': [_browser_rect(rng) for _ in range(rng.randint(1, 4))]}
+            highlights.append(Highlight(
+                document=doc,
+                user_id=project.user_id,
+                page_number=rng.randint(1, pages),
+                position_data=position_data,
+                **bbox_fields(position_data),
+                color_key=color_key,
+                color_display_name=display_name,
+                highlighted_text=' '.join(rng.choice(_WORDS) for _ in range(rng.randint(4, 30))),
+            ))
+        highlights = Highlight.objects.bulk_create(highlights, batch_size=1000)
+        counters.highlights_changed({doc.pk: len(highlights)})
+        Note.objects.bulk_create(
+            [
+                Note(highlight=h, content=' '.join(rng.choice(_WORDS) for _ in range(rng.randint(3, 20))))
+                for h in highlights if rng.random() < 0.3
+            ],
+            batch_size=1000,
+        )
+    return docs
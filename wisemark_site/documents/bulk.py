@@ -0,0 +1,62 @@
+"""
+Bulk upserts for nested writes.
+
+upsert() writes any number of rows with INSERT ... ON CONFLICT DO UPDATE
+(bulk_create(update_conflicts=True); Postgres and SQLite >= 3.24), so the query count does not
+depend on how many rows are written. set_preset_colors() builds on it to replace a lens's
+colours: one upsert plus one DELETE for keys that were dropped. Colour ids are kept for
+keys that survive.
+
+Bulk writes skip model signals, so set_preset_colors() invalidates the preset registry
+itself (see presets.py).
+"""
+from django.db import transaction
+
+from . import presets
+from .models import PresetColor
+
+BATCH_SIZE = 500
+
+PRESET_COLOR_FIELDS = ('display_name', 'hex', 'sort_order')
+
+
+def upsert(model, objs, unique_fields, update_fields, batch_size=BATCH_SIZE):
+    """
+    Insert objs, updating update_fields on rows that already exist for unique_fields.
+    Runs in one transaction (joining the caller's, without a savepoint); returns the objects (with pks on Postgres and SQLite).
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    with transaction.atomic(savepoint=False):
+        return model.objects.bulk_create(
+            objs,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=list(unique_fields),
+            update_fields=list(update_fields),
+        )
+
+
+def set_preset_colors(preset_id, colors, prune=True):
+    """
+    Write colours for a lens. colors are dicts with key, display_name, hex and optional
+    sort_order (defaults to the position in the list). With prune, colours whose key is not
+    in colors are deleted. Keys must be unique within colors.
+    """
+    rows = [
+        PresetColor(
+            preset_id=preset_id,
+            key=c['key'],
+            display_name=c['display_name'],
+            hex=c['hex'],
+            sort_order=c.get('sort_order', i),
+        )
+        for i, c in enumerate(colors)
+    ]
+    with transaction.atomic(savepoint=False):
+        upsert(PresetColor, rows, ('preset', 'key'), PRESET_COLOR_FIELDS)
+        if prune:
+            PresetColor.objects.filter(preset_id=preset_id).exclude(key__in=[r.key for r in rows]).delete()
+        presets.invalidate()
+    return rows
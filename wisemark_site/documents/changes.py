@@ -0,0 +1,90 @@
+"""
+Highlight change log for delta sync.
+
+Every code path that creates, edits (including notes) or deletes highlights calls
+record_upserts / record_deletes so clients can fetch "what changed since cursor N"
+instead of re-downloading every highlight. Recording a change also drops the cached
+per-document aggregates (aggregates.py), retires the user's cached Library response
+(library_cache.py) and updates the user's search terms (terms.py).
+"""
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from . import aggregates, library_cache, terms
+from .models import Highlight, HighlightChange
+
+
+def _record(user_id, kind, pairs):
+    rows = [
+        HighlightChange(user_id=user_id, document_id=document_id, highlight_id=highlight_id, kind=kind)
+        for document_id, highlight_id in pairs
+    ]
+    if rows:
+        HighlightChange.objects.bulk_create(rows)
+        aggregates.invalidate(row.document_id for row in rows)
+        library_cache.bump(user_id)
+
+
+def record_upserts(user_id, highlights):
+    """Log highlights (model instances) that were created or changed."""
+    highlights = list(highlights)
+    _record(user_id, HighlightChange.UPSERT, ((h.document_id, h.pk) for h in highlights))
+    terms.highlights_written(user_id, [h.pk for h in highlights])
+
+
+def record_deletes(user_id, pairs):
+    """Log deleted highlights, given as (document_id, highlight_id) pairs."""
+    pairs = list(pairs)
+    _record(user_id, HighlightChange.DELETE, pairs)
+    terms.highlights_written(user_id, [highlight_id for _, highlight_id in pairs], deleted=True)
+
+
+def record_moved(user_id, document_ids):
+    """
+    Log every highlight of these documents as changed after they moved to another project:
+    Library rows (and saved-search counts filtered by project) depend on the project. One
+    INSERT ... SELECT whatever the number of highlights; text and notes are unchanged, so
+    aggregates and search terms are left alone.
+    """
+    document_ids = list(document_ids)
+    if not document_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(document_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {HighlightChange._meta.db_table} (user_id, document_id, highlight_id, kind, created_at) '
+            f'SELECT %s, document_id, id, %s, %s FROM {Highlight._meta.db_table} '
+            f'WHERE document_id IN ({placeholders}) ORDER BY id',
+            [user_id, HighlightChange.UPSERT, connection.ops.adapt_datetimefield_value(timezone.now()), *document_ids],
+        )
+    library_cache.bump(user_id)
+
+
+def latest_cursor(**scope):
+    """Current cursor for a scope (user_id=... or document_id=...); 0 when nothing has changed yet."""
+    return HighlightChange.objects.filter(**scope).aggregate(m=Max('id'))['m'] or 0
+
+
+def changes_since(cursor, limit, **scope):
+    """
+    Collapse the log after `cursor` into the latest state per highlight.
+
+    Returns (upserted_ids, deleted_ids, next_cursor, has_more). Upserted ids may
+    include highlights deleted after this page; their tombstones arrive on a later page.
+    """
+    rows = list(
+        HighlightChange.objects.filter(id__gt=cursor, **scope)
+        .order_by('id')
+        .values_list('id', 'highlight_id', 'kind')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for _, highlight_id, kind in rows:
+        latest.pop(highlight_id, None)  # keep first-seen order of the final state
+        latest[highlight_id] = kind
+    upserted = [pk for pk, kind in latest.items() if kind == HighlightChange.UPSERT]
+    deleted = [pk for pk, kind in latest.items() if kind == HighlightChange.DELETE]
+    next_cursor = rows[-1][0] if rows else cursor
+    return upserted, deleted, next_cursor, has_more
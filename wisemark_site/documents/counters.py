@@ -0,0 +1,99 @@
+"""
+Stored document and highlight counters.
+
+Project.document_count, Project.annotation_count and Document.annotation_count replace
+per-request Count() joins on the list endpoints. Every code path that creates, moves or
+deletes documents or highlights calls one of the functions below inside its transaction.
+They apply F() increments, so concurrent writers never lose updates.
+
+Repair drift (or fill the columns after a bulk import): python manage.py repair_counters
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import library_cache
+from .models import Document, Highlight, Project
+
+
+def _apply(model, field, deltas):
+    """Add deltas ({pk: n}) to model.field, one UPDATE per distinct n."""
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def highlights_changed(deltas):
+    """Highlights were added or removed: deltas is {document_id: +/-n}."""
+    deltas = {pk: n for pk, n in deltas.items() if n}
+    if not deltas:
+        return
+    _apply(Document, 'annotation_count', deltas)
+    per_project = defaultdict(int)
+    for doc_pk, project_pk in Document.objects.filter(pk__in=deltas).values_list('pk', 'project_id'):
+        per_project[project_pk] += deltas[doc_pk]
+    _apply(Project, 'annotation_count', per_project)
+
+
+def documents_added(project_id, count=1):
+    """New (empty) documents in a project; highlights are counted by highlights_changed."""
+    _apply(Project, 'document_count', {project_id: count})
+
+
+def documents_leaving(documents):
+    """
+    Documents are about to be deleted or moved out of their projects. documents should be
+    locked rows (select_for_update) so their annotation_count cannot change underneath.
+    """
+    doc_deltas, highlight_deltas = defaultdict(int), defaultdict(int)
+    for doc in documents:
+        doc_deltas[doc.project_id] -= 1
+        highlight_deltas[doc.project_id] -= doc.annotation_count
+    _apply(Project, 'document_count', doc_deltas)
+    _apply(Project, 'annotation_count', highlight_deltas)
+
+
+def documents_arrived(project_id, documents):
+    """Existing documents (with their highlights) were moved into a project."""
+    documents = list(documents)
+    _apply(Project, 'document_count', {project_id: len(documents)})
+    _apply(Project, 'annotation_count', {project_id: sum(d.annotation_count for d in documents)})
+
+
+def _count(queryset, group_by, aggregate):
+    return Coalesce(
+        Subquery(queryset.order_by().values(group_by).annotate(n=aggregate).values('n')[:1]),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def recompute(project_ids):
+    """
+    Recompute counters for these projects and their documents from the rows themselves.
+    Returns the number of projects whose stored counters were wrong; their owners' cached
+    Library responses are retired.
+    """
+    def snapshot():
+        rows = Project.objects.filter(pk__in=project_ids).values_list('pk', 'document_count', 'annotation_count')
+        return {pk: counts for pk, *counts in rows}
+
+    before = snapshot()
+    Document.objects.filter(project_id__in=project_ids).update(annotation_count=_count(
+        Highlight.objects.filter(document=OuterRef('pk')), 'document', Count('pk'),
+    ))
+    Project.objects.filter(pk__in=project_ids).update(
+        document_count=_count(Document.objects.filter(project=OuterRef('pk')), 'project', Count('pk')),
+        annotation_count=_count(
+            Document.objects.filter(project=OuterRef('pk')), 'project', Sum('annotation_count'),
+        ),
+    )
+    after = snapshot()
+    stale = [pk for pk, counts in after.items() if counts != before.get(pk)]
+    for user_id in set(Project.objects.filter(pk__in=stale).values_list('user_id', flat=True)):
+        library_cache.bump(user_id)
+    return len(stale)
@@ -0,0 +1,130 @@
+"""
+Highlight geometry: canonical position_data and its packed wire form.
+
+position_data holds {"rects": [{"x", "y", "width", "height"}, ...]} in unscaled PDF page
+units, as produced by getRectsFromSpans in PDFRenderer.jsx. Stored rects are quantised to
+fixed point (1/POSITION_SCALE of a unit), which keeps the shape clients read while dropping
+the 15+ significant digits the browser sends. Coordinates beyond MAX_COORDINATE are rejected
+on write, which keeps every stored rect within pack_rects' int32 range.
+"""
+import base64
+import math
+import struct
+
+POSITION_SCALE = 100  # fixed point: hundredths of a PDF point
+RECT_FIELDS = ('x', 'y', 'width', 'height')
+MAX_COORDINATE = 1_000_000  # PDF units; far beyond any page, well inside int32 / POSITION_SCALE
+
+
+def _quantize(value):
+    """Round to the fixed-point grid; integral results become ints so JSON stays short."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return value
+    scaled = value * POSITION_SCALE
+    if not math.isfinite(scaled):
+        return 0
+    q = round(scaled)
+    if q % POSITION_SCALE == 0:
+        return q // POSITION_SCALE
+    return q / POSITION_SCALE
+
+
+def _check_coordinate(value):
+    """Raise ValueError for a numeric coordinate that is not finite or beyond MAX_COORDINATE."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return  # kept as sent, like _quantize
+    if not (math.isfinite(value) and abs(value) <= MAX_COORDINATE):
+        raise ValueError(f'Rect coordinates must be finite numbers between -{MAX_COORDINATE} and {MAX_COORDINATE}.')
+
+
+def normalize_position_data(data):
+    """
+    Canonical stored form of position_data. Rect coordinates are quantised; other keys are kept.
+    Raises ValueError when a coordinate is not finite or beyond MAX_COORDINATE.
+    """
+    if not isinstance(data, dict):
+        return data
+    rects = data.get('rects')
+    if not isinstance(rects, list):
+        return data
+    for r in rects:
+        if isinstance(r, dict):
+            for k in RECT_FIELDS:
+                if r.get(k) is not None:
+                    _check_coordinate(r[k])
+    normalized = dict(data)
+    normalized['rects'] = [
+        {**r, **{k: _quantize(r[k]) for k in RECT_FIELDS if r.get(k) is not None}}
+        if isinstance(r, dict) else r
+        for r in rects
+    ]
+    return normalized
+
+
+def pack_rects(rects):
+    """Base64 of little-endian int32 (x, y, width, height) per rect, in 1/POSITION_SCALE units."""
+    values = []
+    for r in rects:
+        if not isinstance(r, dict):
+            continue
+        for k in RECT_FIELDS:
+            try:
+                values.append(round(float(r.get(k) or 0) * POSITION_SCALE))
+            except (TypeError, ValueError, OverflowError):
+                values.append(0)
+    # struct.error for values outside int32 (see pack_position_data)
+    return base64.b64encode(struct.pack(f'<{len(values)}i', *values)).decode('ascii')
+
+
+def unpack_rects(packed):
+    """Inverse of pack_rects."""
+    raw = base64.b64decode(packed)
+    values = struct.unpack(f'<{len(raw) // 4}i', raw)
+    return [
+        {k: _quantize(values[i + j] / POSITION_SCALE) for j, k in enumerate(RECT_FIELDS)}
+        for i in range(0, len(values) - 3, 4)
+    ]
+
+
+def pack_position_data(data):
+    """List-response form: {"rects_packed": "<base64>", "scale": POSITION_SCALE}; other keys are kept."""
+    if not isinstance(data, dict) or not isinstance(data.get('rects'), list):
+        return data
+    packed = {k: v for k, v in data.items() if k != 'rects'}
+    try:
+        packed['rects_packed'] = pack_rects(data['rects'])
+    except struct.error:
+        return data  # a coordinate outside int32 (stored before MAX_COORDINATE): keep the plain rects
+    packed['scale'] = POSITION_SCALE
+    return packed
+
+
+BBOX_FIELDS = ('bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right')
+MIN_RECT_HEIGHT = 4  # matches the overlay fallback in PDFRenderer.jsx
+
+
+def bbox_fields(position_data):
+    """Highlight bbox_* column values for position_data; all None when it has no rects."""
+    rects = position_data.get('rects') if isinstance(position_data, dict) else None
+    rects = [r for r in rects or () if isinstance(r, dict)]
+    if not rects:
+        return dict.fromkeys(BBOX_FIELDS)
+
+    def num(r, key, default=0):
+        try:
+            return float(r.get(key) or default)
+        except (TypeError, ValueError):
+            return float(default)
+
+    return {
+        'bbox_top': _quantize(min(num(r, 'y') for r in rects)),
+        'bbox_left': _quantize(min(num(r, 'x') for r in rects)),
+        'bbox_bottom': _quantize(max(num(r, 'y') + num(r, 'height', MIN_RECT_HEIGHT) for r in rects)),
+        'bbox_right': _quantize(max(num(r, 'x') + num(r, 'width') for r in rects)),
+    }
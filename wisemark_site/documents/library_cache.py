@@ -0,0 +1,61 @@
+"""
+Per-user cache of the full Library response (LibraryView without search or pagination).
+
+Each user has a data-version token in the shared cache. bump() replaces it once the
+current transaction commits, which orphans the user's cached response. It is called for
+every highlight and note write (changes.py), by post_save/post_delete on Document and
+Project (signals.py), and by the document and counter writes that skip model signals
+(move, copy, counters.recompute). Lens colours resolve through the preset registry, so
+the registry's version token (presets.py) is part of the version too: editing a lens,
+including a system lens shared by every user, invalidates the responses it appears in.
+
+Each user has one entry per response shape (full or normalized): (versions, change cursor,
+gzip-compressed JSON body). A read whose versions differ from the stored ones is a miss. The ETag is derived from the
+versions alone, so a conditional request is answered with one cache lookup.
+"""
+import gzip
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import presets
+
+VERSION_CACHE_KEY = 'documents:library:version:{}'
+ENTRY_CACHE_KEY = 'documents:library:{}:{}'
+ENTRY_TIMEOUT = 7 * 24 * 3600  # seconds; an idle account's entry is dropped after a week
+COMPRESS_LEVEL = 1  # rendering dominates a miss; level 1 stays a small fraction of it
+
+
+def versions(user_id):
+    """(user token, preset registry token) for the user's current data; missing tokens are created."""
+    keys = [VERSION_CACHE_KEY.format(user_id), presets.VERSION_CACHE_KEY]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # add() keeps a token another worker created first
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        found.update(cache.get_many(missing))
+    return tuple(found.get(key) for key in keys)
+
+
+def get(user_id, shape, current):
+    """(cursor, gzip body) of shape cached for versions current, or None."""
+    entry = cache.get(ENTRY_CACHE_KEY.format(user_id, shape))
+    if entry is None or entry[0] != current:
+        return None
+    return entry[1], entry[2]
+
+
+def put(user_id, shape, current, cursor, body):
+    """Cache body (JSON bytes) of shape rendered at versions current and change cursor; returns it gzip-compressed."""
+    compressed = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+    cache.set(ENTRY_CACHE_KEY.format(user_id, shape), (current, cursor, compressed), ENTRY_TIMEOUT)
+    return compressed
+
+
+def bump(user_id):
+    """The user's Library data changed: retire the cached response once the transaction commits."""
+    key = VERSION_CACHE_KEY.format(user_id)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
@@ -0,0 +1,309 @@
+"""
+Benchmark highlight API payloads on a seeded dataset.
+
+Suites:
+  position_data  Stored position_data size and GET /api/documents/<id>/highlights/ payload
+                 and latency for raw browser floats, quantised rects and ?rects=packed.
+  serializers    HighlightSerializer / LibraryHighlightSerializer against the .values() fast
+                 path (serializers.highlight_rows / library_rows) at --rows sizes, checking
+                 that both render to identical JSON bytes.
+  sql_json       Postgres only: the SQL JSON path (documents/sql_json.py) against the
+                 Python fast path at --rows sizes; fails unless the JSON bytes are identical.
+  renderers      Encode time and payload size of the library response at --rows sizes with
+                 DRF's stdlib renderer, the orjson renderer and MessagePack (when installed),
+                 checking that the orjson output is byte-identical to DRF's.
+
+Runs against the configured database inside a throwaway user.
+
+Run: python manage.py benchmark_api --suite position_data --highlights 10000 --output api.json
+     python manage.py benchmark_api --suite serializers --rows 1000,10000,100000
+     python manage.py benchmark_api --suite sql_json --rows 1000,10000
+     python manage.py benchmark_api --suite renderers --rows 1000,10000,100000
+"""
+
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from wisemark_site import renderers
+
+from documents import bench, sql_json
+from documents.geometry import normalize_position_data
+from documents.models import Highlight
+from documents.serializers import (
+    HIGHLIGHT_ROW_FIELDS,
+    LIBRARY_ROW_FIELDS,
+    HighlightSerializer,
+    LibraryHighlightSerializer,
+    highlight_rows,
+    library_rows,
+)
+from documents.views import HIGHLIGHT_ORDERING, LIBRARY_ORDERING, DocumentViewSet, LibraryView, _highlights_for_api
+
+from .benchmark_storage import _csv
+
+SUITES = ('position_data', 'serializers', 'sql_json', 'renderers')
+DEFAULT_ITERATIONS = {'position_data': 10, 'serializers': 3, 'sql_json': 3, 'renderers': 5}
+HIGHLIGHTS_PER_DOCUMENT = 1000
+
+
+def _stored_bytes(queryset):
+    """Average stored size of position_data as the database reports it."""
+    table = Highlight._meta.db_table
+    ids = list(queryset.values_list('pk', flat=True))
+    if connection.vendor == 'postgresql':
+        sql = f'SELECT AVG(pg_column_size(position_data)) FROM {table} WHERE id = ANY(%s)'
+        params = [ids]
+    elif connection.vendor == 'sqlite':
+        sql = f'SELECT AVG(LENGTH(position_data)) FROM {table} WHERE id IN (SELECT value FROM json_each(%s))'
+        params = [json.dumps(ids)]
+    else:
+        rows = queryset.values_list('position_data', flat=True)
+        return round(sum(len(json.dumps(r)) for r in rows) / max(len(ids), 1), 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return round(float(cursor.fetchone()[0] or 0), 1)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark highlight API payload size and latency on seeded data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=SUITES, default='position_data')
+        parser.add_argument('--highlights', type=int, default=5000, help='Highlights in the seeded document (default 5000).')
+        parser.add_argument('--rows', type=_csv(int), default=[1000, 10000, 100000], help='serializers: row counts (default 1000,10000,100000).')
+        parser.add_argument('--iterations', type=int, default=None, help='Runs per variant (default 10, serializers 3).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write machine-readable results (JSON) to this path.')
+
+    def handle(self, *args, **options):
+        if options['highlights'] < 1:
+            raise CommandError('--highlights must be at least 1.')
+        if options['suite'] == 'sql_json' and not sql_json.available():
+            raise CommandError('The sql_json suite needs Postgres, a UTC time zone and SQL_JSON_LISTS enabled.')
+        if options['iterations'] is None:
+            options['iterations'] = DEFAULT_ITERATIONS[options['suite']]
+        self.factory = APIRequestFactory()
+        with override_settings(DEBUG=False), bench.bench_account() as (user, project):
+            self.user = user
+            results = getattr(self, f'_suite_{options["suite"]}')(project, options)
+
+        payload = {
+            'benchmark': 'api',
+            'suite': options['suite'],
+            'environment': bench.environment_info(),
+            'config': {k: options[k] for k in ('highlights', 'rows', 'iterations', 'seed')},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(payload, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} results to {options["output"]}'))
+
+    def _get(self, view, path, **kwargs):
+        request = self.factory.get(path)
+        force_authenticate(request, user=self.user)
+        response = view(request, **kwargs)
+        if response.status_code != 200:
+            raise CommandError(f'{path} returned {response.status_code}')
+        response.render()
+        return response
+
+    def _measure(self, view, path, iterations, **kwargs):
+        durations = []
+        size = 0
+        for _ in range(iterations):
+            start = time.perf_counter()
+            size = len(self._get(view, path, **kwargs).content)
+            durations.append(time.perf_counter() - start)
+        return size, bench.latency_summary(durations)
+
+    def _suite_position_data(self, project, options):
+        (doc,) = bench.seed_highlights(project, per_document=options['highlights'], seed=options['seed'])
+        highlights = Highlight.objects.filter(document=doc)
+        view = DocumentViewSet.as_view({'get': 'highlights'})
+        path = f'/api/documents/{doc.pk}/highlights/'
+
+        variants = [('raw', path, None), ('quantized', path, 'normalize'), ('packed', f'{path}?rects=packed', None)]
+        rows = []
+        for name, url, step in variants:
+            if step == 'normalize':
+                Highlight.objects.bulk_update(
+                    [Highlight(pk=pk, position_data=normalize_position_data(data))
+                     for pk, data in highlights.values_list('pk', 'position_data')],
+                    ['position_data'],
+                    batch_size=1000,
+                )
+            size, latency = self._measure(view, url, options['iterations'], pk=doc.pk)
+            row = {
+                'variant': name,
+                'highlights': options['highlights'],
+                'stored_position_bytes_avg': _stored_bytes(highlights),
+                'response_bytes': size,
+                'latency_ms': latency,
+            }
+            rows.append(row)
+            self.stdout.write(
+                f'{name:<10} stored={row["stored_position_bytes_avg"]:>7}B/row '
+                f'response={size / 1024:>9.1f}KB p50={latency["p50"]}ms p95={latency["p95"]}ms'
+            )
+        return rows
+
+    def _seed_sizes(self, project, options):
+        """Grow the project's highlights to each --rows size in turn, yielding the size."""
+        seeded = 0
+        for n in sorted(options['rows']):
+            while seeded < n:
+                batch = min(HIGHLIGHTS_PER_DOCUMENT, n - seeded)
+                bench.seed_highlights(project, per_document=batch, seed=options['seed'] + seeded)
+                seeded += batch
+            yield n
+
+    def _suite_serializers(self, project, options):
+        renderer = JSONRenderer()
+        highlights = Highlight.objects.filter(document__project=project)
+        paths = {
+            'highlights': (
+                lambda: HighlightSerializer(_highlights_for_api(highlights).order_by(*HIGHLIGHT_ORDERING), many=True).data,
+                lambda: highlight_rows(highlights.order_by(*HIGHLIGHT_ORDERING).values(*HIGHLIGHT_ROW_FIELDS)),
+            ),
+            'library': (
+                lambda: LibraryHighlightSerializer(
+                    highlights.select_related('document__project', 'note').order_by(*LIBRARY_ORDERING), many=True,
+                ).data,
+                lambda: library_rows(highlights.order_by(*LIBRARY_ORDERING).values(*LIBRARY_ROW_FIELDS)),
+            ),
+        }
+        rows = []
+        for n in self._seed_sizes(project, options):
+            for endpoint, (model_path, fast_path) in paths.items():
+                timings = {}
+                for variant, build in (('serializer', model_path), ('fast', fast_path)):
+                    durations = []
+                    for _ in range(options['iterations']):
+                        start = time.perf_counter()
+                        body = renderer.render(build())
+                        durations.append(time.perf_counter() - start)
+                    timings[variant] = (bench.latency_summary(durations), body)
+                (slow, slow_body), (fast, fast_body) = timings['serializer'], timings['fast']
+                row = {
+                    'endpoint': endpoint,
+                    'rows': n,
+                    'identical': slow_body == fast_body,
+                    'response_bytes': len(fast_body),
+                    'serializer_ms': slow,
+                    'fast_ms': fast,
+                    'speedup_p50': round(slow['p50'] / fast['p50'], 2) if fast['p50'] else None,
+                }
+                rows.append(row)
+                self.stdout.write(
+                    f'{endpoint:<10} rows={n:<7} serializer p50={slow["p50"]}ms fast p50={fast["p50"]}ms '
+                    f'x{row["speedup_p50"]} identical={row["identical"]}'
+                )
+                if not row['identical']:
+                    self.stdout.write(self.style.WARNING('  fast path output differs from the serializer'))
+        return rows
+
+    def _suite_sql_json(self, project, options):
+        renderer = JSONRenderer()
+        highlights = Highlight.objects.filter(document__project=project)
+        paths = {
+            'highlights': (
+                lambda: highlight_rows(highlights.order_by(*HIGHLIGHT_ORDERING).values(*HIGHLIGHT_ROW_FIELDS)),
+                lambda: sql_json.highlights_json(highlights, HIGHLIGHT_ORDERING)[0],
+            ),
+            'library': (
+                lambda: library_rows(highlights.order_by(*LIBRARY_ORDERING).values(*LIBRARY_ROW_FIELDS)),
+                lambda: sql_json.library_json(highlights, LIBRARY_ORDERING)[0],
+            ),
+        }
+        rows = []
+        for n in self._seed_sizes(project, options):
+            # Exercise the fallbacks: colours missing from the lens, with and without a stored name
+            ids = list(highlights.order_by('id').values_list('id', flat=True)[::25])
+            Highlight.objects.filter(pk__in=ids[::2]).update(color_key='retired', color_display_name='Old name ')
+            Highlight.objects.filter(pk__in=ids[1::2]).update(color_key='pink-old', color_display_name='')
+            for endpoint, (python_path, sql_path) in paths.items():
+                timings = {}
+                for variant, build in (('python', lambda: renderer.render(python_path())), ('sql', sql_path)):
+                    durations = []
+                    for _ in range(options['iterations']):
+                        start = time.perf_counter()
+                        body = build()
+                        durations.append(time.perf_counter() - start)
+                    timings[variant] = (bench.latency_summary(durations), body)
+                (py, py_body), (db, db_body) = timings['python'], timings['sql']
+                expected, actual = json.loads(py_body), json.loads(db_body)
+                mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+                if len(expected) != len(actual):
+                    mismatches.append(min(len(expected), len(actual)))
+                row = {
+                    'endpoint': endpoint,
+                    'rows': n,
+                    'identical': py_body == db_body.encode(),
+                    'python_ms': py,
+                    'sql_ms': db,
+                    'python_bytes': len(py_body),
+                    'sql_bytes': len(db_body),
+                    'speedup_p50': round(py['p50'] / db['p50'], 2) if db['p50'] else None,
+                }
+                rows.append(row)
+                self.stdout.write(
+                    f'{endpoint:<10} rows={n:<7} python p50={py["p50"]}ms sql p50={db["p50"]}ms '
+                    f'x{row["speedup_p50"]} identical={row["identical"]}'
+                )
+                if mismatches:
+                    i = mismatches[0]
+                    self.stdout.write(self.style.WARNING(
+                        f'  {len(mismatches)} rows differ; first at {i}:\n'
+                        f'  python {expected[i] if i < len(expected) else None}\n'
+                        f'  sql    {actual[i] if i < len(actual) else None}'
+                    ))
+        if any(not r['identical'] for r in rows):
+            raise CommandError('SQL JSON output differs from the Python path.')
+        return rows
+
+    def _suite_renderers(self, project, options):
+        if renderers.orjson is None:
+            raise CommandError('The renderers suite needs orjson installed.')
+        encoders = [('drf', JSONRenderer()), ('orjson', renderers.JSONRenderer())]
+        if renderers.msgpack is not None:
+            encoders.append(('msgpack', renderers.MessagePackRenderer()))
+        view = LibraryView.as_view()
+        rows = []
+        for n in self._seed_sizes(project, options):
+            # The body LibraryView builds on the Python path, captured before rendering
+            with override_settings(SQL_JSON_LISTS=False):
+                request = self.factory.get('/api/library/')
+                force_authenticate(request, user=self.user)
+                data = view(request).data
+            bodies = {}
+            for name, renderer in encoders:
+                durations = []
+                for _ in range(options['iterations']):
+                    start = time.perf_counter()
+                    body = renderer.render(data)
+                    durations.append(time.perf_counter() - start)
+                bodies[name] = body
+                row = {
+                    'renderer': name,
+                    'rows': n,
+                    'encode_ms': bench.latency_summary(durations),
+                    'response_bytes': len(body),
+                    'gzip_bytes': len(gzip.compress(body, compresslevel=6)),
+                }
+                if name == 'orjson':
+                    row['identical_to_drf'] = body == bodies['drf']
+                rows.append(row)
+                self.stdout.write(
+                    f'{name:<8} rows={n:<7} encode p50={row["encode_ms"]["p50"]}ms '
+                    f'size={len(body) / 1024:>9.1f}KB gzip={row["gzip_bytes"] / 1024:>8.1f}KB'
+                )
+            if bodies['orjson'] != bodies['drf']:
+                raise CommandError('orjson renderer output differs from DRF\'s JSONRenderer.')
+        return rows
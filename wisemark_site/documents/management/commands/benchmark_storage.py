@@ -0,0 +1,185 @@
+"""
+Benchmark PDF storage backends (database BLOB vs S3) end to end.
+
+For each backend, PDF size and concurrency level it measures:
+  upload           DocumentViewSet.create (multipart)
+  get_pdf_bytes    Document.get_pdf_bytes on a freshly loaded row
+  pdf_view         GET /api/documents/<id>/pdf/
+  public_pdf_view  GET /api/public/documents/<token>/pdf/
+
+S3 is the in-memory LocalS3 stand-in with --s3-latency-ms added per call, so no AWS
+access is needed. Runs against the configured database inside a throwaway user.
+
+Run: python manage.py benchmark_storage --sizes 1,10,50 --concurrency 1,5,20 --output storage.json
+"""
+
+import itertools
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from documents import bench
+from documents.models import Document
+from documents.views import DocumentViewSet, PublicDocumentPdfView
+
+BACKENDS = ('postgres', 's3')
+OPERATIONS = ('upload', 'get_pdf_bytes', 'pdf_view', 'public_pdf_view')
+MB = 1024 * 1024
+
+
+def _csv(cast):
+    def parse(value):
+        try:
+            return [cast(v) for v in value.split(',') if v.strip()]
+        except ValueError as e:
+            raise CommandError(str(e))
+    return parse
+
+
+class Command(BaseCommand):
+    help = 'Benchmark PDF upload and read paths for each storage backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=_csv(float), default=[1, 10, 50], help='PDF sizes in MB (default 1,10,50).')
+        parser.add_argument('--concurrency', type=_csv(int), default=[1, 5, 20], help='Concurrency levels (default 1,5,20).')
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per read operation and level (default 20).')
+        parser.add_argument('--upload-iterations', type=int, default=5, help='Uploads per size and level (default 5).')
+        parser.add_argument('--backends', type=_csv(str), default=list(BACKENDS), help='postgres,s3')
+        parser.add_argument('--operations', type=_csv(str), default=list(OPERATIONS), help=','.join(OPERATIONS))
+        parser.add_argument('--s3-latency-ms', type=float, default=20.0, help='Latency added to every S3 call (default 20).')
+        parser.add_argument('--s3-bandwidth-mbps', type=float, default=None, help='Simulated S3 transfer rate in MB/s (default unlimited).')
+        parser.add_argument('--output', help='Write machine-readable results (JSON) to this path.')
+
+    def handle(self, *args, **options):
+        for name in options['backends']:
+            if name not in BACKENDS:
+                raise CommandError(f'Unknown backend "{name}". Choose from {", ".join(BACKENDS)}.')
+        for name in options['operations']:
+            if name not in OPERATIONS:
+                raise CommandError(f'Unknown operation "{name}". Choose from {", ".join(OPERATIONS)}.')
+
+        self.factory = APIRequestFactory()
+        self.seeds = itertools.count(1)
+        bandwidth = options['s3_bandwidth_mbps']
+        stub = bench.LocalS3(
+            latency=options['s3_latency_ms'] / 1000.0,
+            bandwidth=bandwidth * MB if bandwidth else None,
+        )
+        results = []
+        # DEBUG query logging would keep every PDF blob in connection.queries
+        with override_settings(DEBUG=False), bench.bench_account() as (user, project):
+            self.user = user
+            self.project = project
+            for backend in options['backends']:
+                storage = bench.use_local_s3(stub) if backend == 's3' else bench.s3_disabled()
+                with storage:
+                    for size_mb in options['sizes']:
+                        results.extend(self._run_size(backend, int(size_mb * MB), options))
+
+        payload = {
+            'benchmark': 'storage',
+            'environment': bench.environment_info(),
+            'config': {
+                'sizes_mb': options['sizes'],
+                'concurrency': options['concurrency'],
+                'iterations': options['iterations'],
+                'upload_iterations': options['upload_iterations'],
+                's3_latency_ms': options['s3_latency_ms'],
+                's3_bandwidth_mbps': bandwidth,
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(payload, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} results to {options["output"]}'))
+
+    def _upload_request(self, size):
+        data = bench.synthetic_pdf(size, seed=next(self.seeds))
+        request = self.factory.post(
+            '/api/documents/',
+            {'project': self.project.pk, 'file': SimpleUploadedFile('bench.pdf', data, 'application/pdf')},
+            format='multipart',
+        )
+        force_authenticate(request, user=self.user)
+        return request
+
+    def _run_size(self, backend, size, options):
+        create_view = DocumentViewSet.as_view({'post': 'create'})
+        pdf_view = DocumentViewSet.as_view({'get': 'pdf'})
+        public_view = PublicDocumentPdfView.as_view()
+
+        # One document per backend/size serves all read operations
+        response = create_view(self._upload_request(size))
+        if response.status_code != 201:
+            raise CommandError(f'Could not create benchmark document: {response.status_code} {response.data}')
+        doc_id = response.data['id']
+        token = f'bench-{doc_id}'
+        Document.objects.filter(pk=doc_id).update(public_share_token=token)
+
+        def upload(request):
+            r = create_view(request)
+            if r.status_code != 201:
+                raise RuntimeError(f'upload returned {r.status_code}')
+
+        def get_pdf_bytes(_):
+            if not Document.objects.get(pk=doc_id).get_pdf_bytes():
+                raise RuntimeError('no bytes')
+
+        def authed_get(path):
+            request = self.factory.get(path)
+            force_authenticate(request, user=self.user)
+            return request
+
+        def read_pdf(request):
+            r = pdf_view(request, pk=doc_id)
+            if r.status_code != 200:
+                raise RuntimeError(f'pdf returned {r.status_code}')
+
+        def read_public(request):
+            r = public_view(request, token=token)
+            if r.status_code != 200:
+                raise RuntimeError(f'public pdf returned {r.status_code}')
+
+        plans = {
+            'upload': (upload, lambda i: self._upload_request(size), options['upload_iterations']),
+            'get_pdf_bytes': (get_pdf_bytes, None, options['iterations']),
+            'pdf_view': (read_pdf, lambda i: authed_get(f'/api/documents/{doc_id}/pdf/'), options['iterations']),
+            'public_pdf_view': (read_public, lambda i: self.factory.get(f'/api/public/documents/{token}/pdf/'), options['iterations']),
+        }
+        rows = []
+        for operation in options['operations']:
+            fn, setup, iterations = plans[operation]
+            for concurrency in options['concurrency']:
+                run = bench.run_concurrent(fn, concurrency, iterations, setup=setup)
+                ok = len(run['durations'])
+                rps = ok / run['wall_seconds'] if run['wall_seconds'] else 0.0
+                row = {
+                    'backend': backend,
+                    'operation': operation,
+                    'size_bytes': size,
+                    'concurrency': concurrency,
+                    'requests': iterations,
+                    'errors': len(run['errors']),
+                    'throughput_rps': round(rps, 3),
+                    'throughput_mb_s': round(rps * size / MB, 3),
+                    'latency_ms': bench.latency_summary(run['durations']),
+                    'peak_rss_mb': round(run['peak_rss_bytes'] / MB, 1),
+                }
+                rows.append(row)
+                self._print_row(row, run['errors'])
+        return rows
+
+    def _print_row(self, row, errors):
+        lat = row['latency_ms']
+        self.stdout.write(
+            f'{row["backend"]:<8} {row["operation"]:<16} {row["size_bytes"] / MB:>7.1f}MB '
+            f'c={row["concurrency"]:<3} {row["throughput_rps"]:>8.2f} req/s '
+            f'p50={lat["p50"]}ms p95={lat["p95"]}ms p99={lat["p99"]}ms '
+            f'rss={row["peak_rss_mb"]}MB'
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f'  {len(errors)} errors, first: {errors[0]}'))
@@ -0,0 +1,40 @@
+"""
+Rebuild the full-text table behind Library search (documents/search.py): the FTS5 table on
+SQLite or documents_highlight_search on Postgres, with the triggers that maintain it. Also
+recomputes the search-box completion terms (documents/terms.py).
+
+SQLite drops triggers when a migration rebuilds the highlight or note table; search then
+falls back to substring matching until this is run. Also use it after loading rows with
+triggers disabled.
+Run: python manage.py rebuild_search_index
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from documents import search, terms
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search table and triggers for Library search, refill them and recount completion terms.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            table = None
+            if connection.vendor == 'postgresql':
+                table = search.PG_SEARCH_TABLE
+                search.install_postgres_search(cursor)
+            elif connection.vendor == 'sqlite' and search.sqlite_fts_supported(cursor):
+                table = search.FTS_TABLE
+                search.install_sqlite_fts(cursor)
+            if table:
+                cursor.execute(f'SELECT count(*) FROM {table}')
+                rows = cursor.fetchone()[0]
+            term_count = terms.rebuild()
+        if table:
+            self.stdout.write(self.style.SUCCESS(f'Indexed {rows} highlight(s) in {table}.'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'No full-text support on this {connection.vendor} database; Library search uses substring matching.'
+            ))
+        self.stdout.write(self.style.SUCCESS(f'Counted {term_count} completion term(s).'))
@@ -0,0 +1,116 @@
+"""
+Find and delete PDF objects in S3 that no live document references any more.
+
+Soft-deleted documents, permanently removed documents, deleted projects and deleted
+accounts all leave their objects behind; this command is the only place that deletes
+them. An object is kept when a non-deleted document points at it by s3_key, or by
+pdfs/{pdf_hash}.pdf (Document.get_pdf_bytes falls back to that key).
+
+Objects modified within the grace period are never deleted, so uploads whose
+Document row is not committed yet are safe.
+
+Run: python manage.py reconcile_s3 [--grace-hours 24] [--dry-run]
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from documents import s3_storage
+from documents.models import Document
+
+
+def _hash_key(pdf_hash):
+    return f'{s3_storage.S3_PREFIX}{s3_storage._normalize_hash(pdf_hash)}.pdf'
+
+
+def _live_documents():
+    return Document.objects.filter(deleted_at__isnull=True)
+
+
+class Command(BaseCommand):
+    help = 'Delete S3 PDF objects that are no longer referenced by any live document.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Only delete objects last modified more than this many hours ago (default 24).',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List orphaned objects without deleting them.',
+        )
+
+    def handle(self, *args, **options):
+        if not s3_storage.is_s3_configured():
+            raise CommandError('S3 is not configured (AWS_STORAGE_BUCKET_NAME unset).')
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Dry run — nothing will be deleted.'))
+
+        # List the bucket first so anything referenced by the time the DB is read is kept
+        candidates = []
+        total = 0
+        recent = 0
+        for key, last_modified in s3_storage.iter_pdf_objects():
+            total += 1
+            if last_modified > cutoff:
+                recent += 1
+                continue
+            candidates.append(key)
+
+        referenced = set()
+        rows = _live_documents().values_list('s3_key', 'pdf_hash').iterator(chunk_size=2000)
+        for s3_key, pdf_hash in rows:
+            if s3_key:
+                referenced.add(s3_key)
+            if pdf_hash:
+                referenced.add(_hash_key(pdf_hash))
+
+        orphans = [key for key in candidates if key not in referenced]
+        self.stdout.write(
+            f'{total} objects under {s3_storage.S3_PREFIX}, {recent} within grace period, '
+            f'{len(referenced)} referenced keys, {len(orphans)} orphaned.'
+        )
+        if dry_run:
+            for key in orphans:
+                self.stdout.write(f'  {key}')
+            return
+
+        deleted = 0
+        failed = 0
+        size = s3_storage.DELETE_BATCH_SIZE
+        for start in range(0, len(orphans), size):
+            batch = self._still_orphaned(orphans[start:start + size])
+            if not batch:
+                continue
+            errors = s3_storage.delete_pdfs(batch)
+            failed += len(errors)
+            deleted += len(batch) - len(errors)
+        msg = f'Deleted {deleted} orphaned objects.'
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{msg} {failed} could not be deleted (see log).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(msg))
+
+    def _still_orphaned(self, keys):
+        """Re-check a batch against the DB right before deleting, to narrow the race with new uploads."""
+        prefix = s3_storage.S3_PREFIX
+        hashes = [k[len(prefix):-len('.pdf')] for k in keys if k.startswith(prefix) and k.endswith('.pdf')]
+        live = set()
+        for s3_key, pdf_hash in (
+            _live_documents()
+            .filter(Q(s3_key__in=keys) | Q(pdf_hash__in=hashes))
+            .values_list('s3_key', 'pdf_hash')
+        ):
+            if s3_key:
+                live.add(s3_key)
+            if pdf_hash:
+                live.add(_hash_key(pdf_hash))
+        return [k for k in keys if k not in live]
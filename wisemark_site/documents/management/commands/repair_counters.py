@@ -0,0 +1,39 @@
+"""
+Recompute the stored document/highlight counters on projects and documents.
+
+The counters are kept up to date by documents/counters.py; run this after bulk imports,
+manual SQL, or if a project card shows the wrong number.
+Run: python manage.py repair_counters [--batch-size 500]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from documents import counters
+from documents.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Recompute Project.document_count / annotation_count and Document.annotation_count in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Projects per transaction (default 500).')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        last_pk = 0
+        checked = fixed = 0
+        while True:
+            batch = list(
+                Project.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]
+            with transaction.atomic():
+                fixed += counters.recompute(batch)
+            checked += len(batch)
+        message = f'Checked {checked} project(s); {fixed} had stale counters.'
+        self.stdout.write(self.style.WARNING(message) if fixed else self.style.SUCCESS(message))
@@ -6,7 +6,9 @@ Run: python manage.py reset_system_lenses [--dry-run]
 """
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from documents import bulk
 from documents.models import HighlightPreset, PresetColor
 
 
@@ -51,12 +53,28 @@ class Command(BaseCommand):
         if dry_run:
             self.stdout.write(self.style.WARNING('Dry run — no database changes.'))
 
+        with transaction.atomic():
+            self._reset(dry_run)
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('\nRun without --dry-run to apply.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\nSystem lenses reset to defaults.'))
+
+    def _reset(self, dry_run):
+        """Compare every system lens with its defaults in two queries; write each in one upsert."""
+        presets_by_name = {
+            p.name: p
+            for p in HighlightPreset.objects.filter(user__isnull=True, name__in=SYSTEM_PRESET_NAMES)
+        }
+        existing_colors = {}
+        for row in PresetColor.objects.filter(preset__in=presets_by_name.values()):
+            existing_colors.setdefault(row.preset_id, {})[row.key] = row
+
         for preset_name in SYSTEM_PRESET_NAMES:
             default_colors = PRESET_DEFAULT_COLORS[preset_name]
             default_keys = {row[0] for row in default_colors}
-            preset = HighlightPreset.objects.filter(
-                user__isnull=True, name=preset_name
-            ).first()
+            preset = presets_by_name.get(preset_name)
 
             if not preset:
                 msg = f'System preset "{preset_name}" not found; skipping.'
@@ -74,8 +92,10 @@ class Command(BaseCommand):
             if not preset:
                 continue
 
+            current = existing_colors.get(preset.pk, {})
+            changed = False
             for key, display_name, hex_val, sort_order in default_colors:
-                existing = PresetColor.objects.filter(preset=preset, key=key).first()
+                existing = current.get(key)
                 if existing:
                     same = (
                         existing.display_name == display_name
@@ -93,31 +113,22 @@ class Command(BaseCommand):
                     self.stdout.write(
                         f'  {preset_name} / {key}: create "{display_name}"'
                     )
-
-                if not dry_run:
-                    PresetColor.objects.update_or_create(
-                        preset=preset,
-                        key=key,
-                        defaults={
-                            'display_name': display_name,
-                            'hex': hex_val,
-                            'sort_order': sort_order,
-                        },
-                    )
+                changed = True
 
             # Remove colours on this system preset that are not in the default five
-            extras = PresetColor.objects.filter(preset=preset).exclude(key__in=default_keys)
-            for row in extras:
+            for row in current.values():
+                if row.key in default_keys:
+                    continue
                 self.stdout.write(
                     self.style.WARNING(
                         f'  {preset_name}: removing extra colour key "{row.key}" '
                         f'({row.display_name})'
                     )
                 )
-                if not dry_run:
-                    row.delete()
+                changed = True
 
-        if dry_run:
-            self.stdout.write(self.style.WARNING('\nRun without --dry-run to apply.'))
-        else:
-            self.stdout.write(self.style.SUCCESS('\nSystem lenses reset to defaults.'))
+            if changed and not dry_run:
+                bulk.set_preset_colors(preset.pk, [
+                    {'key': key, 'display_name': display_name, 'hex': hex_val, 'sort_order': sort_order}
+                    for key, display_name, hex_val, sort_order in default_colors
+                ])
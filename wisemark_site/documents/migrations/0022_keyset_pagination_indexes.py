@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0021_highlightchange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['-updated_at', 'id'], name='document_updated_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['project', '-updated_at', 'id'], name='document_project_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='highlight',
+            index=models.Index(fields=['document', 'page_number', 'created_at', 'id'], name='highlight_doc_page_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='highlight',
+            index=models.Index(fields=['-created_at', 'id'], name='highlight_created_keyset'),
+        ),
+    ]
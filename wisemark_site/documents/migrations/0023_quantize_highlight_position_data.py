@@ -0,0 +1,80 @@
+# Generated by Django
+
+import math
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+# A copy of documents.geometry.normalize_position_data as of this migration, so later
+# changes there don't rewrite history. Stored values are kept whatever their range.
+POSITION_SCALE = 100
+RECT_FIELDS = ('x', 'y', 'width', 'height')
+
+
+def quantize(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return value
+    scaled = value * POSITION_SCALE
+    if not math.isfinite(scaled):
+        return 0
+    q = round(scaled)
+    if q % POSITION_SCALE == 0:
+        return q // POSITION_SCALE
+    return q / POSITION_SCALE
+
+
+def normalize_position_data(data):
+    if not isinstance(data, dict):
+        return data
+    rects = data.get('rects')
+    if not isinstance(rects, list):
+        return data
+    normalized = dict(data)
+    normalized['rects'] = [
+        {**r, **{k: quantize(r[k]) for k in RECT_FIELDS if r.get(k) is not None}}
+        if isinstance(r, dict) else r
+        for r in rects
+    ]
+    return normalized
+
+
+def forwards(apps, schema_editor):
+    Highlight = apps.get_model('documents', 'Highlight')
+    last_pk = 0
+    while True:
+        rows = list(
+            Highlight.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'position_data')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        changed = []
+        for pk, position_data in rows:
+            normalized = normalize_position_data(position_data)
+            if normalized != position_data:
+                changed.append(Highlight(pk=pk, position_data=normalized))
+        if changed:
+            with transaction.atomic():
+                Highlight.objects.bulk_update(changed, ['position_data'])
+
+
+def backwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('documents', '0022_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0023_quantize_highlight_position_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='highlight',
+            name='bbox_bottom',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='highlight',
+            name='bbox_left',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='highlight',
+            name='bbox_right',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='highlight',
+            name='bbox_top',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='highlight',
+            index=models.Index(fields=['document', 'page_number', 'bbox_top'], name='highlight_doc_page_bbox'),
+        ),
+    ]
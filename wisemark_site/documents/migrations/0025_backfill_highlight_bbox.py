@@ -0,0 +1,78 @@
+# Generated by Django
+
+import math
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+# A copy of documents.geometry.bbox_fields as of this migration, so later changes there
+# don't rewrite history.
+POSITION_SCALE = 100
+MIN_RECT_HEIGHT = 4
+BBOX_FIELDS = ('bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right')
+
+
+def quantize(value):
+    scaled = value * POSITION_SCALE
+    if not math.isfinite(scaled):
+        return 0
+    q = round(scaled)
+    if q % POSITION_SCALE == 0:
+        return q // POSITION_SCALE
+    return q / POSITION_SCALE
+
+
+def bbox_fields(position_data):
+    rects = position_data.get('rects') if isinstance(position_data, dict) else None
+    rects = [r for r in rects or () if isinstance(r, dict)]
+    if not rects:
+        return dict.fromkeys(BBOX_FIELDS)
+
+    def num(r, key, default=0):
+        try:
+            return float(r.get(key) or default)
+        except (TypeError, ValueError):
+            return float(default)
+
+    return {
+        'bbox_top': quantize(min(num(r, 'y') for r in rects)),
+        'bbox_left': quantize(min(num(r, 'x') for r in rects)),
+        'bbox_bottom': quantize(max(num(r, 'y') + num(r, 'height', MIN_RECT_HEIGHT) for r in rects)),
+        'bbox_right': quantize(max(num(r, 'x') + num(r, 'width') for r in rects)),
+    }
+
+
+def forwards(apps, schema_editor):
+    Highlight = apps.get_model('documents', 'Highlight')
+    last_pk = 0
+    while True:
+        rows = list(
+            Highlight.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'position_data')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        with transaction.atomic():
+            Highlight.objects.bulk_update(
+                [Highlight(pk=pk, **bbox_fields(position_data)) for pk, position_data in rows],
+                list(BBOX_FIELDS),
+            )
+
+
+def backwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('documents', '0024_highlight_bbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
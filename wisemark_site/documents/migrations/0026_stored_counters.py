@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0025_backfill_highlight_bbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='annotation_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Number of highlights'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='annotation_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Highlights across all documents'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='document_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django
+
+from django.db import migrations, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def _count(queryset, group_by, aggregate):
+    return Coalesce(
+        Subquery(queryset.order_by().values(group_by).annotate(n=aggregate).values('n')[:1]),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def forwards(apps, schema_editor):
+    Project = apps.get_model('documents', 'Project')
+    Document = apps.get_model('documents', 'Document')
+    Highlight = apps.get_model('documents', 'Highlight')
+    last_pk = 0
+    while True:
+        batch = list(
+            Project.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1]
+        with transaction.atomic():
+            Document.objects.filter(project_id__in=batch).update(annotation_count=_count(
+                Highlight.objects.filter(document=OuterRef('pk')), 'document', Count('pk'),
+            ))
+            Project.objects.filter(pk__in=batch).update(
+                document_count=_count(Document.objects.filter(project=OuterRef('pk')), 'project', Count('pk')),
+                annotation_count=_count(
+                    Document.objects.filter(project=OuterRef('pk')), 'project', Sum('annotation_count'),
+                ),
+            )
+
+
+def backwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('documents', '0026_stored_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
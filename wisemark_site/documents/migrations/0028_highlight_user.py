@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0027_backfill_stored_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Nullable until 0029 has filled it; 0030 makes it required
+        migrations.AddField(
+            model_name='highlight',
+            name='user',
+            field=models.ForeignKey(
+                db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE,
+                related_name='highlights', to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name='highlight',
+            name='highlight_created_keyset',
+        ),
+        migrations.AddIndex(
+            model_name='highlight',
+            index=models.Index(fields=['user', '-created_at', 'id'], name='highlight_user_created'),
+        ),
+    ]
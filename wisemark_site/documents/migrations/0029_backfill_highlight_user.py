@@ -0,0 +1,40 @@
+# Generated by Django
+
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def forwards(apps, schema_editor):
+    Highlight = apps.get_model('documents', 'Highlight')
+    Document = apps.get_model('documents', 'Document')
+    owner = Subquery(Document.objects.filter(pk=OuterRef('document_id')).values('project__user_id')[:1])
+    last_pk = 0
+    while True:
+        pks = list(
+            Highlight.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not pks:
+            break
+        last_pk = pks[-1]
+        with transaction.atomic():
+            Highlight.objects.filter(pk__gte=pks[0], pk__lte=last_pk, user__isnull=True).update(user_id=owner)
+
+
+def backwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('documents', '0028_highlight_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0030_highlight_user_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='color_labels',
+            field=models.JSONField(blank=True, default=dict, help_text='Custom names for legacy colour keys (key -> label). Payload keys are the colours kept on the document.'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def forwards(apps, schema_editor):
+    Document = apps.get_model('documents', 'Document')
+    DocumentColor = apps.get_model('documents', 'DocumentColor')
+    last_pk = 0
+    while True:
+        doc_ids = list(
+            DocumentColor.objects.filter(document_id__gt=last_pk).order_by('document_id')
+            .values_list('document_id', flat=True).distinct()[:BATCH_SIZE]
+        )
+        if not doc_ids:
+            break
+        last_pk = doc_ids[-1]
+        labels = {pk: {} for pk in doc_ids}
+        for document_id, key, custom_name in (
+            DocumentColor.objects.filter(document_id__in=doc_ids).order_by('color__key')
+            .values_list('document_id', 'color__key', 'custom_name')
+        ):
+            labels[document_id][key] = custom_name or ''
+        with transaction.atomic():
+            Document.objects.bulk_update(
+                [Document(pk=pk, color_labels=value) for pk, value in labels.items()],
+                ['color_labels'],
+            )
+
+
+def backwards(apps, schema_editor):
+    Document = apps.get_model('documents', 'Document')
+    DocumentColor = apps.get_model('documents', 'DocumentColor')
+    Color = apps.get_model('documents', 'Color')
+    colors = {c.key: c.pk for c in Color.objects.all()}
+    DocumentColor.objects.all().delete()
+    last_pk = 0
+    while True:
+        rows = list(
+            Document.objects.filter(pk__gt=last_pk).exclude(color_labels={}).order_by('pk')
+            .values_list('pk', 'color_labels')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        with transaction.atomic():
+            DocumentColor.objects.bulk_create([
+                DocumentColor(document_id=pk, color_id=colors[key], custom_name=name or '')
+                for pk, value in rows
+                for key, name in (value or {}).items()
+                if key in colors
+            ])
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are not rewritten in one transaction
+    atomic = False
+
+    dependencies = [
+        ('documents', '0031_document_color_labels'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,150 @@
+# Generated by Django
+
+from django.db import migrations
+
+# The full-text tables as this migration creates them. The SQL is copied here rather than
+# imported from documents.search, so later changes there don't rewrite history;
+# rebuild_search_index installs the current version.
+
+SQLITE_FTS_TRIGGERS = {
+    'documents_highlight_fts_insert': (
+        'AFTER INSERT ON documents_highlight BEGIN '
+        "INSERT INTO documents_highlight_fts(rowid, highlighted_text, note_content) "
+        "VALUES (new.id, new.highlighted_text, ''); "
+        'END'
+    ),
+    'documents_highlight_fts_update': (
+        'AFTER UPDATE OF highlighted_text ON documents_highlight BEGIN '
+        'UPDATE documents_highlight_fts SET highlighted_text = new.highlighted_text WHERE rowid = new.id; '
+        'END'
+    ),
+    'documents_highlight_fts_delete': (
+        'AFTER DELETE ON documents_highlight BEGIN '
+        'DELETE FROM documents_highlight_fts WHERE rowid = old.id; '
+        'END'
+    ),
+    'documents_note_fts_insert': (
+        'AFTER INSERT ON documents_note BEGIN '
+        'UPDATE documents_highlight_fts SET note_content = new.content WHERE rowid = new.highlight_id; '
+        'END'
+    ),
+    'documents_note_fts_update': (
+        'AFTER UPDATE OF content, highlight_id ON documents_note BEGIN '
+        "UPDATE documents_highlight_fts SET note_content = '' WHERE rowid = old.highlight_id; "
+        'UPDATE documents_highlight_fts SET note_content = new.content WHERE rowid = new.highlight_id; '
+        'END'
+    ),
+    'documents_note_fts_delete': (
+        'AFTER DELETE ON documents_note BEGIN '
+        "UPDATE documents_highlight_fts SET note_content = '' WHERE rowid = old.highlight_id; "
+        'END'
+    ),
+}
+
+SQLITE_CREATE = [
+    'CREATE VIRTUAL TABLE documents_highlight_fts USING fts5('
+    "highlighted_text, note_content, tokenize = 'porter unicode61 remove_diacritics 2')",
+    *(f'CREATE TRIGGER {name} {body}' for name, body in SQLITE_FTS_TRIGGERS.items()),
+    'INSERT INTO documents_highlight_fts(rowid, highlighted_text, note_content) '
+    "SELECT h.id, h.highlighted_text, coalesce(n.content, '') FROM documents_highlight h "
+    'LEFT JOIN documents_note n ON n.highlight_id = h.id',
+]
+
+SQLITE_DROP = [
+    *(f'DROP TRIGGER IF EXISTS {name}' for name in SQLITE_FTS_TRIGGERS),
+    'DROP TABLE IF EXISTS documents_highlight_fts',
+]
+
+PG_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(h.highlighted_text, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(n.content, '')), 'B')"
+)
+
+PG_CREATE = [
+    'CREATE TABLE documents_highlight_search (highlight_id bigint PRIMARY KEY, vector tsvector NOT NULL)',
+    'CREATE INDEX documents_highlight_search_vector ON documents_highlight_search USING gin (vector)',
+    f"""
+    CREATE FUNCTION documents_highlight_search_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        ids bigint[];
+    BEGIN
+        IF TG_TABLE_NAME = 'documents_highlight' THEN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM documents_highlight_search WHERE highlight_id = OLD.id;
+                RETURN NULL;
+            END IF;
+            ids := ARRAY[NEW.id];
+        ELSIF TG_OP = 'INSERT' THEN
+            ids := ARRAY[NEW.highlight_id];
+        ELSIF TG_OP = 'DELETE' THEN
+            ids := ARRAY[OLD.highlight_id];
+        ELSE
+            ids := ARRAY[OLD.highlight_id, NEW.highlight_id];
+        END IF;
+        INSERT INTO documents_highlight_search (highlight_id, vector)
+        SELECT h.id, {PG_VECTOR}
+        FROM documents_highlight h LEFT JOIN documents_note n ON n.highlight_id = h.id
+        WHERE h.id = ANY(ids)
+        ON CONFLICT (highlight_id) DO UPDATE SET vector = EXCLUDED.vector;
+        RETURN NULL;
+    END
+    $$
+    """,
+    'CREATE TRIGGER documents_highlight_search_highlight '
+    'AFTER INSERT OR DELETE OR UPDATE OF highlighted_text ON documents_highlight '
+    'FOR EACH ROW EXECUTE FUNCTION documents_highlight_search_refresh()',
+    'CREATE TRIGGER documents_highlight_search_note '
+    'AFTER INSERT OR DELETE OR UPDATE OF content, highlight_id ON documents_note '
+    'FOR EACH ROW EXECUTE FUNCTION documents_highlight_search_refresh()',
+    'INSERT INTO documents_highlight_search (highlight_id, vector) '
+    f'SELECT h.id, {PG_VECTOR} FROM documents_highlight h '
+    'LEFT JOIN documents_note n ON n.highlight_id = h.id',
+]
+
+PG_DROP = [
+    # CASCADE drops the triggers that call the function
+    'DROP FUNCTION IF EXISTS documents_highlight_search_refresh() CASCADE',
+    'DROP TABLE IF EXISTS documents_highlight_search',
+]
+
+
+def sqlite_fts_supported(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if cursor.fetchone()[0]:
+        return True
+    cursor.execute("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'")
+    return cursor.fetchone() is not None
+
+
+def run(cursor, statements):
+    for sql in statements:
+        cursor.execute(sql)
+
+
+def forwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            run(cursor, PG_DROP + PG_CREATE)
+        elif vendor == 'sqlite' and sqlite_fts_supported(cursor):
+            run(cursor, SQLITE_DROP + SQLITE_CREATE)
+
+
+def backwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            run(cursor, PG_DROP)
+        elif vendor == 'sqlite':
+            run(cursor, SQLITE_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0032_copy_document_color_labels'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:53
+
+import re
+import unicodedata
+from collections import Counter
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# A copy of documents.terms.tokenize as of this migration, so later changes there don't
+# rewrite history; rebuild_search_index recomputes the terms with the current version.
+MIN_TERM = 2
+MAX_TERM = 64
+BATCH_SIZE = 500
+WORD = re.compile(r'[^\W_]+')
+
+
+def tokenize(*texts):
+    terms = set()
+    for text in texts:
+        if not text:
+            continue
+        text = text.lower()
+        if not text.isascii():
+            text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+        terms.update(w for w in WORD.findall(text) if MIN_TERM <= len(w) <= MAX_TERM)
+    return terms
+
+
+def fill_terms(apps, schema_editor):
+    Highlight = apps.get_model('documents', 'Highlight')
+    HighlightTerms = apps.get_model('documents', 'HighlightTerms')
+    SearchTerm = apps.get_model('documents', 'SearchTerm')
+    counts = Counter()
+    snapshots = []
+    rows = (
+        Highlight.objects.order_by()
+        .values_list('pk', 'user_id', 'highlighted_text', 'note__content')
+        .iterator(chunk_size=2000)
+    )
+    for pk, user_id, text, note in rows:
+        terms = tokenize(text, note)
+        counts.update((user_id, term) for term in terms)
+        snapshots.append(HighlightTerms(highlight_id=pk, user_id=user_id, terms=' '.join(sorted(terms))))
+        if len(snapshots) >= BATCH_SIZE:
+            HighlightTerms.objects.bulk_create(snapshots)
+            snapshots = []
+    HighlightTerms.objects.bulk_create(snapshots)
+    SearchTerm.objects.bulk_create(
+        (SearchTerm(user_id=user_id, term=term, count=n) for (user_id, term), n in counts.items()),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0033_library_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HighlightTerms',
+            fields=[
+                ('highlight_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('terms', models.TextField(default='', help_text='Space-separated')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('query', models.CharField(blank=True, default='', max_length=500)),
+                ('colors', models.JSONField(blank=True, default=list, help_text='Colour keys')),
+                ('projects', models.JSONField(blank=True, default=list, help_text='Project ids')),
+                ('result_count', models.IntegerField(default=0, editable=False)),
+                ('count_cursor', models.BigIntegerField(editable=False, help_text='Null until first counted', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'term'), name='unique_search_term_per_user')],
+            },
+        ),
+        migrations.RunPython(fill_terms, migrations.RunPython.noop),
+    ]
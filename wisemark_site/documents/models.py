@@ -18,6 +18,9 @@ class Project(models.Model):
     )
     name = models.CharField(max_length=255)
     color = models.CharField(max_length=7, default='#f59e0b', help_text='Hex colour for the project card accent')
+    # Maintained by documents/counters.py; repair with manage.py repair_counters
+    document_count = models.IntegerField(default=0, editable=False)
+    annotation_count = models.IntegerField(default=0, editable=False, help_text='Highlights across all documents')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -134,16 +137,27 @@ class Document(models.Model):
         unique=True,
         help_text='Opaque token for public, read-only sharing of this document and its notes.',
     )
+    color_labels = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Custom names for legacy colour keys (key -> label). Payload keys are the colours kept on the document.',
+    )
+    # Maintained by documents/counters.py; repair with manage.py repair_counters
+    annotation_count = models.IntegerField(default=0, editable=False, help_text='Number of highlights')
 
     class Meta:
         ordering = ['-updated_at']
         unique_together = [('project', 'pdf_hash')]
+        indexes = [
+            # Keyset pagination of document lists (see documents.pagination)
+            models.Index(fields=['-updated_at', 'id'], name='document_updated_keyset'),
+            models.Index(fields=['project', '-updated_at', 'id'], name='document_project_keyset'),
+        ]
 
     def get_effective_preset(self):
-        """Return the highlight preset for this document, or the first system preset if unset."""
-        if self.highlight_preset_id:
-            return self.highlight_preset
-        return HighlightPreset.objects.filter(user__isnull=True).order_by('name').first()
+        """Return the lens for this document (a presets.PresetEntry), or the first system preset if unset."""
+        from . import presets
+        return presets.effective(self.highlight_preset_id)
 
     def get_pdf_bytes(self):
         """Return PDF bytes from current storage. Postgres: from pdf_file; S3: fetch from S3.
@@ -173,7 +187,10 @@ class Document(models.Model):
 
 
 class DocumentColor(models.Model):
-    """Per-document custom label for a colour. No row = use Color.default_name. X in UI deletes this row."""
+    """
+    Legacy per-document colour labels, copied into Document.color_labels by migration 0032.
+    No longer read or written; kept so that migration can be reversed.
+    """
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='document_colors')
     color = models.ForeignKey(Color, on_delete=models.CASCADE, related_name='document_colors')
     custom_name = models.CharField(max_length=255, blank=True)
@@ -189,10 +206,20 @@ class Highlight(models.Model):
         on_delete=models.CASCADE,
         related_name='highlights',
     )
+    # Copy of document.project.user, so account-wide queries need no joins. Set on create;
+    # documents only move between projects of the same user.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='highlights',
+        editable=False,
+        db_index=False,  # covered by highlight_user_created
+    )
     page_number = models.PositiveIntegerField()
     position_data = models.JSONField(
         help_text='JSON containing selection range data for re-rendering',
     )
+    # Legacy; no longer set (color_key is the source of truth)
     color = models.ForeignKey(
         Color,
         on_delete=models.PROTECT,
@@ -211,11 +238,23 @@ class Highlight(models.Model):
         help_text='Display name when highlight was created. Shown with (Deleted) when category was removed from lens.',
     )
     highlighted_text = models.TextField()
+    # Bounding box of position_data rects in PDF units, set on write (see geometry.bbox_fields)
+    bbox_top = models.FloatField(null=True, blank=True)
+    bbox_left = models.FloatField(null=True, blank=True)
+    bbox_bottom = models.FloatField(null=True, blank=True)
+    bbox_right = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['page_number', 'created_at']
+        indexes = [
+            # Keyset pagination: per-document reading order and the Library's newest-first order
+            models.Index(fields=['document', 'page_number', 'created_at', 'id'], name='highlight_doc_page_keyset'),
+            models.Index(fields=['user', '-created_at', 'id'], name='highlight_user_created'),
+            # Viewport queries and position order within a page
+            models.Index(fields=['document', 'page_number', 'bbox_top'], name='highlight_doc_page_bbox'),
+        ]
 
 
 class Note(models.Model):
@@ -230,3 +269,90 @@ class Note(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+
+
+class HighlightChange(models.Model):
+    """Append-only log of highlight writes (including note edits) for delta sync.
+    The auto-increment id is the change-feed cursor. Rows keep plain ids rather than
+    foreign keys so deletions survive as tombstones after the highlight is gone."""
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    KIND_CHOICES = [
+        (UPSERT, 'Created or updated'),
+        (DELETE, 'Deleted'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='highlight_changes',
+    )
+    document_id = models.BigIntegerField()
+    highlight_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id'], name='hlchange_user_cursor'),
+            models.Index(fields=['document_id', 'id'], name='hlchange_document_cursor'),
+        ]
+
+
+class SearchTerm(models.Model):
+    """Per-user dictionary of words in highlight text and notes, for search-box completions.
+    count is the number of the user's highlights containing the term. Maintained by
+    documents/terms.py."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        db_index=False,  # covered by unique_search_term_per_user
+    )
+    term = models.CharField(max_length=64)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the sorted index that prefix lookups range-scan
+            models.UniqueConstraint(fields=['user', 'term'], name='unique_search_term_per_user'),
+        ]
+
+
+class HighlightTerms(models.Model):
+    """The terms a highlight (with its note) last contributed to SearchTerm, so edits and
+    deletes can take them back out. Keyed by plain highlight id, like HighlightChange, so
+    the row is still there when a delete is recorded after the highlight is gone."""
+
+    highlight_id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    terms = models.TextField(default='', help_text='Space-separated')
+
+
+class SavedSearch(models.Model):
+    """A Library search (query plus colour and project filters) saved by a user.
+    result_count is the number of matches as of change cursor count_cursor; it is
+    recounted when the user's highlights have changed since (see search.refresh_saved)."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='saved_searches',
+    )
+    name = models.CharField(max_length=255)
+    query = models.CharField(max_length=500, blank=True, default='')
+    colors = models.JSONField(default=list, blank=True, help_text='Colour keys')
+    projects = models.JSONField(default=list, blank=True, help_text='Project ids')
+    result_count = models.IntegerField(default=0, editable=False)
+    count_cursor = models.BigIntegerField(null=True, editable=False, help_text='Null until first counted')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
@@ -0,0 +1,171 @@
+"""
+Process-wide registry of highlight presets (lenses) and their colours.
+
+Serializers and views resolve colour keys through this module instead of querying
+HighlightPreset/PresetColor per request. Entries are loaded on first use (system presets
+eagerly, user presets by id) and kept until invalidated.
+
+Invalidation: post_save/post_delete on HighlightPreset and PresetColor (see signals.py)
+call invalidate(), which clears this process immediately and, once the transaction
+commits, bumps a version token in the shared cache. Other workers compare that token
+at most every VERSION_CHECK_INTERVAL seconds and drop their copy when it changes.
+Code that writes presets without model signals (bulk_create, queryset.update) must
+call invalidate() itself.
+"""
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_CACHE_KEY = 'documents:presets:version'
+VERSION_CHECK_INTERVAL = 1.0  # seconds
+
+PresetColorEntry = namedtuple('PresetColorEntry', 'id key display_name hex sort_order')
+
+
+class PresetEntry:
+    """Read-only snapshot of one preset. colors are in display order."""
+    __slots__ = ('id', 'name', 'user_id', 'colors', 'by_key')
+
+    def __init__(self, id, name, user_id, colors):
+        self.id = id
+        self.name = name
+        self.user_id = user_id
+        self.colors = tuple(colors)
+        self.by_key = {c.key: c for c in self.colors}
+
+    @property
+    def is_system(self):
+        return self.user_id is None
+
+    def resolve(self, color_key):
+        """(color_key, display_name) for a new highlight. Unknown keys fall back to the first colour."""
+        pc = self.by_key.get(color_key)
+        if pc is None and self.colors:
+            pc = self.colors[0]
+            color_key = pc.key
+        return color_key, (pc.display_name if pc else None)
+
+    def as_detail(self):
+        """Shape of DocumentSerializer.highlight_preset_detail."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'colors': [
+                {'key': c.key, 'display_name': c.display_name, 'hex': c.hex, 'sort_order': c.sort_order}
+                for c in self.colors
+            ],
+        }
+
+
+_lock = threading.Lock()
+_state = {
+    'version': None,      # shared token the local entries were loaded under
+    'checked_at': 0.0,    # monotonic time of the last shared-version check
+    'entries': {},        # preset id -> PresetEntry, or None for ids that do not exist
+    'default_id': None,   # first system preset by name
+    'system_loaded': False,
+    'generation': 0,      # bumped on every reset so loads that raced an invalidation are discarded
+}
+
+
+def _load(preset_filter):
+    """PresetEntry objects for HighlightPreset rows matching preset_filter (2 queries)."""
+    from .models import HighlightPreset, PresetColor
+
+    presets = list(
+        HighlightPreset.objects.filter(**preset_filter).order_by('name').values_list('id', 'name', 'user_id')
+    )
+    colors = {}
+    for row in (
+        PresetColor.objects.filter(preset_id__in=[p[0] for p in presets])
+        .order_by('sort_order', 'key')
+        .values_list('preset_id', 'id', 'key', 'display_name', 'hex', 'sort_order')
+    ):
+        colors.setdefault(row[0], []).append(PresetColorEntry(*row[1:]))
+    return [PresetEntry(pid, name, user_id, colors.get(pid, ())) for pid, name, user_id in presets]
+
+
+def _reset_locked(version):
+    _state.update(
+        version=version, entries={}, default_id=None, system_loaded=False,
+        generation=_state['generation'] + 1,
+    )
+
+
+def _check_version():
+    """Drop local entries when another process has invalidated the registry."""
+    now = time.monotonic()
+    if now - _state['checked_at'] < VERSION_CHECK_INTERVAL:
+        return
+    version = cache.get(VERSION_CACHE_KEY)
+    with _lock:
+        _state['checked_at'] = now
+        if version != _state['version']:
+            _reset_locked(version)
+
+
+def _ensure_system():
+    """(entries, default_id) with system presets loaded, valid for the current call."""
+    _check_version()
+    if _state['system_loaded']:
+        return _state['entries'], _state['default_id']
+    generation = _state['generation']
+    loaded = _load({'user__isnull': True})
+    system = {entry.id: entry for entry in loaded}
+    default_id = loaded[0].id if loaded else None
+    with _lock:
+        if generation == _state['generation']:
+            _state['entries'].update(system)
+            _state['default_id'] = default_id
+            _state['system_loaded'] = True
+    return {**_state['entries'], **system}, default_id
+
+
+def get_many(preset_ids):
+    """{id: PresetEntry} for the given ids; unknown ids are omitted. Loads misses in one batch."""
+    entries, _ = _ensure_system()
+    ids = {pid for pid in preset_ids if pid}
+    missing = [pid for pid in ids if pid not in entries]
+    if missing:
+        generation = _state['generation']
+        loaded = {entry.id: entry for entry in _load({'pk__in': missing})}
+        with _lock:
+            if generation == _state['generation']:
+                for pid in missing:
+                    _state['entries'][pid] = loaded.get(pid)
+        entries = {**entries, **loaded}
+    return {pid: entries[pid] for pid in ids if entries.get(pid) is not None}
+
+
+def get(preset_id):
+    """PresetEntry for preset_id, or None."""
+    return get_many([preset_id]).get(preset_id) if preset_id else None
+
+
+def default():
+    """The default lens (first system preset by name), or None."""
+    entries, default_id = _ensure_system()
+    return entries.get(default_id) if default_id else None
+
+
+def effective(preset_id):
+    """The document's lens: preset_id if it exists, else the default."""
+    return get(preset_id) or default()
+
+
+def _bump_version():
+    version = uuid.uuid4().hex
+    cache.set(VERSION_CACHE_KEY, version, None)
+    with _lock:
+        _reset_locked(version)
+
+
+def invalidate():
+    """Forget cached presets here now, and in every worker once the current transaction commits."""
+    with _lock:
+        _reset_locked(_state['version'])
+    transaction.on_commit(_bump_version)
@@ -74,3 +74,41 @@ def delete_pdf(s3_key: str) -> None:
         )
     except Exception as e:
         logger.warning("Failed to delete S3 object key=%s: %s", s3_key, e)
+
+
+# delete_objects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+def iter_pdf_objects(prefix: str = S3_PREFIX):
+    """Yield (key, last_modified) for every object under prefix, paging with list_objects_v2."""
+    client = _get_client()
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Prefix=prefix,
+    ):
+        for obj in page.get("Contents", []):
+            yield obj["Key"], obj["LastModified"]
+
+
+def delete_pdfs(s3_keys) -> list[str]:
+    """
+    Delete many objects with delete_objects, DELETE_BATCH_SIZE keys per call.
+    Returns the keys S3 reported as failed (missing keys count as deleted).
+    """
+    keys = list(s3_keys)
+    failed = []
+    client = _get_client()
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start:start + DELETE_BATCH_SIZE]
+        resp = client.delete_objects(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+        )
+        for err in resp.get("Errors", []):
+            logger.warning(
+                "Failed to delete S3 object key=%s: %s", err.get("Key"), err.get("Message")
+            )
+            failed.append(err.get("Key"))
+    return failed
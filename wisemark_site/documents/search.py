@@ -0,0 +1,587 @@
+"""
+Server-side Library search: ranked full-text matches over highlight text and notes, with
+filters, page-number pagination and facet counts.
+
+LibraryView calls library_search() when the request has any of q, color, project, document,
+created_after or created_before. The backend is chosen per database:
+
+  PostgresBackend   websearch_to_tsquery against documents_highlight_search: one tsvector
+                    per highlight (its text, weighted above its note's content) with a GIN
+                    index; ranked with ts_rank; ts_headline snippets.
+  SQLiteBackend     FTS5 table documents_highlight_fts (highlight text and note columns);
+                    ranked with bm25(); snippet() snippets. The same query syntax is
+                    translated to FTS5.
+  SubstringBackend  case-insensitive substring match, newest first. Used when neither applies,
+                    e.g. SQLite built without FTS5.
+
+Both full-text tables hold one row per highlight, so every term may match in the highlight or
+in its note. Database triggers (migration 0033) keep them in step with highlight and note
+writes, including bulk_create and queryset updates.
+
+settings.LIBRARY_SEARCH_BACKEND (a dotted path) overrides the choice. A backend has match(query)
+(a Q for full-text matches), ranked(queryset, query, ordering) and snippets(ids, query).
+
+SQLite drops triggers when a migration rebuilds the highlight or note table. The SQLite
+backend is only used while the table and all its triggers exist; otherwise search falls
+back to substring matching until: python manage.py rebuild_search_index
+
+A text query also matches highlights whose colour name, as the Library shows it (the lens
+name, or the stored name of a colour removed from the lens), contains it. Those rank after
+every full-text match and have no snippet.
+
+Snippets are lists of [text, matched] segments, so clients can mark matches without
+rendering HTML.
+
+Saved searches (SavedSearch) store their result count with the change cursor it was
+counted at; refresh_saved() recounts only those the user's highlight writes have made stale.
+Moving documents between projects logs their highlights as changed (changes.record_moved),
+so counts filtered by project go stale too.
+"""
+import logging
+import re
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Exists, FloatField, OuterRef, Q, Value
+from django.db.models.functions import Coalesce
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+
+from . import changes, presets
+from .models import Highlight, PresetColor, SavedSearch
+from .serializers import LIBRARY_ROW_FIELDS, library_rows
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PARAMS = ('q', 'color', 'project', 'document', 'created_after', 'created_before')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Text search configuration for the Postgres vectors and queries
+SEARCH_CONFIG = 'english'
+SNIPPET_WORDS = 30
+
+FTS_TABLE = 'documents_highlight_fts'        # SQLite
+PG_SEARCH_TABLE = 'documents_highlight_search'  # Postgres
+
+# Backends put these around matched terms; _segments() splits on them
+_START, _STOP = '\x02', '\x03'
+
+SearchParams = namedtuple(
+    'SearchParams', 'query colors projects documents created_after created_before page page_size',
+)
+
+
+def search_requested(request):
+    """True when the Library request asks for a search rather than the full list."""
+    return any(request.query_params.get(name) for name in SEARCH_PARAMS)
+
+
+def _list_param(params, name, cast=str):
+    """Values of a repeatable, comma-separated parameter (?color=a,b or ?color=a&color=b)."""
+    values = [v.strip() for raw in params.getlist(name) for v in raw.split(',') if v.strip()]
+    try:
+        return [cast(v) for v in values]
+    except ValueError:
+        raise ValidationError({name: ['Use a comma-separated list of ids.']})
+
+
+def _date_param(params, name, end_of_day):
+    """An aware datetime from an ISO date or datetime. A date means the start of that day,
+    or with end_of_day the start of the next one."""
+    raw = (params.get(name) or '').strip()
+    if not raw:
+        return None
+    try:
+        value = parse_datetime(raw)
+        if value is None:
+            day = parse_date(raw)
+            if day is None:
+                raise ValueError
+            value = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    except ValueError:
+        raise ValidationError({name: ['Use an ISO 8601 date or datetime.']})
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _int_param(params, name, default, maximum=None):
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        raise ValidationError({name: ['Must be an integer.']})
+    if value < 1:
+        raise ValidationError({name: ['Must be at least 1.']})
+    return min(value, maximum) if maximum else value
+
+
+def parse_params(request):
+    """SearchParams from the query string. Raises ValidationError for malformed values."""
+    params = request.query_params
+    return SearchParams(
+        query=(params.get('q') or '').strip(),
+        colors=_list_param(params, 'color'),
+        projects=_list_param(params, 'project', int),
+        documents=_list_param(params, 'document', int),
+        created_after=_date_param(params, 'created_after', end_of_day=False),
+        created_before=_date_param(params, 'created_before', end_of_day=True),
+        page=_int_param(params, 'page', 1),
+        page_size=_int_param(params, 'page_size', DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE),
+    )
+
+
+class SubstringBackend:
+    """Case-insensitive substring match on highlight text and notes; no ranking."""
+
+    name = 'substring'
+
+    def match(self, query):
+        return Q(highlighted_text__icontains=query) | Q(note__content__icontains=query)
+
+    def ranked(self, queryset, query, ordering):
+        return queryset.annotate(search_rank=Value(None, output_field=FloatField())).order_by(*ordering)
+
+    def snippets(self, ids, query):
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+
+        def mark(text):
+            return pattern.sub(lambda m: f'{_START}{m.group(0)}{_STOP}', text) if text else text
+        return {
+            pk: (mark(text), mark(note))
+            for pk, text, note in Highlight.objects.filter(pk__in=ids).values_list(
+                'pk', 'highlighted_text', 'note__content'
+            )
+        }
+
+
+class PostgresBackend:
+    """Full-text search over documents_highlight_search (one weighted tsvector per highlight, GIN-indexed)."""
+
+    name = 'postgres'
+
+    # Constant config (not user input), so it can be written into the SQL
+    TSQUERY = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+
+    def match(self, query):
+        return Q(pk__in=RawSQL(
+            f'SELECT highlight_id FROM {PG_SEARCH_TABLE} WHERE vector @@ {self.TSQUERY}', [query],
+        ))
+
+    def ranked(self, queryset, query, ordering):
+        rank = RawSQL(
+            f'SELECT ts_rank(vector, {self.TSQUERY}) FROM {PG_SEARCH_TABLE} '
+            f'WHERE highlight_id = {Highlight._meta.db_table}.id',
+            [query],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(search_rank=rank).order_by('-search_rank', *ordering)
+
+    def snippets(self, ids, query):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery
+        tsquery = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        options = {
+            'config': SEARCH_CONFIG, 'start_sel': _START, 'stop_sel': _STOP,
+            'max_words': SNIPPET_WORDS, 'min_words': SNIPPET_WORDS // 2,
+        }
+        rows = Highlight.objects.filter(pk__in=ids).annotate(
+            text_snippet=SearchHeadline('highlighted_text', tsquery, **options),
+            note_snippet=SearchHeadline('note__content', tsquery, **options),
+        ).values_list('pk', 'text_snippet', 'note_snippet')
+        return {pk: (text, note) for pk, text, note in rows}
+
+
+class SQLiteBackend:
+    """FTS5 search over documents_highlight_fts (one row per highlight, rowid = highlight id)."""
+
+    name = 'sqlite'
+
+    def _match(self, query):
+        """
+        FTS5 query with the websearch_to_tsquery syntax Postgres accepts: words are all
+        required, "quoted phrases" match in order, "or" between terms makes either enough,
+        and -term excludes. Every term is quoted, so FTS5 operators in the input are literal.
+        """
+        terms, excluded = [], []
+        for sign, phrase, word in re.findall(r'(-?)(?:"([^"]*)"?|(\S+))', query):
+            words = re.findall(r'\w+', phrase or word)
+            if not phrase and word.lower() == 'or':
+                if terms and terms[-1] != 'OR':
+                    terms.append('OR')
+                continue
+            if words:
+                (excluded if sign else terms).append('"%s"' % ' '.join(words))
+        if terms and terms[-1] == 'OR':
+            terms.pop()
+        if not terms:
+            return ''
+        match = ' '.join(terms)
+        return f'({match}) NOT ' + ' NOT '.join(excluded) if excluded else match
+
+    def match(self, query):
+        match = self._match(query)
+        if not match:
+            return Q(pk__in=[])
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+
+    def ranked(self, queryset, query, ordering):
+        # bm25() is lower for better matches; highlight text weighs twice the note. It has to
+        # come from a join: as a correlated subquery FTS5 re-runs the MATCH for every row.
+        # The unary + stops the planner probing the FTS table by rowid, so the MATCH scan
+        # runs once and drives the highlight lookups.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'+{FTS_TABLE}.rowid = {Highlight._meta.db_table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[self._match(query)],
+            select={'search_rank': f'-bm25({FTS_TABLE}, 2.0, 1.0)'},
+        ).order_by('-search_rank', *ordering)
+
+    def snippets(self, ids, query):
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', %s), "
+                f"snippet({FTS_TABLE}, 1, %s, %s, '…', %s) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+                [_START, _STOP, SNIPPET_WORDS, _START, _STOP, SNIPPET_WORDS, self._match(query), *ids],
+            )
+            return {pk: (text, note or None) for pk, text, note in cursor.fetchall()}
+
+
+_FTS_TRIGGERS = {
+    'documents_highlight_fts_insert': (
+        'AFTER INSERT ON documents_highlight BEGIN '
+        f"INSERT INTO {FTS_TABLE}(rowid, highlighted_text, note_content) VALUES (new.id, new.highlighted_text, ''); "
+        'END'
+    ),
+    'documents_highlight_fts_update': (
+        'AFTER UPDATE OF highlighted_text ON documents_highlight BEGIN '
+        f'UPDATE {FTS_TABLE} SET highlighted_text = new.highlighted_text WHERE rowid = new.id; '
+        'END'
+    ),
+    'documents_highlight_fts_delete': (
+        'AFTER DELETE ON documents_highlight BEGIN '
+        f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id; '
+        'END'
+    ),
+    'documents_note_fts_insert': (
+        'AFTER INSERT ON documents_note BEGIN '
+        f'UPDATE {FTS_TABLE} SET note_content = new.content WHERE rowid = new.highlight_id; '
+        'END'
+    ),
+    'documents_note_fts_update': (
+        'AFTER UPDATE OF content, highlight_id ON documents_note BEGIN '
+        f"UPDATE {FTS_TABLE} SET note_content = '' WHERE rowid = old.highlight_id; "
+        f'UPDATE {FTS_TABLE} SET note_content = new.content WHERE rowid = new.highlight_id; '
+        'END'
+    ),
+    'documents_note_fts_delete': (
+        'AFTER DELETE ON documents_note BEGIN '
+        f"UPDATE {FTS_TABLE} SET note_content = '' WHERE rowid = old.highlight_id; "
+        'END'
+    ),
+}
+
+_fts_ready = {}  # database alias -> bool, checked once per process
+
+
+def sqlite_fts_supported(cursor):
+    """True when this SQLite build has the FTS5 extension."""
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if cursor.fetchone()[0]:
+        return True
+    cursor.execute("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'")
+    return cursor.fetchone() is not None
+
+
+def install_sqlite_fts(cursor):
+    """(Re)create the FTS5 table and its triggers and fill it from existing highlights."""
+    drop_sqlite_fts(cursor)
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+        "highlighted_text, note_content, tokenize = 'porter unicode61 remove_diacritics 2')"
+    )
+    for name, body in _FTS_TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER {name} {body}')
+    cursor.execute(
+        f'INSERT INTO {FTS_TABLE}(rowid, highlighted_text, note_content) '
+        "SELECT h.id, h.highlighted_text, coalesce(n.content, '') FROM documents_highlight h "
+        'LEFT JOIN documents_note n ON n.highlight_id = h.id'
+    )
+    _fts_ready.clear()
+
+
+def drop_sqlite_fts(cursor):
+    for name in _FTS_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    _fts_ready.clear()
+
+
+# Highlight text weighs 'A' and the note 'B', so ts_rank prefers matches in the highlight
+_PG_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(h.highlighted_text, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(n.content, '')), 'B')"
+)
+_PG_FUNCTION = 'documents_highlight_search_refresh'
+_PG_TRIGGERS = {
+    'documents_highlight_search_highlight': (
+        'AFTER INSERT OR DELETE OR UPDATE OF highlighted_text ON documents_highlight'
+    ),
+    'documents_highlight_search_note': (
+        'AFTER INSERT OR DELETE OR UPDATE OF content, highlight_id ON documents_note'
+    ),
+}
+
+
+def install_postgres_search(cursor):
+    """
+    (Re)create documents_highlight_search, its GIN index and the triggers that refresh a
+    highlight's vector when the highlight or its note changes, and fill it. There is no
+    foreign key, so Django's TRUNCATE-based flush keeps working; the delete trigger and the
+    upsert on insert keep rows in step instead.
+    """
+    drop_postgres_search(cursor)
+    cursor.execute(
+        f'CREATE TABLE {PG_SEARCH_TABLE} (highlight_id bigint PRIMARY KEY, vector tsvector NOT NULL)'
+    )
+    cursor.execute(f'CREATE INDEX {PG_SEARCH_TABLE}_vector ON {PG_SEARCH_TABLE} USING gin (vector)')
+    cursor.execute(f"""
+        CREATE FUNCTION {_PG_FUNCTION}() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            ids bigint[];
+        BEGIN
+            IF TG_TABLE_NAME = 'documents_highlight' THEN
+                IF TG_OP = 'DELETE' THEN
+                    DELETE FROM {PG_SEARCH_TABLE} WHERE highlight_id = OLD.id;
+                    RETURN NULL;
+                END IF;
+                ids := ARRAY[NEW.id];
+            ELSIF TG_OP = 'INSERT' THEN
+                ids := ARRAY[NEW.highlight_id];
+            ELSIF TG_OP = 'DELETE' THEN
+                ids := ARRAY[OLD.highlight_id];
+            ELSE
+                ids := ARRAY[OLD.highlight_id, NEW.highlight_id];
+            END IF;
+            INSERT INTO {PG_SEARCH_TABLE} (highlight_id, vector)
+            SELECT h.id, {_PG_VECTOR}
+            FROM documents_highlight h LEFT JOIN documents_note n ON n.highlight_id = h.id
+            WHERE h.id = ANY(ids)
+            ON CONFLICT (highlight_id) DO UPDATE SET vector = EXCLUDED.vector;
+            RETURN NULL;
+        END
+        $$
+    """)
+    for name, event in _PG_TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER {name} {event} FOR EACH ROW EXECUTE FUNCTION {_PG_FUNCTION}()')
+    cursor.execute(
+        f'INSERT INTO {PG_SEARCH_TABLE} (highlight_id, vector) '
+        f'SELECT h.id, {_PG_VECTOR} FROM documents_highlight h '
+        'LEFT JOIN documents_note n ON n.highlight_id = h.id'
+    )
+
+
+def drop_postgres_search(cursor):
+    # CASCADE drops the triggers that call the function
+    cursor.execute(f'DROP FUNCTION IF EXISTS {_PG_FUNCTION}() CASCADE')
+    cursor.execute(f'DROP TABLE IF EXISTS {PG_SEARCH_TABLE}')
+
+
+def _sqlite_fts_ready():
+    """True when the FTS5 table and every trigger that maintains it exist."""
+    alias = connection.alias
+    if alias not in _fts_ready:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE (type = 'table' AND name = %s) OR type = 'trigger'",
+                [FTS_TABLE],
+            )
+            names = {row[0] for row in cursor.fetchall()}
+        ready = FTS_TABLE in names and names.issuperset(_FTS_TRIGGERS)
+        if FTS_TABLE in names and not ready:
+            logger.warning(
+                'Library search: %s triggers are missing; using substring search. '
+                'Run python manage.py rebuild_search_index.', FTS_TABLE,
+            )
+        _fts_ready[alias] = ready
+    return _fts_ready[alias]
+
+
+def get_backend():
+    """The search backend for the current database (or settings.LIBRARY_SEARCH_BACKEND)."""
+    path = getattr(settings, 'LIBRARY_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'postgresql':
+        return PostgresBackend()
+    if connection.vendor == 'sqlite' and _sqlite_fts_ready():
+        return SQLiteBackend()
+    return SubstringBackend()
+
+
+def _segments(snippet):
+    """[[text, matched], ...] for a snippet marked with _START/_STOP; None when empty."""
+    if not snippet:
+        return None
+    head, *marked = snippet.split(_START)
+    segments = [[head, False]] if head else []
+    for piece in marked:
+        match, _, rest = piece.partition(_STOP)
+        if match:
+            segments.append([match, True])
+        if rest:
+            segments.append([rest, False])
+    return segments
+
+
+def _facets(queryset, params, text_match=None):
+    """
+    Facet counts from one GROUP BY over (color_key, project). Each facet ignores its own
+    filter (so the other options stay visible) but applies the other one. Also returns the
+    number of rows matching both filters and, with text_match, how many of those it matches.
+    """
+    rows = queryset.order_by().values('color_key', 'document__project_id').annotate(
+        n=Count('id'), text_n=Count('id', filter=text_match) if text_match else Value(0),
+    ).values_list('color_key', 'document__project_id', 'n', 'text_n')
+    colors, projects = defaultdict(int), defaultdict(int)
+    total = text_total = 0
+    for color, project, n, text_n in rows:
+        color_ok = not params.colors or color in params.colors
+        project_ok = not params.projects or project in params.projects
+        if project_ok:
+            colors[color] += n
+        if color_ok:
+            projects[project] += n
+        if color_ok and project_ok:
+            total += n
+            text_total += text_n
+    facets = {
+        'colors': [{'color': k, 'count': n} for k, n in sorted(colors.items(), key=lambda i: (-i[1], i[0]))],
+        'projects': [{'id': k, 'count': n} for k, n in sorted(projects.items(), key=lambda i: (-i[1], i[0]))],
+    }
+    return facets, total, text_total
+
+
+def _color_name_match(query):
+    """
+    Q for highlights whose colour name contains query (case-insensitive): the name in the
+    document's lens, or for a colour removed from the lens the name stored on the highlight.
+    """
+    default = presets.default()
+    lens_colors = PresetColor.objects.filter(
+        preset_id=Coalesce(OuterRef('document__highlight_preset_id'), Value(default.id if default else None)),
+        key=OuterRef('color_key'),
+    )
+    return Q(Exists(lens_colors.filter(display_name__icontains=query))) | (
+        Q(color_display_name__icontains=query) & ~Q(Exists(lens_colors))
+    )
+
+
+def _narrowed(queryset, params):
+    """queryset narrowed by documents and dates."""
+    if params.documents:
+        queryset = queryset.filter(document_id__in=params.documents)
+    if params.created_after:
+        queryset = queryset.filter(created_at__gte=params.created_after)
+    if params.created_before:
+        queryset = queryset.filter(created_at__lt=params.created_before)
+    return queryset
+
+
+def _selected(queryset, params):
+    """queryset narrowed by the colour and project filters (which are facets)."""
+    if params.colors:
+        queryset = queryset.filter(color_key__in=params.colors)
+    if params.projects:
+        queryset = queryset.filter(document__project_id__in=params.projects)
+    return queryset
+
+
+def library_search(queryset, params, ordering):
+    """
+    One page of matching highlights (library_rows plus rank and snippet), the total, the next
+    page number and facet counts. queryset is the user's highlights; ordering breaks rank ties
+    and orders unranked results. Full-text matches come first, by rank; colour-name matches
+    follow in ordering. Three queries: facets, the page, and snippets for that page (plus one
+    page query when a page spans both kinds of match).
+    """
+    backend = get_backend()
+    queryset = _narrowed(queryset, params)
+    start = (params.page - 1) * params.page_size
+    stop = start + params.page_size
+    fields = (*LIBRARY_ROW_FIELDS, 'search_rank')
+    unranked = Value(None, output_field=FloatField())
+    rows = []
+    if params.query:
+        text_match = backend.match(params.query)
+        facets, total, text_total = _facets(
+            queryset.filter(text_match | _color_name_match(params.query)), params, text_match,
+        )
+        selected = _selected(queryset, params)
+        if start < text_total:
+            ranked = backend.ranked(selected.filter(text_match), params.query, ordering)
+            rows = list(ranked.values(*fields)[start:stop])
+        if stop > text_total and total > text_total:
+            by_color = selected.filter(_color_name_match(params.query)).exclude(text_match)
+            by_color = by_color.annotate(search_rank=unranked).order_by(*ordering)
+            rows += by_color.values(*fields)[max(start - text_total, 0):stop - text_total]
+    else:
+        facets, total, _ = _facets(queryset, params)
+        selected = _selected(queryset, params).annotate(search_rank=unranked).order_by(*ordering)
+        rows = list(selected.values(*fields)[start:stop])
+
+    snippets = {}
+    if params.query and rows:
+        snippets = backend.snippets([r['id'] for r in rows], params.query)
+    highlights = library_rows(rows)
+    for row, highlight in zip(rows, highlights):
+        highlight['rank'] = row['search_rank']
+        text, note = snippets.get(row['id'], (None, None))
+        highlight['snippet'] = {'text': _segments(text), 'note': _segments(note)} if params.query else None
+    return {
+        'highlights': highlights,
+        'total_highlights': total,
+        'page': params.page,
+        'next_page': params.page + 1 if start + len(rows) < total else None,
+        'facets': facets,
+        'search_backend': backend.name,
+    }
+
+
+def count_matches(queryset, params):
+    """Number of highlights in queryset matching every filter in params; one query."""
+    queryset = _selected(_narrowed(queryset, params), params)
+    if params.query:
+        queryset = queryset.filter(get_backend().match(params.query) | _color_name_match(params.query))
+    return queryset.count()
+
+
+def saved_params(saved):
+    """SearchParams for a SavedSearch."""
+    return SearchParams(
+        query=saved.query.strip(), colors=list(saved.colors), projects=list(saved.projects),
+        documents=[], created_after=None, created_before=None, page=1, page_size=DEFAULT_PAGE_SIZE,
+    )
+
+
+def refresh_saved(user_id, searches):
+    """
+    Recount the user's saved searches whose result_count predates their latest highlight
+    change and store the new counts. With nothing changed this is one query (the cursor);
+    otherwise one count per stale search plus one UPDATE.
+    """
+    searches = list(searches)
+    cursor = changes.latest_cursor(user_id=user_id)
+    stale = [s for s in searches if s.count_cursor is None or s.count_cursor < cursor]
+    for saved in stale:
+        saved.result_count = count_matches(Highlight.objects.filter(user_id=user_id), saved_params(saved))
+        saved.count_cursor = cursor
+    if stale:
+        SavedSearch.objects.bulk_update(stale, ['result_count', 'count_cursor'])
+    return searches
@@ -1,26 +1,18 @@
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Project, Document, DocumentColor, Highlight, Note, Color, HighlightPreset, PresetColor
+from . import bulk, presets
+from .geometry import pack_position_data
+from .models import Project, Document, Color, Highlight, Note, HighlightPreset, PresetColor, SavedSearch
 
 
 class ProjectSerializer(serializers.ModelSerializer):
-    document_count = serializers.SerializerMethodField()
-    annotation_count = serializers.SerializerMethodField()
-
     class Meta:
         model = Project
         fields = ['id', 'name', 'color', 'created_at', 'updated_at', 'document_count', 'annotation_count']
         read_only_fields = ['id', 'created_at', 'updated_at', 'document_count', 'annotation_count']
 
-    def get_document_count(self, obj):
-        return obj.document_count if hasattr(obj, 'document_count') else obj.documents.count()
-
-    def get_annotation_count(self, obj):
-        if hasattr(obj, 'annotation_count'):
-            return obj.annotation_count
-        from .models import Highlight
-        return Highlight.objects.filter(document__project=obj).count()
-
 
 class PresetColorSerializer(serializers.ModelSerializer):
     class Meta:
@@ -51,61 +43,57 @@ class HighlightPresetWriteSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'colors']
         read_only_fields = ['id']
 
+    def validate_colors(self, value):
+        keys = [c['key'] for c in value]
+        if len(keys) != len(set(keys)):
+            raise serializers.ValidationError('Colour keys must be unique within a lens.')
+        return value
+
     def create(self, validated_data):
         colors_data = validated_data.pop('colors', [])
-        preset = HighlightPreset.objects.create(**validated_data)
-        for i, c in enumerate(colors_data):
-            PresetColor.objects.create(
-                preset=preset,
-                key=c['key'],
-                display_name=c['display_name'],
-                hex=c['hex'],
-                sort_order=c.get('sort_order', i),
-            )
+        with transaction.atomic():
+            preset = HighlightPreset.objects.create(**validated_data)
+            bulk.set_preset_colors(preset.pk, colors_data, prune=False)
         return preset
 
     def update(self, instance, validated_data):
         colors_data = validated_data.pop('colors', None)
         instance.name = validated_data.get('name', instance.name)
-        instance.save()
-        if colors_data is not None and instance.user_id is not None:
-            # Replace colors (user presets only)
-            instance.colors.all().delete()
-            for i, c in enumerate(colors_data):
-                PresetColor.objects.create(
-                    preset=instance,
-                    key=c['key'],
-                    display_name=c['display_name'],
-                    hex=c['hex'],
-                    sort_order=c.get('sort_order', i),
-                )
+        with transaction.atomic():
+            instance.save()
+            if colors_data is not None and instance.user_id is not None:
+                # Replace colors (user presets only)
+                bulk.set_preset_colors(instance.pk, colors_data)
         return instance
 
 
-class ColorLabelsField(serializers.Field):
-    """Read: from DocumentColor. Write: dict of color_key -> custom_name. Uses source='*' so we get the document instance."""
+# Fallback swatches for colour keys that are not in the document's lens
+LEGACY_COLOR_HEX = {
+    'yellow': '#EAB308', 'green': '#22C55E', 'blue': '#3B82F6',
+    'pink': '#EC4899', 'orange': '#F97316',
+}
+UNKNOWN_COLOR_HEX = '#94a3b8'
+
 
-    def __init__(self, **kwargs):
-        kwargs.setdefault('source', '*')
-        super().__init__(**kwargs)
+class ColorLabelsField(serializers.Field):
+    """
+    Document.color_labels: dict of color_key -> custom_name, keys in alphabetical order.
+    Only keys in the legacy Color table (editable in the admin) can carry a label.
+    """
 
     def to_representation(self, value):
-        if not value or not getattr(value, 'pk', None):
-            return {}
-        # Use prefetched document_colors if available (from DocumentViewSet queryset)
-        if hasattr(value, '_prefetched_objects_cache') and 'document_colors' in value._prefetched_objects_cache:
-            return {dc.color.key: (dc.custom_name or '') for dc in value.document_colors.all()}
-        qs = DocumentColor.objects.filter(document=value).select_related('color')
-        return {dc.color.key: (dc.custom_name or '') for dc in qs}
+        # Sorted: jsonb does not keep key order
+        return {key: (name or '') for key, name in sorted((value or {}).items())}
 
     def to_internal_value(self, data):
         if not isinstance(data, dict):
-            return {}
-        # Accept all keys with string values (including ""); payload defines which colours stay in the document.
+            raise serializers.SkipField()  # ignored, as before: only a dict replaces the labels
+        # Payload keys = colours that stay in the document (Color keys only); others are removed.
+        keys = set(Color.objects.filter(key__in=[k for k in data if isinstance(k, str)]).values_list('key', flat=True))
         return {
-            str(k): (str(v).strip() if isinstance(v, str) else '')
-            for k, v in data.items()
-            if isinstance(k, (str,))
+            key: (value.strip() if isinstance(value, str) else '')
+            for key, value in sorted(data.items())
+            if key in keys
         }
 
 
@@ -118,7 +106,6 @@ class DocumentSerializer(serializers.ModelSerializer):
         allow_null=True,
     )
     highlight_preset_detail = serializers.SerializerMethodField()
-    annotation_count = serializers.SerializerMethodField()
     is_publicly_shared = serializers.SerializerMethodField()
 
     class Meta:
@@ -132,43 +119,19 @@ class DocumentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'highlight_preset_detail', 'annotation_count', 'is_publicly_shared', 'last_opened_at', 'deleted_at']
 
-    def get_annotation_count(self, obj):
-        if hasattr(obj, '_annotation_count'):
-            return obj._annotation_count
-        return obj.highlights.count()
-
     def get_is_publicly_shared(self, obj):
         return bool(getattr(obj, 'public_share_token', None) and str(obj.public_share_token).strip())
 
-    def _get_default_system_preset(self):
-        """Cache the default system preset so we don't query once per document."""
-        if not hasattr(self, '_cached_system_preset'):
-            self._cached_system_preset = (
-                HighlightPreset.objects.filter(user__isnull=True)
-                .prefetch_related('colors')
-                .order_by('name')
-                .first()
-            )
-        return self._cached_system_preset
-
     def get_highlight_preset_detail(self, obj):
         """Effective preset for this document (selected or first system), with colors."""
         if not obj.pk:
             return None
-        if obj.highlight_preset_id:
-            preset = obj.highlight_preset
-        else:
-            preset = self._get_default_system_preset()
-        if not preset:
-            return None
-        return {
-            'id': preset.id,
-            'name': preset.name,
-            'colors': [
-                {'key': c.key, 'display_name': c.display_name, 'hex': c.hex, 'sort_order': c.sort_order}
-                for c in preset.colors.all()
-            ],
-        }
+        preset = presets.effective(obj.highlight_preset_id)
+        return preset.as_detail() if preset else None
+
+    def get_effective_preset(self, obj):
+        """Normalised shape: the effective preset's id; details are side-loaded by the view."""
+        return effective_preset_id(obj.highlight_preset_id) if obj.pk else None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -186,20 +149,9 @@ class DocumentSerializer(serializers.ModelSerializer):
                 self.fields['highlight_preset'].queryset = HighlightPreset.objects.none()
         if self.instance:
             self.fields['project'].read_only = True
-
-    def update(self, instance, validated_data):
-        color_labels = validated_data.pop('color_labels', None)
-        if color_labels is not None:
-            # Payload keys = colours that stay in the document. Others are removed.
-            for color in Color.objects.all():
-                if color.key in color_labels:
-                    custom_name = (color_labels.get(color.key) or '').strip()
-                    dc, _ = DocumentColor.objects.get_or_create(document=instance, color=color, defaults={'custom_name': ''})
-                    dc.custom_name = custom_name
-                    dc.save()
-                else:
-                    DocumentColor.objects.filter(document=instance, color=color).delete()
-        return super().update(instance, validated_data)
+        if self.context.get('normalized'):
+            del self.fields['highlight_preset_detail']
+            self.fields['effective_preset'] = serializers.SerializerMethodField()
 
 
 class NoteSerializer(serializers.ModelSerializer):
@@ -220,35 +172,30 @@ class HighlightSerializer(serializers.ModelSerializer):
         return NoteSerializer(note).data
 
     def get_color_display_name(self, obj):
-        doc = obj.document
-        preset = None
-        if doc.highlight_preset_id:
-            preset = doc.highlight_preset
-        else:
-            if not hasattr(self, '_cached_system_preset_hl'):
-                self._cached_system_preset_hl = (
-                    HighlightPreset.objects.filter(user__isnull=True)
-                    .prefetch_related('colors')
-                    .order_by('name')
-                    .first()
-                )
-            preset = self._cached_system_preset_hl
-        if preset:
-            for c in preset.colors.all():
-                if c.key == obj.color_key:
-                    return c.display_name
+        preset_id = obj._preset_id if hasattr(obj, '_preset_id') else obj.document.highlight_preset_id
+        preset = presets.effective(preset_id)
+        c = preset.by_key.get(obj.color_key) if preset else None
+        if c:
+            return c.display_name
         prev_name = (obj.color_display_name or '').strip()
         if prev_name:
             return f'{prev_name} (Deleted)'
         return 'Unknown (Deleted)'
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context.get('packed_rects'):
+            data['position_data'] = pack_position_data(data['position_data'])
+        return data
+
     class Meta:
         model = Highlight
         fields = [
             'id', 'page_number', 'position_data', 'color', 'color_display_name',
             'highlighted_text', 'created_at', 'updated_at', 'note',
+            'bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right',
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right']
 
 
 class LibraryHighlightSerializer(serializers.ModelSerializer):
@@ -270,12 +217,14 @@ class LibraryHighlightSerializer(serializers.ModelSerializer):
             return None
         return NoteSerializer(note).data
 
+    def _preset(self, obj):
+        return presets.effective(obj.document.highlight_preset_id)
+
     def get_color_display_name(self, obj):
-        preset = getattr(obj, '_preset', None)
-        if preset:
-            for c in preset.colors.all():
-                if c.key == obj.color_key:
-                    return c.display_name
+        preset = self._preset(obj)
+        c = preset.by_key.get(obj.color_key) if preset else None
+        if c:
+            return c.display_name
         # Category was deleted from lens: show previous name + (Deleted)
         prev_name = (obj.color_display_name or '').strip()
         if prev_name:
@@ -283,17 +232,11 @@ class LibraryHighlightSerializer(serializers.ModelSerializer):
         return 'Unknown (Deleted)'
 
     def get_color_hex(self, obj):
-        preset = getattr(obj, '_preset', None)
-        if preset:
-            for c in preset.colors.all():
-                if c.key == obj.color_key:
-                    return c.hex
-        from .models import Color as LegacyColor
-        defaults = {
-            'yellow': '#EAB308', 'green': '#22C55E', 'blue': '#3B82F6',
-            'pink': '#EC4899', 'orange': '#F97316',
-        }
-        return defaults.get(obj.color_key, '#94a3b8')
+        preset = self._preset(obj)
+        c = preset.by_key.get(obj.color_key) if preset else None
+        if c:
+            return c.hex
+        return LEGACY_COLOR_HEX.get(obj.color_key, UNKNOWN_COLOR_HEX)
 
     class Meta:
         model = Highlight
@@ -303,4 +246,216 @@ class LibraryHighlightSerializer(serializers.ModelSerializer):
             'document_id', 'document_name', 'document_deleted_at',
             'project_id', 'project_name', 'project_color',
             'color_display_name', 'color_hex',
+            'bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right',
         ]
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    """A saved Library search; result_count is filled in by search.refresh_saved."""
+    colors = serializers.ListField(child=serializers.CharField(max_length=60), required=False)
+    projects = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = SavedSearch
+        fields = ['id', 'name', 'query', 'colors', 'projects', 'result_count', 'created_at']
+        read_only_fields = ['id', 'result_count', 'created_at']
+
+
+# Fast path for large list responses. Builds the same dicts (same keys, order and value
+# formatting) as HighlightSerializer / LibraryHighlightSerializer from .values() rows,
+# without per-row serializer and field objects. Keep in sync with the serializers above.
+
+HIGHLIGHT_ROW_FIELDS = (
+    'id', 'page_number', 'position_data', 'color_key', 'color_display_name', 'highlighted_text',
+    'created_at', 'updated_at', 'note__id', 'note__content', 'note__created_at', 'note__updated_at',
+    'bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right', 'document__highlight_preset_id',
+)
+LIBRARY_ROW_FIELDS = (
+    'id', 'page_number', 'color_key', 'color_display_name', 'highlighted_text',
+    'created_at', 'updated_at', 'note__id', 'note__content', 'note__created_at', 'note__updated_at',
+    'document_id', 'document__filename', 'document__deleted_at',
+    'document__project_id', 'document__project__name', 'document__project__color',
+    'bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right', 'document__highlight_preset_id',
+)
+
+
+def _datetime_formatter():
+    """serializers.DateTimeField.to_representation with default settings, resolved once per call."""
+    tz = timezone.get_current_timezone()
+
+    def fmt(value):
+        if value is None:
+            return None
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return fmt
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _color_maps(rows):
+    """{preset_id: {color_key: PresetColorEntry}} for the lenses of rows; None maps to the default lens."""
+    entries = presets.get_many({r['document__highlight_preset_id'] for r in rows})
+    default = presets.default()
+    default_map = default.by_key if default else {}
+    maps = {pid: entry.by_key for pid, entry in entries.items()}
+    return lambda preset_id: maps.get(preset_id, default_map)
+
+
+def _deleted_name(row):
+    prev_name = (row['color_display_name'] or '').strip()
+    return f'{prev_name} (Deleted)' if prev_name else 'Unknown (Deleted)'
+
+
+def highlight_rows(rows, packed_rects=False):
+    """HighlightSerializer(many=True).data for .values(*HIGHLIGHT_ROW_FIELDS) rows."""
+    rows = list(rows)
+    fmt = _datetime_formatter()
+    colors_for = _color_maps(rows)
+    out = []
+    for r in rows:
+        c = colors_for(r['document__highlight_preset_id']).get(r['color_key'])
+        position_data = r['position_data']
+        if packed_rects:
+            position_data = pack_position_data(position_data)
+        out.append({
+            'id': r['id'],
+            'page_number': r['page_number'],
+            'position_data': position_data,
+            'color': str(r['color_key']),
+            'color_display_name': c.display_name if c else _deleted_name(r),
+            'highlighted_text': str(r['highlighted_text']),
+            'created_at': fmt(r['created_at']),
+            'updated_at': fmt(r['updated_at']),
+            'note': None if r['note__id'] is None else {
+                'id': r['note__id'],
+                'content': str(r['note__content']),
+                'created_at': fmt(r['note__created_at']),
+                'updated_at': fmt(r['note__updated_at']),
+            },
+            'bbox_top': _float(r['bbox_top']),
+            'bbox_left': _float(r['bbox_left']),
+            'bbox_bottom': _float(r['bbox_bottom']),
+            'bbox_right': _float(r['bbox_right']),
+        })
+    return out
+
+
+def library_rows(rows):
+    """LibraryHighlightSerializer(many=True).data for .values(*LIBRARY_ROW_FIELDS) rows."""
+    rows = list(rows)
+    fmt = _datetime_formatter()
+    colors_for = _color_maps(rows)
+    out = []
+    for r in rows:
+        c = colors_for(r['document__highlight_preset_id']).get(r['color_key'])
+        project_color = r['document__project__color']
+        out.append({
+            'id': r['id'],
+            'page_number': r['page_number'],
+            'color': str(r['color_key']),
+            'highlighted_text': str(r['highlighted_text']),
+            'created_at': fmt(r['created_at']),
+            'updated_at': fmt(r['updated_at']),
+            'note': None if r['note__id'] is None else {
+                'id': r['note__id'],
+                'content': str(r['note__content']),
+                'created_at': fmt(r['note__created_at']),
+                'updated_at': fmt(r['note__updated_at']),
+            },
+            'document_id': r['document_id'],
+            'document_name': str(r['document__filename']),
+            'document_deleted_at': fmt(r['document__deleted_at']),
+            'project_id': r['document__project_id'],
+            'project_name': str(r['document__project__name']),
+            'project_color': None if project_color is None else str(project_color),
+            'color_display_name': c.display_name if c else _deleted_name(r),
+            'color_hex': c.hex if c else LEGACY_COLOR_HEX.get(r['color_key'], UNKNOWN_COLOR_HEX),
+            'bbox_top': _float(r['bbox_top']),
+            'bbox_left': _float(r['bbox_left']),
+            'bbox_bottom': _float(r['bbox_bottom']),
+            'bbox_right': _float(r['bbox_right']),
+        })
+    return out
+
+
+# Normalised shape (?shape=normalized): rows carry ids and keys, and the documents, projects
+# and lenses they point at are side-loaded once per response as {id: object} maps.
+
+NORMALIZED_LIBRARY_ROW_FIELDS = (
+    'id', 'page_number', 'color_key', 'color_display_name', 'highlighted_text',
+    'created_at', 'updated_at', 'note__id', 'note__content', 'note__created_at', 'note__updated_at',
+    'document_id', 'document__project_id',
+    'bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right', 'document__highlight_preset_id',
+)
+
+
+def normalized_library_rows(rows):
+    """
+    library_rows without the document, project and colour context: colours resolve through
+    documents[document_id].effective_preset. Rows whose colour is no longer in that lens keep
+    color_display_name and color_hex. rows are .values(*NORMALIZED_LIBRARY_ROW_FIELDS).
+    """
+    rows = list(rows)
+    fmt = _datetime_formatter()
+    colors_for = _color_maps(rows)
+    out = []
+    for r in rows:
+        row = {
+            'id': r['id'],
+            'page_number': r['page_number'],
+            'color': str(r['color_key']),
+            'highlighted_text': str(r['highlighted_text']),
+            'created_at': fmt(r['created_at']),
+            'updated_at': fmt(r['updated_at']),
+            'note': None if r['note__id'] is None else {
+                'id': r['note__id'],
+                'content': str(r['note__content']),
+                'created_at': fmt(r['note__created_at']),
+                'updated_at': fmt(r['note__updated_at']),
+            },
+            'document_id': r['document_id'],
+            'project_id': r['document__project_id'],
+            'bbox_top': _float(r['bbox_top']),
+            'bbox_left': _float(r['bbox_left']),
+            'bbox_bottom': _float(r['bbox_bottom']),
+            'bbox_right': _float(r['bbox_right']),
+        }
+        if r['color_key'] not in colors_for(r['document__highlight_preset_id']):
+            row['color_display_name'] = _deleted_name(r)
+            row['color_hex'] = LEGACY_COLOR_HEX.get(r['color_key'], UNKNOWN_COLOR_HEX)
+        out.append(row)
+    return out
+
+
+def effective_preset_id(preset_id):
+    """Id of the lens a document with highlight_preset_id uses (the default when unset or gone)."""
+    preset = presets.effective(preset_id)
+    return preset.id if preset else None
+
+
+def side_loaded_documents(user, document_ids):
+    """{id: {id, filename, deleted_at, project, effective_preset}} for the user's documents in document_ids."""
+    fmt = _datetime_formatter()
+    rows = Document.objects.filter(project__user=user, pk__in=set(document_ids)).values_list(
+        'id', 'filename', 'deleted_at', 'project_id', 'highlight_preset_id',
+    )
+    return {
+        pk: {
+            'id': pk,
+            'filename': str(filename),
+            'deleted_at': fmt(deleted_at),
+            'project': project_id,
+            'effective_preset': effective_preset_id(preset_id),
+        }
+        for pk, filename, deleted_at, project_id, preset_id in rows
+    }
+
+
+def side_loaded_presets(preset_ids):
+    """{id: highlight_preset_detail} for lens ids."""
+    return {pid: entry.as_detail() for pid, entry in presets.get_many(preset_ids).items()}
@@ -0,0 +1,34 @@
+"""Model signal handlers for the documents app (connected in DocumentsConfig.ready)."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import library_cache, presets
+from .models import Document, HighlightPreset, PresetColor, Project
+
+
+@receiver(post_save, sender=HighlightPreset)
+@receiver(post_delete, sender=HighlightPreset)
+@receiver(post_save, sender=PresetColor)
+@receiver(post_delete, sender=PresetColor)
+def invalidate_preset_registry(sender, **kwargs):
+    presets.invalidate()
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_written(sender, instance, **kwargs):
+    library_cache.bump(instance.user_id)
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def document_written(sender, instance, origin=None, **kwargs):
+    # Documents deleted with their project (or account) are covered by the project's signal
+    if origin is not None and origin is not instance and getattr(origin, 'model', None) is not Document:
+        return
+    if Document.project.is_cached(instance):
+        user_id = instance.project.user_id
+    else:
+        user_id = Project.objects.filter(pk=instance.project_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        library_cache.bump(user_id)
@@ -0,0 +1,219 @@
+"""
+Postgres-side JSON for the largest highlight lists.
+
+highlights_json / library_json build the response list with row_to_json + string_agg
+(joined to notes, documents, projects and the lens colours), so no model instances or
+Python dicts are created. library_json_lines streams the same rows through a server-side
+cursor for NDJSON responses. The text is byte-identical to serializers.highlight_rows /
+library_rows rendered by the JSONRenderer (tests.SQLJSONTests). Where Postgres and Python
+differ, the SQL does the Python thing: U+2028/U+2029 are escaped as the renderer escapes
+them, and stored colour names are trimmed of every character str.strip() removes, not
+only the ASCII ones btrim removes by default.
+
+Callers check available() and fall back to the Python fast path otherwise (SQLite, a
+non-UTC time zone, or SQL_JSON_LISTS = False).
+
+Verify against the Python path: python manage.py benchmark_api --suite sql_json
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from . import presets
+from .models import Document, Highlight, Note, PresetColor, Project
+from .serializers import LEGACY_COLOR_HEX, UNKNOWN_COLOR_HEX
+
+# Every character str.strip() removes (str.isspace()); tests.SQLJSONTextTests checks the list
+WHITESPACE = (
+    '\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005'
+    '\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000'
+)
+_STRIP_CHARS = ' || '.join(f'chr({ord(char)})' for char in WHITESPACE)
+
+# jsonb text holds a string value if it has a backslash or a '"' followed by ',', '}' or ']'
+STRING_VALUE_MARKERS = ('\\', '",', '"}', '"]')
+# A whole JSON string (kept) or a separator followed by the space jsonb adds (dropped)
+SEPARATOR_PATTERN = r'("(?:[^"\\]|\\.)*")|([,:]) '
+
+
+def available():
+    """True when the SQL path can be used for this request."""
+    return (
+        connection.vendor == 'postgresql'
+        and getattr(settings, 'SQL_JSON_LISTS', True)
+        and timezone.get_current_timezone_name() == 'UTC'
+    )
+
+
+def _timestamp(column):
+    """DRF DateTimeField output: ISO 8601 in UTC with 'Z', microseconds only when non-zero."""
+    return (
+        f"(to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS') || "
+        f"CASE WHEN mod(extract(microseconds FROM {column})::bigint, 1000000) = 0 THEN '' "
+        f"ELSE to_char({column} AT TIME ZONE 'UTC', '.US') END || 'Z')"
+    )
+
+
+def _float(column):
+    """
+    Python's float repr as JSON (20.0, not 20). Exact for the bbox columns: hundredths of a
+    point within geometry.MAX_COORDINATE. Postgres writes exponents from 1e+15 and below
+    1e-04, and spells them differently from orjson (1e-05 vs 0.00001).
+    """
+    return (
+        f"CASE WHEN {column} IS NULL THEN NULL WHEN {column}::text ~ '[.e]' THEN {column}::text::json "
+        f"ELSE ({column}::text || '.0')::json END"
+    )
+
+
+def _compact(column):
+    """
+    jsonb text without the space jsonb puts after ',' and ':', as the JSON renderer writes it.
+    Without STRING_VALUE_MARKERS every string is a key, so plain replace() is safe.
+    Otherwise SEPARATOR_PATTERN, which matches strings whole (about 10x slower), strips
+    only the separators.
+    """
+    text = f'{column}::text'
+    markers = ' + '.join(f"strpos({text}, '{marker}')" for marker in STRING_VALUE_MARKERS)
+    return (
+        f"CASE WHEN {markers} = 0 THEN replace(replace({text}, ', ', ','), ': ', ':') "
+        f"ELSE regexp_replace({text}, '{SEPARATOR_PATTERN}', '\\1\\2', 'g') END::json"
+    )
+
+
+def _escape_line_separators(text):
+    """U+2028/U+2029 escaped, as the JSON renderer writes them (they only occur inside strings)."""
+    return f"replace(replace({text}, chr(8232), '\\u2028'), chr(8233), '\\u2029')"
+
+
+def _display_name():
+    """Lens display name, else the stored name marked (Deleted)."""
+    return (
+        f"CASE WHEN pc.id IS NOT NULL THEN pc.display_name "
+        f"WHEN btrim(coalesce(h.color_display_name, ''), {_STRIP_CHARS}) <> '' "
+        f"THEN btrim(h.color_display_name, {_STRIP_CHARS}) || ' (Deleted)' "
+        f"ELSE 'Unknown (Deleted)' END"
+    )
+
+
+def _color_hex():
+    cases = ' '.join(f"WHEN '{key}' THEN '{hex_}'" for key, hex_ in LEGACY_COLOR_HEX.items())
+    return f"coalesce(pc.hex, CASE h.color_key {cases} ELSE '{UNKNOWN_COLOR_HEX}' END)"
+
+
+def _record(columns):
+    """Compact JSON object (row_to_json keeps column order) for (key, sql_expression) pairs."""
+    select = ', '.join(f'{expr} AS "{key}"' for key, expr in columns)
+    return f'(SELECT row_to_json(r) FROM (SELECT {select}) r)'
+
+
+def _note():
+    columns = [
+        ('id', 'n.id'),
+        ('content', 'n.content'),
+        ('created_at', _timestamp('n.created_at')),
+        ('updated_at', _timestamp('n.updated_at')),
+    ]
+    return f'CASE WHEN n.id IS NULL THEN NULL ELSE {_record(columns)} END'
+
+
+_BBOX = [
+    ('bbox_top', _float('h.bbox_top')),
+    ('bbox_left', _float('h.bbox_left')),
+    ('bbox_bottom', _float('h.bbox_bottom')),
+    ('bbox_right', _float('h.bbox_right')),
+]
+
+
+def _highlight_object():
+    return _record([
+        ('id', 'h.id'),
+        ('page_number', 'h.page_number'),
+        ('position_data', _compact('h.position_data')),
+        ('color', 'h.color_key'),
+        ('color_display_name', _display_name()),
+        ('highlighted_text', 'h.highlighted_text'),
+        ('created_at', _timestamp('h.created_at')),
+        ('updated_at', _timestamp('h.updated_at')),
+        ('note', _note()),
+        *_BBOX,
+    ])
+
+
+def _library_object():
+    return _record([
+        ('id', 'h.id'),
+        ('page_number', 'h.page_number'),
+        ('color', 'h.color_key'),
+        ('highlighted_text', 'h.highlighted_text'),
+        ('created_at', _timestamp('h.created_at')),
+        ('updated_at', _timestamp('h.updated_at')),
+        ('note', _note()),
+        ('document_id', 'd.id'),
+        ('document_name', 'd.filename'),
+        ('document_deleted_at', _timestamp('d.deleted_at')),
+        ('project_id', 'p.id'),
+        ('project_name', 'p.name'),
+        ('project_color', 'p.color'),
+        ('color_display_name', _display_name()),
+        ('color_hex', _color_hex()),
+        *_BBOX,
+    ])
+
+
+def _joined(queryset, ordering):
+    """(FROM clause, params) joining queryset's highlights to what the row objects read; o._ord is the ordering."""
+    inner = (
+        queryset.order_by()
+        .annotate(_ord=Window(RowNumber(), order_by=list(ordering)))
+        .values('id', '_ord')
+    )
+    inner_sql, inner_params = inner.query.sql_with_params()
+    default = presets.default()
+    sql = (
+        f"FROM ({inner_sql}) o "
+        f"JOIN {Highlight._meta.db_table} h ON h.id = o.id "
+        f"JOIN {Document._meta.db_table} d ON d.id = h.document_id "
+        f"JOIN {Project._meta.db_table} p ON p.id = d.project_id "
+        f"LEFT JOIN {Note._meta.db_table} n ON n.highlight_id = h.id "
+        f"LEFT JOIN {PresetColor._meta.db_table} pc "
+        f"ON pc.preset_id = coalesce(d.highlight_preset_id, %s) AND pc.key = h.color_key"
+    )
+    return sql, (*inner_params, default.id if default else None)
+
+
+def _aggregate(queryset, ordering, row_object):
+    """(json_text, row_count) for queryset rendered with row_object, in ordering."""
+    joined, params = _joined(queryset, ordering)
+    # string_agg rather than json_agg, which separates elements with ', '
+    text = f"'[' || coalesce(string_agg({row_object}::text, ',' ORDER BY o._ord), '') || ']'"
+    sql = f"SELECT {_escape_line_separators(text)}, count(*) {joined}"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        text, count = cursor.fetchone()
+    return text, count
+
+
+def highlights_json(queryset, ordering):
+    """HighlightSerializer list output as JSON text, plus the row count."""
+    return _aggregate(queryset, ordering, _highlight_object())
+
+
+def library_json(queryset, ordering):
+    """LibraryHighlightSerializer list output as JSON text, plus the row count."""
+    return _aggregate(queryset, ordering, _library_object())
+
+
+def library_json_lines(queryset, ordering, chunk_size):
+    """
+    LibraryHighlightSerializer output one row at a time: yields lists of up to chunk_size
+    JSON texts, read through a server-side cursor.
+    """
+    joined, params = _joined(queryset, ordering)
+    with connection.chunked_cursor() as cursor:
+        row = _escape_line_separators(f'{_library_object()}::text')
+        cursor.execute(f'SELECT {row} {joined} ORDER BY o._ord', params)
+        while rows := cursor.fetchmany(chunk_size):
+            yield [text for text, in rows]
@@ -0,0 +1,152 @@
+"""
+Per-user term dictionary for Library search-box completions.
+
+SearchTerm holds one row per (user, term) with the number of the user's highlights whose
+text or note contains the term. It is kept up to date incrementally: changes.record_upserts
+and changes.record_deletes (called by every highlight and note write) call
+highlights_written(), which diffs each highlight's terms against the snapshot in
+HighlightTerms and applies the differences with one INSERT ... ON CONFLICT DO UPDATE
+(Postgres and SQLite >= 3.24), so a write costs a few queries whatever its size.
+
+completions() range-scans the (user, term) unique index for a prefix.
+
+Terms are lowercased words of letters and digits with accents removed, MIN_TERM to MAX_TERM
+characters long; prefixes are normalised the same way. Fill or repair the dictionary with
+python manage.py rebuild_search_index
+"""
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import connection, transaction
+
+from . import bulk
+from .models import Highlight, HighlightTerms, SearchTerm
+
+MIN_TERM = 2
+MAX_TERM = 64
+MAX_COMPLETIONS = 20
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    """Lowercase text with accents removed."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def tokenize(*texts):
+    """The distinct terms in texts (None and '' are skipped)."""
+    terms = set()
+    for text in texts:
+        if text:
+            terms.update(w for w in _WORD.findall(normalize(text)) if MIN_TERM <= len(w) <= MAX_TERM)
+    return terms
+
+
+def _add_counts(user_id, deltas):
+    """Add deltas ({term: +/-n}) to the user's SearchTerm counts; drop terms that reach zero."""
+    rows = [(user_id, term, n) for term, n in deltas.items() if n]
+    table = SearchTerm._meta.db_table
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), bulk.BATCH_SIZE):
+            batch = rows[start:start + bulk.BATCH_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, term, count) VALUES '
+                + ', '.join(['(%s, %s, %s)'] * len(batch))
+                + f' ON CONFLICT (user_id, term) DO UPDATE SET count = {table}.count + excluded.count',
+                [value for row in batch for value in row],
+            )
+    dropped = [term for _, term, n in rows if n < 0]
+    for start in range(0, len(dropped), bulk.BATCH_SIZE):
+        SearchTerm.objects.filter(
+            user_id=user_id, term__in=dropped[start:start + bulk.BATCH_SIZE], count__lte=0,
+        ).delete()
+
+
+def highlights_written(user_id, highlight_ids, deleted=False):
+    """
+    Update the user's terms after these highlights were created, edited (text or note) or,
+    with deleted, removed. Highlights that no longer exist are treated as removed.
+    """
+    ids = set(highlight_ids)
+    if not ids:
+        return
+    before = {
+        pk: set(terms.split())
+        for pk, terms in HighlightTerms.objects.filter(highlight_id__in=ids).values_list('highlight_id', 'terms')
+    }
+    after = {}
+    if not deleted:
+        rows = Highlight.objects.filter(pk__in=ids).values_list('pk', 'highlighted_text', 'note__content')
+        after = {pk: tokenize(text, note) for pk, text, note in rows}
+    deltas = Counter()
+    for pk in ids:
+        old, new = before.get(pk, set()), after.get(pk, set())
+        for term in new - old:
+            deltas[term] += 1
+        for term in old - new:
+            deltas[term] -= 1
+    changed = [
+        HighlightTerms(highlight_id=pk, user_id=user_id, terms=' '.join(sorted(terms)))
+        for pk, terms in after.items() if before.get(pk) != terms
+    ]
+    gone = [pk for pk in before if pk not in after]
+    with transaction.atomic(savepoint=False):
+        _add_counts(user_id, deltas)
+        bulk.upsert(HighlightTerms, changed, ('highlight_id',), ('terms',))
+        if gone:
+            HighlightTerms.objects.filter(highlight_id__in=gone).delete()
+
+
+def completions(user_id, prefix, limit=10):
+    """
+    Up to limit of the user's terms starting with prefix, most frequent first, as
+    {'term', 'count'} dicts. Only the last word of prefix is completed.
+    """
+    words = _WORD.findall(normalize(prefix))
+    if not words:
+        return []
+    word = words[-1][:MAX_TERM]
+    # A range on the sorted index; startswith re-checks it under non-C collations
+    upper = word[:-1] + chr(ord(word[-1]) + 1)
+    rows = (
+        SearchTerm.objects.filter(user_id=user_id, term__gte=word, term__lt=upper, term__startswith=word)
+        .order_by('-count', 'term')
+        .values('term', 'count')[:min(limit, MAX_COMPLETIONS)]
+    )
+    return list(rows)
+
+
+def rebuild(user_ids=None):
+    """
+    Recompute SearchTerm and HighlightTerms from highlights and notes, for these users or
+    everyone. Returns the number of terms written.
+    """
+    scope = {'user_id__in': user_ids} if user_ids is not None else {}
+    HighlightTerms.objects.filter(**scope).delete()
+    SearchTerm.objects.filter(**scope).delete()
+
+    counts = Counter()
+    snapshots = []
+    rows = (
+        Highlight.objects.filter(**scope).order_by()
+        .values_list('pk', 'user_id', 'highlighted_text', 'note__content')
+        .iterator(chunk_size=2000)
+    )
+    for pk, user_id, text, note in rows:
+        terms = tokenize(text, note)
+        counts.update((user_id, term) for term in terms)
+        snapshots.append(HighlightTerms(highlight_id=pk, user_id=user_id, terms=' '.join(sorted(terms))))
+        if len(snapshots) >= bulk.BATCH_SIZE:
+            HighlightTerms.objects.bulk_create(snapshots)
+            snapshots = []
+    HighlightTerms.objects.bulk_create(snapshots)
+    SearchTerm.objects.bulk_create(
+        (SearchTerm(user_id=user_id, term=term, count=n) for (user_id, term), n in counts.items()),
+        batch_size=bulk.BATCH_SIZE,
+    )
+    return len(counts)
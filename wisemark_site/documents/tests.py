@@ -1,3 +1,1475 @@
-from django.test import TestCase
+import base64
+import datetime
+import decimal
+import io
+import json
+import re
+import sys
+import unittest
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import renderers
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from accounts.models import Account
+from wisemark_site.renderers import JSONRenderer, MessagePackRenderer, msgpack
+from . import sql_json
+from .models import (
+    Color, Document, Highlight, HighlightChange, HighlightPreset, Note, PresetColor, Project, SearchTerm,
+    StorageLocation,
+)
+from .serializers import (
+    HIGHLIGHT_ROW_FIELDS, LIBRARY_ROW_FIELDS, HighlightSerializer, LibraryHighlightSerializer,
+    highlight_rows, library_rows,
+)
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+POSITION = {'rects': [{'x': 10, 'y': 20, 'width': 30, 'height': 8}]}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class APITestCase(TestCase):
+    """Signed-in client for a paid account with one project and document."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(username='reader', email='reader@example.com')
+        Account.objects.create(user=self.user, account_type='paid')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.project = Project.objects.create(user=self.user, name='Research')
+        self.document = self.make_document(self.project)
+
+    def make_document(self, project, pdf_hash='a' * 64, **fields):
+        return Document.objects.create(
+            project=project, pdf_hash=pdf_hash, filename=f'{pdf_hash[:8]}.pdf', file_size=3, **fields
+        )
+
+    def add_highlight(self, document=None, text='Margin compression', note=None, color='yellow', page=1):
+        document = document or self.document
+        response = self.client.post(f'/api/documents/{document.pk}/highlights/', {
+            'page_number': page, 'position_data': POSITION, 'highlighted_text': text,
+            'color': color, **({'comment': note} if note else {}),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+
+class CopyDocumentsTests(APITestCase):
+    def test_copy_keeps_pdf_bytes_in_the_database(self):
+        self.document.storage_location = StorageLocation.POSTGRES
+        self.document.pdf_file = b'%PDF-1.7 stored bytes'
+        self.document.save()
+        target = Project.objects.create(user=self.user, name='Target')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                '/api/documents/copy/', {'document_ids': [self.document.pk], 'project': target.pk}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        copy = Document.objects.get(pk=response.json()['results'][0]['document'])
+        self.assertEqual(bytes(copy.pdf_file), b'%PDF-1.7 stored bytes')
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'pdf_file' in sql])
+
+
+class UploadTests(APITestCase):
+    """Uploaded PDF bytes end up in the database or S3; pdf_file and s3_key are not serializer fields."""
+
+    def upload(self):
+        from .bench import synthetic_pdf
+        self.pdf = synthetic_pdf(4096)
+        response = self.client.post('/api/documents/', {
+            'project': self.project.pk, 'file': SimpleUploadedFile('paper.pdf', self.pdf, 'application/pdf'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Document.objects.get(pk=response.json()['id'])
+
+    def download(self, document):
+        response = self.client.get(f'/api/documents/{document.pk}/pdf/')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response) if response.streaming else response.content
+
+    def test_upload_without_s3_stores_the_bytes(self):
+        from .bench import s3_disabled
+        with s3_disabled():
+            document = self.upload()
+            self.assertEqual(
+                (document.storage_location, bytes(document.pdf_file), document.s3_key),
+                (StorageLocation.POSTGRES, self.pdf, None),
+            )
+            self.assertEqual(self.download(document), self.pdf)
+
+    def test_upload_to_s3_records_the_key(self):
+        from .bench import LocalS3, use_local_s3
+        with use_local_s3(LocalS3()) as s3:
+            document = self.upload()
+            key = f'pdfs/{document.pdf_hash}.pdf'
+            self.assertEqual((document.storage_location, document.pdf_file, document.s3_key), (StorageLocation.S3, None, key))
+            self.assertEqual(s3.objects[key][0], self.pdf)
+            self.assertEqual(self.download(document), self.pdf)
+
+
+class BulkTargetTests(APITestCase):
+    """Move and copy validate their payload before touching the database."""
+
+    def test_invalid_payloads_are_rejected(self):
+        target = Project.objects.create(user=self.user, name='Target')
+        for url in ('/api/documents/move/', '/api/documents/copy/'):
+            for payload, field in (
+                ({'document_ids': [self.document.pk], 'project': 'abc'}, 'project'),
+                ({'document_ids': [self.document.pk], 'project': [target.pk]}, 'project'),
+                ({'document_ids': [self.document.pk], 'project': True}, 'project'),
+                ({'document_ids': [True], 'project': target.pk}, 'document_ids'),
+                ({'document_ids': ['x'], 'project': target.pk}, 'document_ids'),
+            ):
+                with self.subTest(url=url, payload=payload):
+                    response = self.client.post(url, payload, format='json')
+                    self.assertEqual(response.status_code, 400, response.content)
+                    self.assertIn(field, response.json())
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.project_id, self.project.pk)
+        self.assertFalse(Document.objects.filter(project=target).exists())
+
+    def test_string_ids_are_accepted(self):
+        target = Project.objects.create(user=self.user, name='Target')
+        response = self.client.post('/api/documents/move/', {
+            'document_ids': [str(self.document.pk)], 'project': str(target.pk),
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['results'][0]['status'], 'moved')
+
+
+class CounterTests(APITestCase):
+    """Stored Project/Document counters follow every write path (documents/counters.py)."""
+
+    def setUp(self):
+        super().setUp()
+        from . import counters
+        counters.recompute([self.project.pk])  # the fixture document was created without the API
+
+    def assertCounts(self, project, documents, highlights, per_document=None):
+        project.refresh_from_db()
+        self.assertEqual((project.document_count, project.annotation_count), (documents, highlights))
+        for document, expected in (per_document or {}).items():
+            document.refresh_from_db()
+            self.assertEqual(document.annotation_count, expected, document.filename)
+
+    def test_document_create(self):
+        response = self.client.post('/api/documents/', {
+            'project': self.project.pk, 'pdf_hash': 'c' * 64, 'filename': 'new.pdf',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertCounts(self.project, 2, 0)
+
+    def test_highlight_create_and_delete(self):
+        first = self.add_highlight()
+        self.add_highlight(page=2)
+        self.assertCounts(self.project, 1, 2, {self.document: 2})
+        response = self.client.delete(f'/api/documents/{self.document.pk}/highlights/{first}/')
+        self.assertEqual(response.status_code, 204, response.content)
+        self.assertCounts(self.project, 1, 1, {self.document: 1})
+
+    def test_batch(self):
+        kept = self.add_highlight()
+        gone = self.add_highlight(page=2)
+        response = self.client.post(f'/api/documents/{self.document.pk}/highlights/batch/', {'operations': [
+            {'op': 'create', 'page_number': 3, 'position_data': POSITION},
+            {'op': 'create', 'page_number': 4, 'position_data': POSITION},
+            {'op': 'delete', 'id': gone},
+            {'op': 'note', 'id': kept, 'note': 'Still here'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertCounts(self.project, 1, 3, {self.document: 3})
+
+    def test_copy_and_move(self):
+        self.add_highlight()
+        self.add_highlight(page=2)
+        copies = Project.objects.create(user=self.user, name='Copies')
+        response = self.client.post('/api/documents/copy/', {
+            'document_ids': [self.document.pk], 'project': copies.pk,
+        }, format='json')
+        copy = Document.objects.get(pk=response.json()['results'][0]['document'])
+        self.assertCounts(self.project, 1, 2, {self.document: 2})
+        self.assertCounts(copies, 1, 2, {copy: 2})
+        moved = Project.objects.create(user=self.user, name='Moved')
+        response = self.client.post('/api/documents/move/', {
+            'document_ids': [self.document.pk], 'project': moved.pk,
+        }, format='json')
+        self.assertEqual(response.json()['results'][0]['status'], 'moved')
+        self.assertCounts(self.project, 0, 0)
+        self.assertCounts(moved, 1, 2, {self.document: 2})
+
+    def test_remove(self):
+        self.add_highlight()
+        self.assertEqual(self.client.delete(f'/api/documents/{self.document.pk}/').status_code, 204)
+        # A soft-deleted document still counts until it is removed for good
+        self.assertCounts(self.project, 1, 1)
+        response = self.client.post(f'/api/documents/{self.document.pk}/remove/')
+        self.assertEqual(response.status_code, 204, response.content)
+        self.assertCounts(self.project, 0, 0)
+
+    def test_repair_counters(self):
+        self.add_highlight()
+        self.add_highlight(page=2)
+        Project.objects.filter(pk=self.project.pk).update(document_count=7, annotation_count=0)
+        Document.objects.filter(pk=self.document.pk).update(annotation_count=9)
+        out = io.StringIO()
+        call_command('repair_counters', '--batch-size', '1', stdout=out)
+        self.assertIn('1 had stale counters', out.getvalue())
+        self.assertCounts(self.project, 1, 2, {self.document: 2})
+        out = io.StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertIn('0 had stale counters', out.getvalue())
+
+
+class BatchHighlightsTests(APITestCase):
+    def batch(self, operations):
+        return self.client.post(
+            f'/api/documents/{self.document.pk}/highlights/batch/', {'operations': operations}, format='json',
+        )
+
+    def test_deletes_are_not_capped(self):
+        from .views import MAX_BATCH_OPERATIONS
+        creates = [
+            {'op': 'create', 'page_number': 1, 'position_data': POSITION, 'highlighted_text': f'h{i}'}
+            for i in range(MAX_BATCH_OPERATIONS)
+        ]
+        self.assertEqual(self.batch(creates[:300]).status_code, 200)
+        self.assertEqual(self.batch(creates[300:]).status_code, 200)
+        ids = list(Highlight.objects.filter(document=self.document).values_list('pk', flat=True))
+        self.assertEqual(len(ids), MAX_BATCH_OPERATIONS)
+        extra = self.add_highlight(text='one more')
+        response = self.batch([{'op': 'delete', 'id': pk} for pk in [*ids, extra]])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['deleted']), MAX_BATCH_OPERATIONS + 1)
+        self.assertFalse(Highlight.objects.filter(document=self.document).exists())
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.annotation_count, 0)
+
+    def test_writes_are_capped(self):
+        from .views import MAX_BATCH_OPERATIONS
+        operations = [
+            {'op': 'create', 'page_number': 1, 'position_data': POSITION, 'highlighted_text': f'h{i}'}
+            for i in range(MAX_BATCH_OPERATIONS + 1)
+        ]
+        self.assertEqual(self.batch(operations).status_code, 400)
+        self.assertFalse(Highlight.objects.filter(document=self.document).exists())
+
+
+def _cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+class CursorTests(APITestCase):
+    ISO = '2024-05-01T12:00:00+00:00'
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            self.add_highlight(text=f'h{i}', page=i + 1)
+
+    def assertInvalidCursor(self, url, values):
+        response = self.client.get(url, {'cursor': _cursor(values)})
+        self.assertEqual(response.status_code, 400, (values, response.content))
+        self.assertEqual(response.json(), {'cursor': ['Invalid cursor.']})
+
+    def test_library_pages_follow_the_cursor(self):
+        first = self.client.get('/api/library/', {'page_size': 2}).json()
+        second = self.client.get('/api/library/', {'page_size': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(first['highlights']) + len(second['highlights']), 3)
+        self.assertIsNone(second['next_cursor'])
+
+    def test_tampered_library_cursor_is_rejected(self):
+        for values in ([self.ISO, 'zz'], {'a': 1}, [self.ISO, {'a': 1}], [self.ISO, 1.5], [self.ISO, True],
+                       ['yesterday', 1], [1, 1], ['2024-13-45T00:00:00', 1], [self.ISO], 'x'):
+            self.assertInvalidCursor('/api/library/', values)
+        response = self.client.get('/api/library/', {'cursor': '!!not base64!!'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_highlight_cursor_is_rejected(self):
+        url = f'/api/documents/{self.document.pk}/highlights/'
+        self.assertEqual(self.client.get(url, {'cursor': _cursor([1, self.ISO, 1])}).status_code, 200)
+        for values in (['zz', self.ISO, 1], [1, self.ISO, 'zz'], [1, self.ISO, None], [1, 1, 1], {'a': 1}):
+            self.assertInvalidCursor(url, values)
+
+
+class PositionRangeTests(APITestCase):
+    """Coordinates that cannot be quantised or packed as int32 are rejected on write, never a 500."""
+
+    def rects(self, x):
+        return {'rects': [{'x': x, 'y': 20, 'width': 30, 'height': 8}]}
+
+    def test_create_rejects_out_of_range_coordinates(self):
+        url = f'/api/documents/{self.document.pk}/highlights/'
+        for x in (1e307, 3e7, -3e7):
+            with self.subTest(x=x):
+                response = self.client.post(url, {
+                    'page_number': 1, 'position_data': self.rects(x), 'highlighted_text': 'far away',
+                }, format='json')
+                self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(Highlight.objects.exists())
+
+    def test_batch_create_rejects_out_of_range_coordinates(self):
+        response = self.client.post(f'/api/documents/{self.document.pk}/highlights/batch/', {'operations': [
+            {'op': 'create', 'page_number': 1, 'position_data': POSITION},
+            {'op': 'create', 'page_number': 1, 'position_data': self.rects(3e7)},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.json()['operation'], 1)
+        self.assertFalse(Highlight.objects.exists())
+
+    def test_limit_is_accepted_and_packed(self):
+        from .geometry import MAX_COORDINATE, unpack_rects
+        self.add_highlight()
+        Highlight.objects.update(position_data=self.rects(-MAX_COORDINATE))
+        url = f'/api/documents/{self.document.pk}/highlights/'
+        rows = self.client.get(url, {'rects': 'packed'}).json()
+        self.assertEqual(unpack_rects(rows[0]['position_data']['rects_packed'])[0]['x'], -MAX_COORDINATE)
+
+    def test_packed_rects_fall_back_for_stored_rows_beyond_int32(self):
+        self.add_highlight()
+        Highlight.objects.update(position_data=self.rects(3e7))
+        url = f'/api/documents/{self.document.pk}/highlights/'
+        response = self.client.get(url, {'rects': 'packed'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()[0]['position_data'], self.rects(3e7))
+
+
+class ViewportTests(APITestCase):
+    """?viewport= filters on the stored bbox columns; ?order=position sorts top to bottom."""
+
+    def setUp(self):
+        super().setUp()
+        url = f'/api/documents/{self.document.pk}/highlights/'
+        self.ids = {}
+        for name, page, rects in (
+            ('top', 1, [{'x': 50, 'y': 100, 'width': 200, 'height': 12}]),
+            # Two lines: the bbox spans both rects
+            ('spans', 1, [{'x': 300, 'y': 400, 'width': 100, 'height': 10},
+                          {'x': 40, 'y': 412, 'width': 60, 'height': 10}]),
+            ('bottom', 1, [{'x': 50, 'y': 700, 'width': 200, 'height': 12}]),
+            ('next page', 2, [{'x': 50, 'y': 100, 'width': 200, 'height': 12}]),
+        ):
+            response = self.client.post(url, {
+                'page_number': page, 'position_data': {'rects': rects}, 'highlighted_text': name,
+            }, format='json')
+            self.ids[name] = response.json()['id']
+
+    def texts(self, **params):
+        response = self.client.get(f'/api/documents/{self.document.pk}/highlights/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [h['highlighted_text'] for h in response.json()]
+
+    def test_bbox_is_stored(self):
+        self.assertEqual(
+            Highlight.objects.filter(pk=self.ids['spans']).values_list(
+                'bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right').get(),
+            (400, 40, 422, 400),
+        )
+
+    def test_viewport_returns_overlapping_highlights(self):
+        self.assertEqual(self.texts(viewport='1,0,0,612,792', order='position'), ['top', 'spans', 'bottom'])
+        self.assertEqual(self.texts(viewport='1,0,90,612,101'), ['top'])
+        # Touches only the second line's rect, which lies inside the bbox
+        self.assertEqual(self.texts(viewport='1,0,415,45,420'), ['spans'])
+        self.assertEqual(self.texts(viewport='1,0,200,612,399'), [])
+        self.assertEqual(self.texts(viewport='2,0,0,612,792'), ['next page'])
+
+    def test_malformed_viewport_is_rejected(self):
+        url = f'/api/documents/{self.document.pk}/highlights/'
+        for viewport in ('1,0,0,100,nan', '1,0,0,inf,100', '1,0,0,100', '1,a,0,100,100', 'x,0,0,100,100',
+                         '1,100,0,0,100', '1,0,100,100,0'):
+            with self.subTest(viewport=viewport):
+                response = self.client.get(url, {'viewport': viewport})
+                self.assertEqual(response.status_code, 400, response.content)
+                self.assertIn('viewport', response.json())
+
+
+class PageWindowTests(APITestCase):
+    """?page_from=&page_to= returns {results, page_counts, next_cursor}; page_counts covers the whole document."""
+
+    def setUp(self):
+        super().setUp()
+        for page, n in ((1, 2), (2, 1), (4, 3), (7, 1)):
+            for i in range(n):
+                self.add_highlight(text=f'p{page}-{i}', page=page)
+        self.url = f'/api/documents/{self.document.pk}/highlights/'
+
+    def window(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_window_is_inclusive_and_may_be_open(self):
+        for params, pages in (
+            ({'page_from': 2, 'page_to': 4}, [2, 4, 4, 4]),
+            ({'page_from': 4, 'page_to': 4}, [4, 4, 4]),
+            ({'page_from': 5}, [7]),
+            ({'page_to': 1}, [1, 1]),
+            ({'page_from': '', 'page_to': ''}, [1, 1, 2, 4, 4, 4, 7]),
+            ({'page_from': 8}, []),
+        ):
+            with self.subTest(**params):
+                data = self.window(**params)
+                self.assertEqual([h['page_number'] for h in data['results']], pages)
+                self.assertEqual(data['page_counts'], {'1': 2, '2': 1, '4': 3, '7': 1})
+                self.assertIsNone(data['next_cursor'])
+
+    def test_window_pages_with_the_cursor(self):
+        first = self.window(page_from=2, page_to=4, page_size=2)
+        second = self.window(page_from=2, page_to=4, page_size=2, cursor=first['next_cursor'])
+        self.assertEqual(
+            [h['highlighted_text'] for h in first['results'] + second['results']], ['p2-0', 'p4-0', 'p4-1', 'p4-2'],
+        )
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(second['page_counts'], first['page_counts'])
+
+    def test_counts_follow_writes(self):
+        highlight_id = self.add_highlight(page=9)
+        self.assertEqual(self.window(page_from=9)['page_counts']['9'], 1)
+        response = self.client.delete(f'/api/documents/{self.document.pk}/highlights/{highlight_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIn('9', self.window(page_from=9)['page_counts'])
+
+    def test_without_a_window_the_response_is_a_list(self):
+        self.assertEqual(len(self.window()), 7)
+
+    def test_non_integer_bounds_are_rejected(self):
+        for params in ({'page_from': 'x'}, {'page_to': '1.5'}):
+            with self.subTest(**params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400, response.content)
+                self.assertIn(next(iter(params)), response.json())
+
+
+class HighlightRowsTestCase(APITestCase):
+    """Highlights covering every row shape: with and without a note, deleted colours, a trashed document,
+    string values in position_data."""
+
+    def setUp(self):
+        super().setUp()
+        self.add_highlight(text='With a note', note='Check the 2019 figures')
+        plain = self.add_highlight(text='Without a note', color='green', page=2)
+        # Keys other than rects are kept as sent, strings included
+        Highlight.objects.filter(pk=plain).update(position_data={
+            **POSITION, 'source': 'ocr, pass 2: "quoted" \\ slash', 'tags': ['a, b', 'c: d'],
+        })
+        renamed = self.add_highlight(text='Colour removed from the lens', page=3)
+        unnamed = self.add_highlight(text='Colour removed, no stored name', page=3)
+        Highlight.objects.filter(pk=renamed).update(color_key='violet-2', color_display_name='Counterpoint')
+        Highlight.objects.filter(pk=unnamed).update(color_key='teal-9', color_display_name='')
+        trashed = self.make_document(Project.objects.create(user=self.user, name='Archive'), pdf_hash='b' * 64)
+        self.add_highlight(document=trashed, text='In the trash', note='Old note')
+        Document.objects.filter(pk=trashed.pk).update(deleted_at=timezone.now())
+
+
+class FastPathTests(HighlightRowsTestCase):
+    """highlight_rows / library_rows must render byte-for-byte like the serializers they replace."""
+
+    def assertSameJSON(self, fast, slow):
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+
+    def test_highlight_rows_match_serializer(self):
+        qs = Highlight.objects.filter(document=self.document).order_by('page_number', 'created_at', 'id')
+        slow = qs.select_related('note', 'document')
+        for packed in (False, True):
+            with self.subTest(packed_rects=packed):
+                self.assertSameJSON(
+                    highlight_rows(qs.values(*HIGHLIGHT_ROW_FIELDS), packed),
+                    HighlightSerializer(slow, many=True, context={'packed_rects': packed}).data,
+                )
+
+    def test_library_rows_match_serializer(self):
+        qs = Highlight.objects.filter(user=self.user).order_by('-created_at', 'id')
+        fast = library_rows(qs.values(*LIBRARY_ROW_FIELDS))
+        self.assertEqual(len(fast), 5)
+        self.assertEqual(
+            {row['color_display_name'] for row in fast if row['color'] in ('violet-2', 'teal-9')},
+            {'Counterpoint (Deleted)', 'Unknown (Deleted)'},
+        )
+        self.assertSameJSON(
+            fast, LibraryHighlightSerializer(qs.select_related('note', 'document__project'), many=True).data,
+        )
+
+
+class AggregatesTests(HighlightRowsTestCase):
+    """/aggregates/ counts (documents/aggregates.py) and their invalidation on highlight and note writes."""
+
+    def aggregates(self, cached=False):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/documents/{self.document.pk}/aggregates/')
+        self.assertEqual(response.status_code, 200, response.content)
+        grouped = [q['sql'] for q in ctx.captured_queries if 'FROM "documents_highlight"' in q['sql']]
+        self.assertEqual(not grouped, cached)
+        return response.json()
+
+    def counts(self, data):
+        return {c['color']: (c['count'], c['note_count']) for c in data['by_color']}
+
+    def test_counts(self):
+        from . import presets
+        lens = presets.default()
+        data = self.aggregates()
+        self.assertEqual(
+            [(c['color'], c['display_name']) for c in data['by_color']],
+            [(c.key, c.display_name) for c in lens.colors if c.key in ('yellow', 'green')]
+            + [('teal-9', 'Unknown (Deleted)'), ('violet-2', 'Counterpoint (Deleted)')],
+        )
+        self.assertEqual(self.counts(data), {'yellow': (1, 1), 'green': (1, 0), 'teal-9': (1, 0), 'violet-2': (1, 0)})
+        self.assertEqual((data['highlight_count'], data['note_count']), (4, 1))
+        self.assertEqual(data['page_counts'], {'1': 1, '2': 1, '3': 2})
+        latest = max(
+            [*Highlight.objects.filter(document=self.document).values_list('updated_at', flat=True),
+             *Note.objects.filter(highlight__document=self.document).values_list('updated_at', flat=True)]
+        )
+        self.assertEqual(data['last_activity_at'], serializers.DateTimeField().to_representation(latest))
+
+    def test_cached_until_highlights_or_notes_change(self):
+        self.aggregates()
+        self.aggregates(cached=True)
+        url = f'/api/documents/{self.document.pk}/highlights/'
+        pk = self.add_highlight(page=5)
+        self.assertEqual(self.counts(self.aggregates())['yellow'], (2, 1))
+        self.client.patch(f'{url}{pk}/', {'note': 'New note'}, format='json')
+        data = self.aggregates()
+        self.assertEqual((self.counts(data)['yellow'], data['note_count']), ((2, 2), 2))
+        self.client.post(f'{url}batch/', {'operations': [{'op': 'update', 'id': pk, 'color': 'green'}]}, format='json')
+        data = self.aggregates()
+        self.assertEqual((self.counts(data)['yellow'], self.counts(data)['green']), ((1, 1), (2, 1)))
+        self.client.delete(f'{url}{pk}/')
+        data = self.aggregates()
+        self.assertEqual((self.counts(data)['green'], data['highlight_count'], data['page_counts'].get('5')), ((1, 0), 4, None))
+        self.aggregates(cached=True)
+
+    def test_lens_names_need_no_invalidation(self):
+        self.aggregates()
+        lens = HighlightPreset.objects.create(user=self.user, name='Mine')
+        PresetColor.objects.create(preset=lens, key='green', display_name='Evidence', hex='#22C55E', sort_order=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.filter(pk=self.document.pk).update(highlight_preset=lens)
+        data = self.aggregates(cached=True)
+        self.assertEqual(data['by_color'][0], {'color': 'green', 'display_name': 'Evidence', 'count': 1, 'note_count': 0})
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'the SQL JSON path needs Postgres')
+class SQLJSONTests(HighlightRowsTestCase):
+    """Lists built as JSON in Postgres (sql_json) must be byte-identical to the Python path."""
+
+    def get_both(self, url):
+        bodies = []
+        for enabled in (True, False):
+            cache.clear()
+            with self.settings(SQL_JSON_LISTS=enabled):
+                response = self.client.get(url, HTTP_ACCEPT='application/json')
+            self.assertEqual(response.status_code, 200, response.content)
+            bodies.append(b''.join(response) if response.streaming else response.content)
+        return bodies
+
+    def test_library(self):
+        sql, python = self.get_both('/api/library/')
+        self.assertIn(b'Counterpoint (Deleted)', sql)
+        self.assertEqual(sql, python)
+
+    def test_document_highlights(self):
+        sql, python = self.get_both(f'/api/documents/{self.document.pk}/highlights/')
+        self.assertIn(b'"note":null', sql)
+        self.assertEqual(sql, python)
+
+    def test_bootstrap(self):
+        sql, python = self.get_both(f'/api/documents/{self.document.pk}/bootstrap/')
+        self.assertEqual(sql, python)
+
+    def test_line_separators_and_unicode_whitespace(self):
+        Highlight.objects.filter(highlighted_text='Colour removed from the lens').update(
+            highlighted_text='Line\u2028break\u2029here', color_display_name='\u3000Counterpoint\xa0\u2028',
+        )
+        Highlight.objects.filter(highlighted_text='Without a note').update(
+            position_data={**POSITION, 'source': 'ocr\u2028pass'},
+        )
+        for url in ('/api/library/', f'/api/documents/{self.document.pk}/highlights/'):
+            with self.subTest(url=url):
+                sql, python = self.get_both(url)
+                self.assertIn(b'Line\\u2028break\\u2029here', sql)
+                self.assertIn(b'"Counterpoint (Deleted)"', sql)
+                self.assertEqual(sql, python)
+
+
+class SQLJSONTextTests(SimpleTestCase):
+    """The text rules sql_json relies on, checked in Python; the Postgres tests run the SQL itself."""
+    databases = {'default'}
+    # Postgres float8 text -> the JSON renderer's output, for values the bbox columns can hold
+    FLOATS = [
+        ('20', '20.0'), ('-0', '-0.0'), ('0.5', '0.5'), ('0.01', '0.01'), ('-0.07', '-0.07'),
+        ('612.25', '612.25'), ('2000000', '2000000.0'), ('-999999.99', '-999999.99'),
+        ('123456789012345', '123456789012345.0'),
+    ]
+    POSITIONS = [
+        POSITION,
+        {'rects': [{'x': 1.5, 'y': -2}], 'page': {'width': 612, 'height': 792}},
+        {**POSITION, 'source': 'ocr, pass 2: "quoted" \\ slash'},
+        {**POSITION, 'tags': ['a, b', 'c: d', '', '"', '\\"', 'end"}', 'x"]'], 'n': None, 'ok': True},
+        {'key, with: separators': 1, 'nested': {'"q"': [{'a': 'b'}]}, 'caf\u00e9': '\u00fc\t\n'},
+    ]
+
+    def compact(self, jsonb_text):
+        if not any(marker in jsonb_text for marker in sql_json.STRING_VALUE_MARKERS):
+            return jsonb_text.replace(', ', ',').replace(': ', ':')
+        return re.sub(sql_json.SEPARATOR_PATTERN, r'\1\2', jsonb_text)
+
+    def test_whitespace_is_what_str_strip_removes(self):
+        self.assertEqual(sql_json.WHITESPACE, ''.join(c for c in map(chr, range(sys.maxunicode + 1)) if c.isspace()))
+
+    def test_compact(self):
+        for value in self.POSITIONS:
+            with self.subTest(value=value):
+                # jsonb::text separates with ', ' and ': ' and leaves non-ASCII unescaped
+                jsonb_text = json.dumps(value, ensure_ascii=False)
+                self.assertEqual(self.compact(jsonb_text), JSONRenderer().render(value).decode())
+                self.assertEqual(re.sub(sql_json.SEPARATOR_PATTERN, r'\1\2', jsonb_text), self.compact(jsonb_text))
+
+    def test_float(self):
+        for text, expected in self.FLOATS:
+            with self.subTest(text=text):
+                self.assertEqual(text if re.search('[.e]', text) else f'{text}.0', expected)
+                self.assertEqual(JSONRenderer().render(float(text)).decode(), expected)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'runs the SQL on Postgres')
+    def test_sql_matches(self):
+        with connection.cursor() as cursor:
+            for text, expected in self.FLOATS:
+                cursor.execute(f"SELECT {sql_json._float('v.x')}::text FROM (VALUES (%s::float8)) v(x)", [text])
+                self.assertEqual(cursor.fetchone()[0], expected)
+            for value in self.POSITIONS:
+                cursor.execute(
+                    f"SELECT v.x::text, {sql_json._compact('v.x')}::text FROM (VALUES (%s::jsonb)) v(x)",
+                    [json.dumps(value)],
+                )
+                jsonb_text, compact = cursor.fetchone()
+                self.assertEqual(compact, JSONRenderer().render(json.loads(jsonb_text)).decode())
+                self.assertEqual(compact, self.compact(jsonb_text))
+
+
+class LibraryShapeTests(HighlightRowsTestCase):
+    """Other shapes of the full Library carry the same rows as the default JSON response."""
+
+    def full(self):
+        response = self.client.get('/api/library/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    def test_stream_matches_full_response(self):
+        for sql_json in (True, False):
+            with self.subTest(sql_json=sql_json), self.settings(SQL_JSON_LISTS=sql_json):
+                cache.clear()
+                full = self.full()
+                response = self.client.get('/api/library/', HTTP_ACCEPT='application/x-ndjson')
+                self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+                self.assertEqual(response['X-Highlights-Cursor'], str(HighlightChange.objects.latest('id').pk))
+                header, *rows, tail = b''.join(response.streaming_content).split(b'\n')
+                self.assertEqual(tail, b'')
+                self.assertEqual(
+                    json.loads(header), {'projects': full['projects'], 'total_highlights': len(full['highlights'])},
+                )
+                self.assertEqual(len(rows), 5)
+                self.assertEqual(rows, [JSONRenderer().render(row) for row in full['highlights']])
+
+    def test_normalized_rows_rebuild_the_full_rows(self):
+        from . import presets
+        from .views import LIBRARY_ORDERING
+        green = presets.default().by_key['green'].display_name
+        # One document on a user lens, where green is no longer a colour
+        lens = HighlightPreset.objects.create(user=self.user, name='Mine')
+        PresetColor.objects.create(preset=lens, key='yellow', display_name='Claims', hex='#EAB308', sort_order=0)
+        Document.objects.filter(pk=self.document.pk).update(highlight_preset=lens)
+        full = self.full()
+        self.assertEqual(
+            {h['highlighted_text']: h['color_display_name'] for h in full['highlights']
+             if h['highlighted_text'] in ('With a note', 'Without a note')},
+            {'With a note': 'Claims', 'Without a note': f'{green} (Deleted)'},
+        )
+        for params in ({}, {'page_size': 2}):
+            with self.subTest(**params):
+                response = self.client.get('/api/library/', {'shape': 'normalized', **params})
+                self.assertEqual(response.status_code, 200, response.content)
+                data = response.json()
+                expected = full['highlights'][:params.get('page_size')]
+                self.assertEqual([denormalize(data, row) for row in data['highlights']], expected)
+                self.assertEqual(list(data['projects'].values()), full['projects'])
+        self.assertEqual(len(full['highlights']), Highlight.objects.filter(user=self.user).count())
+        self.assertEqual(
+            [h['id'] for h in full['highlights']],
+            list(Highlight.objects.filter(user=self.user).order_by(*LIBRARY_ORDERING).values_list('id', flat=True)),
+        )
+
+
+def denormalize(data, row):
+    """A ?shape=normalized Library row joined back with its side-loaded document, project and lens."""
+    document = data['documents'][str(row['document_id'])]
+    project = data['projects'][str(row['project_id'])]
+    lens = data['presets'][str(document['effective_preset'])]
+    color = next((c for c in lens['colors'] if c['key'] == row['color']), None)
+    return {
+        **{k: row[k] for k in ('id', 'page_number', 'color', 'highlighted_text', 'created_at', 'updated_at', 'note')},
+        'document_id': document['id'],
+        'document_name': document['filename'],
+        'document_deleted_at': document['deleted_at'],
+        'project_id': project['id'],
+        'project_name': project['name'],
+        'project_color': project['color'],
+        'color_display_name': color['display_name'] if color else row['color_display_name'],
+        'color_hex': color['hex'] if color else row['color_hex'],
+        **{k: row[k] for k in ('bbox_top', 'bbox_left', 'bbox_bottom', 'bbox_right')},
+    }
+
+
+@override_settings(SQL_JSON_LISTS=False)
+class RendererTests(HighlightRowsTestCase):
+    """The orjson and MessagePack renderers carry the same payload as DRF's stock JSONRenderer."""
+    DATA = {
+        'created_at': timezone.make_aware(datetime.datetime(2024, 5, 1, 12, 30, 15, 123456)),
+        'naive': datetime.datetime(2024, 5, 1, 12, 30), 'day': datetime.date(2024, 5, 1),
+        'time': datetime.time(9, 5), 'price': decimal.Decimal('4.50'),
+        'token': uuid.UUID('12345678-1234-5678-1234-567812345678'), 'label': gettext_lazy('Yellow'),
+        'page_counts': {1: 2, 12: 1}, 'text': 'caf\u00e9 \u2028line\u2029 "quoted" \\ </script>',
+        'floats': [0.1, 2.5, -0.0, 1234.5678], 'rects': ((1, 2), (3, 4)), 'empty': {}, 'missing': None,
+        'flags': [True, False], 'big': 2 ** 63 - 1,
+    }
+
+    def test_json_bytes_match_drf(self):
+        self.assertEqual(JSONRenderer().render(self.DATA), renderers.JSONRenderer().render(self.DATA))
+        # Integers beyond 64 bits fall back to the stdlib encoder
+        self.assertEqual(JSONRenderer().render({'n': 2 ** 70}), b'{"n":1180591620717411303424}')
+        # orjson spells exponents differently (1e16, not 1e+16); the values are the same
+        floats = [1e16, 1.5e-7, 1e-310]
+        self.assertEqual(json.loads(JSONRenderer().render(floats)), json.loads(renderers.JSONRenderer().render(floats)))
+
+    @unittest.skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_decodes_to_the_json_payload(self):
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(self.DATA)),
+            json.loads(renderers.JSONRenderer().render(self.DATA)),
+        )
+
+    def get(self, url, accept):
+        cache.clear()
+        response = self.client.get(url, HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_endpoints(self):
+        for url in ('/api/library/', '/api/library/?shape=normalized', '/api/lenses/', '/api/projects/',
+                    f'/api/documents/{self.document.pk}/highlights/?page_from=1',
+                    f'/api/documents/{self.document.pk}/bootstrap/'):
+            with self.subTest(url=url):
+                response = self.get(url, 'application/json')
+                with mock.patch('wisemark_site.renderers.orjson', None):
+                    self.assertEqual(response.content, self.get(url, 'application/json').content)
+                if msgpack:
+                    packed = self.get(url, 'application/msgpack')
+                    self.assertEqual(packed['Content-Type'], 'application/msgpack')
+                    self.assertEqual(msgpack.unpackb(packed.content), json.loads(response.content))
+
+
+class ReconcileS3Tests(APITestCase):
+    """reconcile_s3 deletes only objects no live document references, outside the grace period."""
+
+    def setUp(self):
+        super().setUp()
+        from .bench import LocalS3, use_local_s3
+        self.s3 = LocalS3()
+        context = use_local_s3(self.s3)
+        context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+        old = timezone.now() - timezone.timedelta(days=3)
+        self.make_document(self.project, pdf_hash='1' * 64, s3_key='pdfs/uploaded-under-a-custom-key.pdf')
+        self.make_document(self.project, pdf_hash='2' * 64)  # found by pdfs/{pdf_hash}.pdf
+        self.make_document(self.project, pdf_hash='3' * 64, s3_key=f'pdfs/{"3" * 64}.pdf', deleted_at=old)
+        for key, modified in (
+            ('pdfs/uploaded-under-a-custom-key.pdf', old),
+            (f'pdfs/{"1" * 64}.pdf', old),  # also kept: get_pdf_bytes falls back to the hash key
+            (f'pdfs/{"2" * 64}.pdf', old),
+            (f'pdfs/{"3" * 64}.pdf', old),  # only a soft-deleted document
+            (f'pdfs/{"4" * 64}.pdf', old),  # document gone
+            (f'pdfs/{"5" * 64}.pdf', timezone.now()),  # upload not committed yet
+            ('exports/not-a-pdf-key.pdf', old),
+        ):
+            self.s3.objects[key] = (b'%PDF-1.4', modified)
+        self.orphans = {f'pdfs/{"3" * 64}.pdf', f'pdfs/{"4" * 64}.pdf'}
+
+    def reconcile(self, *args):
+        out = io.StringIO()
+        call_command('reconcile_s3', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_lists_orphans(self):
+        before = set(self.s3.objects)
+        out = self.reconcile('--dry-run')
+        self.assertIn('6 objects under pdfs/, 1 within grace period', out)
+        self.assertEqual({line.strip() for line in out.splitlines() if line.startswith('  ')}, self.orphans)
+        self.assertEqual(set(self.s3.objects), before)
+
+    def test_deletes_orphans_only(self):
+        before = set(self.s3.objects)
+        out = self.reconcile()
+        self.assertIn('Deleted 2 orphaned objects.', out)
+        self.assertEqual(set(self.s3.objects), before - self.orphans)
+
+    def test_grace_period(self):
+        self.reconcile('--grace-hours', '0')
+        self.assertNotIn(f'pdfs/{"5" * 64}.pdf', self.s3.objects)
+
+    def test_batches_are_rechecked_before_deleting(self):
+        from .management.commands.reconcile_s3 import Command
+        self.make_document(self.project, pdf_hash='4' * 64)  # uploaded again after the listing
+        self.assertEqual(
+            Command()._still_orphaned(sorted(self.orphans)), [f'pdfs/{"3" * 64}.pdf'],
+        )
+
+    def test_failed_deletes_are_reported(self):
+        with mock.patch.object(self.s3, 'delete_objects', return_value={
+            'Errors': [{'Key': f'pdfs/{"4" * 64}.pdf', 'Message': 'Access denied'}],
+        }):
+            out = self.reconcile()
+        self.assertIn('Deleted 1 orphaned objects. 1 could not be deleted', out)
+
+    def test_requires_s3(self):
+        with self.settings(AWS_STORAGE_BUCKET_NAME=None), self.assertRaises(CommandError):
+            self.reconcile()
+
+
+class ColorLabelsTests(APITestCase):
+    """Document.color_labels keys come from the legacy Color table, including colours added in the admin."""
+
+    def patch(self, labels):
+        response = self.client.patch(f'/api/documents/{self.document.pk}/', {'color_labels': labels}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['color_labels']
+
+    def test_labels_follow_the_color_table(self):
+        Color.objects.create(key='purple', default_name='Purple')
+        labels = self.patch({'yellow': ' Key claims ', 'purple': 'Added in the admin', 'teal': 'Not a Color', 'green': 3})
+        self.assertEqual(labels, {'green': '', 'purple': 'Added in the admin', 'yellow': 'Key claims'})
+        self.assertEqual(list(labels), ['green', 'purple', 'yellow'])
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.color_labels, labels)
+
+    def test_only_a_dict_replaces_the_labels(self):
+        self.patch({'blue': 'Methods'})
+        self.assertEqual(self.patch('blue'), {'blue': 'Methods'})
+        self.assertEqual(self.patch({}), {})
+
+
+class ColorLabelsMigrationTests(TransactionTestCase):
+    """Migration 0032 copies DocumentColor rows into Document.color_labels and back."""
+    serialized_rollback = True  # keep the colours and system lenses the migrations seed
+    BEFORE = [('documents', '0031_document_color_labels')]
+    AFTER = [('documents', '0032_copy_document_color_labels')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_round_trip(self):
+        apps = self.migrate(self.BEFORE)
+        User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+        Project = apps.get_model('documents', 'Project')
+        Document = apps.get_model('documents', 'Document')
+        Color = apps.get_model('documents', 'Color')
+        DocumentColor = apps.get_model('documents', 'DocumentColor')
+        project = Project.objects.create(user=User.objects.create(username='reader'), name='Research')
+        labelled, plain = (
+            Document.objects.create(project=project, pdf_hash=c * 64, filename=f'{c}.pdf', file_size=3)
+            for c in 'ab'
+        )
+        purple = Color.objects.create(key='purple', default_name='Purple')
+        for color, name in ((Color.objects.get(key='yellow'), 'Key claims'), (purple, ''),
+                            (Color.objects.get(key='blue'), 'Methods')):
+            DocumentColor.objects.create(document=labelled, color=color, custom_name=name)
+        rows = set(DocumentColor.objects.values_list('document_id', 'color__key', 'custom_name'))
+
+        apps = self.migrate(self.AFTER)
+        Document = apps.get_model('documents', 'Document')
+        self.assertEqual(
+            dict(Document.objects.values_list('pk', 'color_labels')),
+            {labelled.pk: {'blue': 'Methods', 'purple': '', 'yellow': 'Key claims'}, plain.pk: {}},
+        )
+
+        apps = self.migrate(self.BEFORE)
+        DocumentColor = apps.get_model('documents', 'DocumentColor')
+        self.assertEqual(set(DocumentColor.objects.values_list('document_id', 'color__key', 'custom_name')), rows)
+
+
+class PresetRegistryTests(APITestCase):
+    """presets.py: local entries are dropped on invalidate() and when another worker bumps the shared version."""
+
+    def setUp(self):
+        super().setUp()
+        from . import presets
+        self.presets = presets
+        presets.invalidate()
+        presets._state['checked_at'] = 0.0
+        self.clock = 1000.0
+        patcher = mock.patch('documents.presets.time.monotonic', side_effect=lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalidate_bumps_the_shared_version_on_commit(self):
+        version = self.presets.VERSION_CACHE_KEY
+        cache.set(version, 'before', None)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.presets.invalidate()
+            self.assertEqual(cache.get(version), 'before')
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(cache.get(version), 'before')
+
+    def test_other_workers_bump_is_seen_after_the_check_interval(self):
+        lens = self.presets.default()
+        with self.assertNumQueries(0):
+            self.presets.default()
+        # Another worker renames the lens and bumps the version; this worker has not written anything
+        HighlightPreset.objects.filter(pk=lens.id).update(name='Renamed elsewhere')
+        cache.set(self.presets.VERSION_CACHE_KEY, 'elsewhere', None)
+        self.clock += self.presets.VERSION_CHECK_INTERVAL / 2
+        self.assertEqual(self.presets.get(lens.id).name, lens.name)
+        self.clock += self.presets.VERSION_CHECK_INTERVAL
+        self.assertEqual(self.presets.get(lens.id).name, 'Renamed elsewhere')
+
+    def test_loads_that_race_an_invalidation_are_discarded(self):
+        lens = HighlightPreset.objects.create(user=self.user, name='Mine')
+        self.presets.default()
+        load = self.presets._load
+
+        def racing_load(preset_filter):
+            loaded = load(preset_filter)
+            self.presets.invalidate()  # a write lands while the rows are in flight
+            return loaded
+
+        with mock.patch('documents.presets._load', side_effect=racing_load):
+            self.assertEqual(self.presets.get(lens.pk).name, 'Mine')
+        self.assertNotIn(lens.pk, self.presets._state['entries'])
+
+    def test_database_cache(self):
+        from . import library_cache
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_cache',
+        }}):
+            call_command('createcachetable', verbosity=0)
+            before = library_cache.versions(self.user.pk)
+            self.assertEqual(library_cache.versions(self.user.pk), before)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.presets.invalidate()
+                library_cache.bump(self.user.pk)
+            after = library_cache.versions(self.user.pk)
+            self.assertTrue(after[0] != before[0] and after[1] != before[1])
+
+
+class HighlightAdminTests(APITestCase):
+    """Admin writes keep the owner, counters, change log and search terms in step, like the API."""
+
+    def setUp(self):
+        super().setUp()
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.admin = Client()
+        self.admin.force_login(admin_user)
+
+    def add(self, text='Added in the admin', position=POSITION):
+        return self.admin.post('/admin/documents/highlight/add/', {
+            'document': self.document.pk, 'page_number': 4, 'position_data': json.dumps(position),
+            'color_key': 'yellow', 'highlighted_text': text,
+        })
+
+    def logged(self):
+        return list(HighlightChange.objects.order_by('id').values_list('highlight_id', 'kind'))
+
+    def test_add_sets_the_owner_from_the_document(self):
+        response = self.add()
+        self.assertEqual(response.status_code, 302, response.content[:2000])
+        highlight = Highlight.objects.get(highlighted_text='Added in the admin')
+        self.assertEqual(highlight.user, self.user)
+        self.assertEqual((highlight.bbox_top, highlight.bbox_bottom), (20, 28))
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.annotation_count, 1)
+        self.assertEqual(self.logged(), [(highlight.pk, HighlightChange.UPSERT)])
+        self.assertTrue(SearchTerm.objects.filter(user=self.user, term='admin').exists())
+
+    @override_settings(STORAGES={
+        **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_add_rejects_out_of_range_coordinates(self):
+        response = self.add(position={'rects': [{'x': 3e7, 'y': 0, 'width': 1, 'height': 1}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Highlight.objects.exists())
+
+    def test_change_and_delete(self):
+        pk = self.add_highlight(note='First note')
+        HighlightChange.objects.all().delete()
+        response = self.admin.post(f'/admin/documents/highlight/{pk}/change/', {
+            'page_number': 1, 'position_data': json.dumps(POSITION),
+            'color_key': 'green', 'highlighted_text': 'Edited in the admin',
+        })
+        self.assertEqual(response.status_code, 302, response.content[:2000])
+        note = Highlight.objects.get(pk=pk).note
+        response = self.admin.post(f'/admin/documents/note/{note.pk}/change/', {'content': 'Edited note'})
+        self.assertEqual(response.status_code, 302, response.content[:2000])
+        response = self.admin.post(f'/admin/documents/highlight/{pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302, response.content[:2000])
+        self.assertEqual(self.logged(), [
+            (pk, HighlightChange.UPSERT), (pk, HighlightChange.UPSERT), (pk, HighlightChange.DELETE),
+        ])
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.annotation_count, 0)
+        self.assertFalse(SearchTerm.objects.filter(user=self.user).exists())
+
+    def test_bulk_delete_action(self):
+        pks = [self.add_highlight(page=page) for page in (1, 2, 3)]
+        response = self.admin.post('/admin/documents/highlight/', {
+            'action': 'delete_selected', '_selected_action': pks[:2], 'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302, response.content[:2000])
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.annotation_count, 1)
+        self.assertEqual(
+            sorted(HighlightChange.objects.filter(kind=HighlightChange.DELETE).values_list('highlight_id', flat=True)),
+            pks[:2],
+        )
+
+
+def _colors(n, prefix='c'):
+    return [{'key': f'{prefix}{i}', 'display_name': f'Colour {i}', 'hex': '#FBBF24'} for i in range(n)]
+
+
+class PresetColorQueryTests(APITestCase):
+    """Lens colour writes run a fixed number of queries whatever the number of colours."""
+    SIZES = (1, 5, 20)
+    # Savepoints and the transaction the writes run in are counted too
+    CREATE_LENS_QUERIES = 6
+    UPDATE_LENS_QUERIES = 9
+    ADD_COLOR_QUERIES = 4
+    RESET_LENSES_QUERIES = 10  # read both system lenses, then per lens one upsert and a prune (SELECT + DELETE)
+
+    def make_lens(self, n, user=None, name='Lens'):
+        lens = HighlightPreset.objects.create(user=user, name=name)
+        PresetColor.objects.bulk_create(
+            PresetColor(preset=lens, sort_order=i, **c) for i, c in enumerate(_colors(n, 'old'))
+        )
+        return lens
+
+    def test_create_lens(self):
+        for n in self.SIZES:
+            HighlightPreset.objects.filter(user=self.user).delete()
+            with self.subTest(colors=n), self.assertNumQueries(self.CREATE_LENS_QUERIES):
+                response = self.client.post('/api/lenses/', {'name': 'Lens', 'colors': _colors(n)}, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(len(response.json()['colors']), n)
+
+    def test_replace_lens_colours(self):
+        for n in self.SIZES:
+            lens = self.make_lens(n, self.user, name=f'Lens {n}')
+            # Keep half the keys, rename them, and add as many new ones
+            colors = _colors(n // 2, 'old') + _colors(n - n // 2, 'new')
+            with self.subTest(colors=n), self.assertNumQueries(self.UPDATE_LENS_QUERIES):
+                response = self.client.put(f'/api/lenses/{lens.pk}/', {'name': lens.name, 'colors': colors}, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(sorted(lens.colors.values_list('key', flat=True)), sorted(c['key'] for c in colors))
+
+    def test_add_color(self):
+        for n in self.SIZES:
+            lens = self.make_lens(n, self.user, name=f'Lens {n}')
+            with self.subTest(colors=n), mock.patch('documents.views.MAX_COLORS_PER_LENS', 25), \
+                    self.assertNumQueries(self.ADD_COLOR_QUERIES):
+                response = self.client.post(
+                    f'/api/lenses/{lens.pk}/colors/', {'key': 'added', 'hex': '#34D399'}, format='json',
+                )
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(response.json()['sort_order'], n)
+
+    def test_reset_system_lenses(self):
+        from .management.commands.reset_system_lenses import SYSTEM_PRESET_NAMES
+        for n in self.SIZES:
+            HighlightPreset.objects.filter(user__isnull=True).delete()
+            for name in SYSTEM_PRESET_NAMES:
+                self.make_lens(n, name=name)
+            with self.subTest(colors=n), self.assertNumQueries(self.RESET_LENSES_QUERIES):
+                call_command('reset_system_lenses', stdout=io.StringIO())
+            self.assertEqual(
+                set(PresetColor.objects.filter(preset__user__isnull=True).values_list('key', flat=True)),
+                {'yellow', 'green', 'blue', 'pink', 'orange'},
+            )
+
+
+class DocumentQueryTests(APITestCase):
+    """DocumentViewSet actions run a fixed number of queries however many documents or highlights they touch."""
+    SIZES = (1, 5)
+    RETRIEVE_QUERIES = 2
+    LIST_QUERIES = 1
+    COPY_QUERIES = 19
+    MOVE_QUERIES = 13
+    AGGREGATES_QUERIES = 2
+    BOOTSTRAP_QUERIES = 4
+
+    def seed(self, n, name):
+        """A project with n documents of n highlights each (one with a note)."""
+        project = Project.objects.create(user=self.user, name=name)
+        documents = [self.make_document(project, pdf_hash=f'{name}{i}'.ljust(64, '0')) for i in range(n)]
+        for document in documents:
+            for page in range(n):
+                self.add_highlight(document=document, page=page + 1, note='Follow up' if page == 0 else None)
+        cache.clear()
+        return project, documents
+
+    def assertQueries(self, expected, method, url, data=None):
+        with self.assertNumQueries(expected) as ctx:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        # No action reads the PDF bytes into Python
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'pdf_file' in sql])
+        return response
+
+    def test_retrieve(self):
+        for n in self.SIZES:
+            _, documents = self.seed(n, f'retrieve{n}')
+            with self.subTest(highlights=n):
+                self.assertQueries(self.RETRIEVE_QUERIES, 'get', f'/api/documents/{documents[0].pk}/')
+
+    def test_list(self):
+        for n in self.SIZES:
+            project, _ = self.seed(n, f'list{n}')
+            with self.subTest(documents=n):
+                response = self.assertQueries(self.LIST_QUERIES, 'get', '/api/documents/', {'project': project.pk})
+                self.assertEqual(len(response.json()), n)
+
+    def test_copy(self):
+        for n in self.SIZES:
+            _, documents = self.seed(n, f'copy{n}')
+            target = Project.objects.create(user=self.user, name=f'copy target {n}')
+            with self.subTest(documents=n):
+                response = self.assertQueries(self.COPY_QUERIES, 'post', '/api/documents/copy/', {
+                    'document_ids': [d.pk for d in documents], 'project': target.pk,
+                })
+                self.assertEqual({r['status'] for r in response.json()['results']}, {'copied'})
+            self.assertEqual(Highlight.objects.filter(document__project=target).count(), n * n)
+
+    def test_move(self):
+        for n in self.SIZES:
+            _, documents = self.seed(n, f'move{n}')
+            target = Project.objects.create(user=self.user, name=f'move target {n}')
+            with self.subTest(documents=n):
+                response = self.assertQueries(self.MOVE_QUERIES, 'post', '/api/documents/move/', {
+                    'document_ids': [d.pk for d in documents], 'project': target.pk,
+                })
+                self.assertEqual({r['status'] for r in response.json()['results']}, {'moved'})
+
+    def test_aggregates(self):
+        for n in self.SIZES:
+            _, documents = self.seed(n, f'aggregates{n}')
+            with self.subTest(highlights=n):
+                response = self.assertQueries(
+                    self.AGGREGATES_QUERIES, 'get', f'/api/documents/{documents[0].pk}/aggregates/',
+                )
+                self.assertEqual(response.json()['note_count'], 1)
+
+    def test_bootstrap(self):
+        for n in self.SIZES:
+            _, documents = self.seed(n, f'bootstrap{n}')
+            with self.subTest(highlights=n):
+                response = self.assertQueries(
+                    self.BOOTSTRAP_QUERIES, 'get', f'/api/documents/{documents[0].pk}/bootstrap/',
+                )
+                self.assertEqual(len(response.json()['highlights']), n)
+
+
+class LibrarySearchTests(HighlightRowsTestCase):
+    def search(self, q):
+        response = self.client.get('/api/library/', {'q': q})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_matches_colour_names(self):
+        from . import presets
+        green = presets.default().by_key['green'].display_name
+        self.add_highlight(text=f'Mentions {green} in the text', color='yellow', page=9)
+        data = self.search(green)
+        texts = [h['highlighted_text'] for h in data['highlights']]
+        # Full-text matches rank first; colour-name matches follow without a rank or snippet
+        self.assertEqual(texts, [f'Mentions {green} in the text', 'Without a note'])
+        self.assertEqual(data['total_highlights'], 2)
+        self.assertIsNone(data['highlights'][1]['rank'])
+        self.assertEqual(
+            {f['color']: f['count'] for f in data['facets']['colors']}, {'yellow': 1, 'green': 1},
+        )
+
+    def test_matches_stored_names_of_removed_colours(self):
+        data = self.search('counterpoint')
+        self.assertEqual([h['color_display_name'] for h in data['highlights']], ['Counterpoint (Deleted)'])
+
+    def test_colour_matches_page_after_text_matches(self):
+        from . import presets
+        green = presets.default().by_key['green'].display_name
+        for i in range(3):
+            self.add_highlight(text=f'{green} {i}', page=10 + i)
+        pages = [self.client.get('/api/library/', {'q': green, 'page_size': 2, 'page': n}).json() for n in (1, 2)]
+        self.assertEqual([len(p['highlights']) for p in pages], [2, 2])
+        self.assertEqual(pages[1]['highlights'][1]['highlighted_text'], 'Without a note')
+        self.assertIsNone(pages[1]['next_page'])
+
+    def test_query_without_terms(self):
+        data = self.search('+++')
+        self.assertEqual((data['total_highlights'], data['highlights']), (0, []))
+
+    def test_substring_backend(self):
+        with self.settings(LIBRARY_SEARCH_BACKEND='documents.search.SubstringBackend'):
+            self.assertEqual(self.search('counterpoint')['total_highlights'], 1)
+
+
+class ChangeFeedTests(APITestCase):
+    """Delta sync: /api/library/changes/ and /api/documents/<id>/highlights/changes/ (documents/changes.py)."""
+    URL = '/api/library/changes/'
+
+    def feed(self, url=URL, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_without_since_returns_the_cursor_only(self):
+        self.add_highlight()
+        data = self.feed()
+        self.assertEqual(data['cursor'], HighlightChange.objects.latest('id').pk)
+        self.assertEqual((data['highlights'], data['deleted'], data['has_more']), ([], [], False))
+
+    def test_since_and_limit_page_through_the_log(self):
+        start = self.feed()['cursor']
+        ids = [self.add_highlight(page=page) for page in (1, 2, 3)]
+        first = self.feed(since=start, limit=2)
+        self.assertEqual((sorted(h['id'] for h in first['highlights']), first['has_more']), (ids[:2], True))
+        second = self.feed(since=first['cursor'], limit=2)
+        self.assertEqual((sorted(h['id'] for h in second['highlights']), second['has_more']), (ids[2:], False))
+        last = self.feed(since=second['cursor'], limit=2)
+        self.assertEqual((last['highlights'], last['cursor']), ([], second['cursor']))
+
+    def test_upsert_then_delete_collapses_to_one_tombstone(self):
+        start = self.feed()['cursor']
+        kept = self.add_highlight()
+        gone = self.add_highlight(note='Soon gone', page=2)
+        url = f'/api/documents/{self.document.pk}/highlights/{gone}/'
+        self.client.patch(url, {'note': 'Edited'}, format='json')
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        data = self.feed(since=start)
+        self.assertEqual([h['id'] for h in data['highlights']], [kept])
+        self.assertEqual(data['deleted'], [gone])
+
+    def test_document_feed_is_scoped_to_the_document(self):
+        other = self.make_document(self.project, pdf_hash='b' * 64)
+        url = f'/api/documents/{self.document.pk}/highlights/changes/'
+        mine = self.add_highlight()
+        self.add_highlight(document=other)
+        data = self.feed(url, since=0)
+        self.assertEqual([h['id'] for h in data['highlights']], [mine])
+        self.assertEqual(data['cursor'], HighlightChange.objects.filter(document_id=self.document.pk).latest('id').pk)
+
+    def test_invalid_parameters(self):
+        for params in ({'since': 'x'}, {'since': 0, 'limit': 'many'}):
+            self.assertEqual(self.client.get(self.URL, params).status_code, 400)
+
+    def test_record_moved_logs_every_highlight(self):
+        from . import changes
+        other = self.make_document(self.project, pdf_hash='b' * 64)
+        ids = [self.add_highlight(page=page) for page in (1, 2)] + [self.add_highlight(document=other)]
+        HighlightChange.objects.all().delete()
+        before = timezone.now()
+        with self.assertNumQueries(0):
+            changes.record_moved(self.user.pk, [])
+        changes.record_moved(self.user.pk, [self.document.pk, other.pk])
+        rows = list(HighlightChange.objects.order_by('id'))
+        self.assertEqual(
+            [(r.user_id, r.document_id, r.highlight_id, r.kind) for r in rows],
+            [(self.user.pk, self.document.pk, ids[0], HighlightChange.UPSERT),
+             (self.user.pk, self.document.pk, ids[1], HighlightChange.UPSERT),
+             (self.user.pk, other.pk, ids[2], HighlightChange.UPSERT)],
+        )
+        # created_at is stored in the column's format, so it reads back as an aware datetime
+        self.assertTrue(all(before <= r.created_at <= timezone.now() for r in rows))
+
+
+class DocumentMoveChangeTests(APITestCase):
+    """Moving documents logs their highlights as changed; the Library rows carry the project."""
+
+    def move(self, target):
+        response = self.client.post('/api/documents/move/', {
+            'document_ids': [self.document.pk], 'project': target.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_saved_search_counts_refresh(self):
+        self.add_highlight()
+        self.add_highlight(text='Second margin', page=2)
+        response = self.client.post('/api/saved-searches/', {
+            'name': 'Research margins', 'query': 'margin', 'projects': [self.project.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['result_count'], 2)
+        self.move(Project.objects.create(user=self.user, name='Archive'))
+        self.assertEqual(self.client.get('/api/saved-searches/').json()[0]['result_count'], 0)
+
+    def test_change_feed_carries_new_project(self):
+        ids = {self.add_highlight(), self.add_highlight(page=2)}
+        cursor = self.client.get('/api/library/changes/').json()['cursor']
+        target = Project.objects.create(user=self.user, name='Archive')
+        self.move(target)
+        data = self.client.get('/api/library/changes/', {'since': cursor}).json()
+        self.assertEqual({h['id'] for h in data['highlights']}, ids)
+        self.assertEqual({h['project_id'] for h in data['highlights']}, {target.pk})
+
+
+class BootstrapTests(APITestCase):
+    """/bootstrap/ ETag: stable between opens, changed by anything in the response."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/documents/{self.document.pk}/bootstrap/'
+        self.highlight = self.add_highlight(note='First note')
+
+    def bootstrap(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, **headers)
+        highlight_reads = [q['sql'] for q in ctx.captured_queries if 'FROM "documents_highlight"' in q['sql']]
+        return response, highlight_reads
+
+    def assertChanges(self, write):
+        response, _ = self.bootstrap()
+        etag = response['ETag']
+        write()
+        response, _ = self.bootstrap(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response.json()
+
+    def test_unchanged_document_is_not_modified(self):
+        first, _ = self.bootstrap()
+        self.assertEqual(first.status_code, 200)
+        second, highlight_reads = self.bootstrap(first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual((second['ETag'], second['X-Highlights-Cursor']), (first['ETag'], first['X-Highlights-Cursor']))
+        self.assertEqual(highlight_reads, [])
+        self.assertEqual(self.bootstrap(f'W/{first["ETag"]}')[0].status_code, 304)
+        # Opening the document again (last_opened_at) does not change it
+        self.assertEqual(self.bootstrap()[0]['ETag'], first['ETag'])
+
+    def test_note_edit(self):
+        data = self.assertChanges(lambda: self.client.patch(
+            f'/api/documents/{self.document.pk}/highlights/{self.highlight}/', {'note': 'Edited'}, format='json',
+        ))
+        self.assertEqual(data['highlights'][0]['note']['content'], 'Edited')
+
+    def test_document_rename(self):
+        data = self.assertChanges(lambda: self.client.patch(
+            f'/api/documents/{self.document.pk}/', {'filename': 'renamed.pdf'}, format='json',
+        ))
+        self.assertEqual(data['document']['filename'], 'renamed.pdf')
+
+    def test_lens_edit(self):
+        lens = self.client.post('/api/lenses/', {'name': 'Mine', 'colors': _colors(2)}, format='json').json()
+        self.client.patch(f'/api/documents/{self.document.pk}/', {'highlight_preset': lens['id']}, format='json')
+        colors = [{**c, 'display_name': f'Renamed {c["key"]}'} for c in _colors(2)]
+        data = self.assertChanges(lambda: self.client.put(
+            f'/api/lenses/{lens["id"]}/', {'name': 'Mine', 'colors': colors}, format='json',
+        ))
+        self.assertEqual(
+            [c['display_name'] for c in data['document']['highlight_preset_detail']['colors']],
+            ['Renamed c0', 'Renamed c1'],
+        )
+
+
+class LibraryCacheTests(APITestCase):
+    """Writes retire the user's cached Library response (library_cache.bump), so its ETag changes."""
+
+    def etag(self):
+        response = self.client.get('/api/library/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response['ETag']
+
+    def assertBumps(self, method, url, data=None, status=200):
+        from . import library_cache
+        before, etag = library_cache.versions(self.user.pk), self.etag()
+        self.assertEqual(self.client.get('/api/library/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status, response.content)
+        self.assertNotEqual(library_cache.versions(self.user.pk), before, url)
+        # A stale ETag is never answered with 304
+        stale = self.client.get('/api/library/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(stale.status_code, 200, url)
+        self.assertNotEqual(stale['ETag'], etag)
+        return response
+
+    def test_highlight_and_note_writes(self):
+        url = f'/api/documents/{self.document.pk}/highlights/'
+        pk = self.assertBumps('post', url, {
+            'page_number': 1, 'position_data': POSITION, 'highlighted_text': 'Margin compression',
+        }, status=201).json()['id']
+        self.assertBumps('patch', f'{url}{pk}/', {'note': 'Check the figures'})
+        self.assertBumps('patch', f'{url}{pk}/', {'note': ''})
+        self.assertBumps('post', f'{url}batch/', {'operations': [{'op': 'update', 'id': pk, 'color': 'green'}]})
+        self.assertBumps('post', f'{url}batch/', {'operations': [{'op': 'note', 'id': pk, 'note': 'Batch note'}]})
+        self.assertBumps('delete', f'{url}{pk}/', status=204)
+
+    def test_document_writes(self):
+        self.add_highlight()
+        self.assertBumps('patch', f'/api/documents/{self.document.pk}/', {'filename': 'renamed.pdf'})
+        target = Project.objects.create(user=self.user, name='Target')
+        payload = {'document_ids': [self.document.pk], 'project': target.pk}
+        self.assertBumps('post', '/api/documents/copy/', payload)
+        Document.objects.filter(project=target).delete()
+        self.assertBumps('post', '/api/documents/move/', payload)
+
+    def test_document_remove(self):
+        self.add_highlight()
+        self.assertBumps('delete', f'/api/documents/{self.document.pk}/', status=204)
+        self.assertBumps('post', f'/api/documents/{self.document.pk}/remove/', status=204)
+        self.assertFalse(Document.objects.filter(pk=self.document.pk).exists())
+
+    def test_project_writes(self):
+        self.add_highlight()
+        self.assertBumps('patch', f'/api/projects/{self.project.pk}/', {'name': 'Renamed'})
+        self.assertBumps('post', '/api/projects/', {'name': 'Another'}, status=201)
+        self.assertBumps('delete', f'/api/projects/{self.project.pk}/', status=204)
+
+    def test_lens_writes(self):
+        self.add_highlight()
+        lens = self.assertBumps('post', '/api/lenses/', {'name': 'Mine', 'colors': _colors(2)}, status=201).json()
+        self.assertBumps('patch', f'/api/documents/{self.document.pk}/', {'highlight_preset': lens['id']})
+        self.assertBumps('put', f'/api/lenses/{lens["id"]}/', {'name': 'Mine', 'colors': _colors(3)})
+        self.assertBumps('post', f'/api/lenses/{lens["id"]}/colors/', {'key': 'added', 'hex': '#34D399'}, status=201)
+
+    def test_gzip_etag(self):
+        self.add_highlight()
+        response = self.client.get('/api/library/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(self.client.get('/api/library/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_highlight(page=2)
+        stale = self.client.get('/api/library/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(stale.status_code, 200)
@@ -6,9 +6,12 @@ router = DefaultRouter()
 router.register(r'projects', views.ProjectViewSet, basename='project')
 router.register(r'lenses', views.HighlightPresetViewSet, basename='lens')
 router.register(r'documents', views.DocumentViewSet, basename='document')
+router.register(r'saved-searches', views.SavedSearchViewSet, basename='saved-search')
 
 urlpatterns = [
     path('library/', views.LibraryView.as_view(), name='library'),
+    path('library/changes/', views.LibraryChangesView.as_view(), name='library-changes'),
+    path('library/terms/', views.LibraryTermsView.as_view(), name='library-terms'),
     path('public/documents/<str:token>/summary/', views.PublicDocumentSummaryView.as_view(), name='public-document-summary'),
     path('public/documents/<str:token>/pdf/', views.PublicDocumentPdfView.as_view(), name='public-document-pdf'),
     path('', include(router.urls)),
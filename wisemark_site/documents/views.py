@@ -1,22 +1,36 @@
+import gzip
 import hashlib
 import logging
+import math
+import re
 import secrets
+from itertools import islice
 
-from django.db.models import Count, Q
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
 
 logger = logging.getLogger(__name__)
 from django.db.models.deletion import ProtectedError
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 from accounts.permissions import HasActivePlanAccess
+from accounts.views import me_payload
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from wisemark_site.renderers import JSONRenderer, NDJSONRenderer
 
-from .models import Project, Document, DocumentColor, Highlight, Note, Color, StorageLocation, HighlightPreset, PresetColor
-from . import s3_storage
+from .models import Project, Document, Highlight, Note, StorageLocation, HighlightPreset, PresetColor, SavedSearch
+from . import aggregates, changes, counters, library_cache, s3_storage, search, sql_json, terms
+from .geometry import BBOX_FIELDS, bbox_fields, normalize_position_data
+from .pagination import keyset_page, keyset_requested
 from rest_framework.views import APIView
 
 from .serializers import (
@@ -26,7 +40,15 @@ from .serializers import (
     HighlightPresetSerializer,
     HighlightPresetWriteSerializer,
     PresetColorSerializer,
-    LibraryHighlightSerializer,
+    SavedSearchSerializer,
+    HIGHLIGHT_ROW_FIELDS,
+    LIBRARY_ROW_FIELDS,
+    NORMALIZED_LIBRARY_ROW_FIELDS,
+    highlight_rows,
+    library_rows,
+    normalized_library_rows,
+    side_loaded_documents,
+    side_loaded_presets,
 )
 
 
@@ -35,6 +57,21 @@ def _compute_pdf_hash(file_bytes):
     return hashlib.sha256(file_bytes).hexdigest().lower()
 
 
+def _packed_rects(request):
+    """?rects=packed: list responses carry position_data rects as base64 int32 (see geometry.pack_rects)."""
+    return request.query_params.get('rects') == 'packed'
+
+
+def _normalized(request):
+    """?shape=normalized: rows carry ids and keys, and what they reference is side-loaded once per response."""
+    shape = request.query_params.get('shape')
+    if shape in (None, '', 'full'):
+        return False
+    if shape != 'normalized':
+        raise ValidationError({'shape': ['shape must be "full" or "normalized".']})
+    return True
+
+
 def _preset_queryset(request):
     """System presets (user=None) plus request.user's presets."""
     return HighlightPreset.objects.filter(
@@ -43,15 +80,187 @@ def _preset_queryset(request):
 
 
 def _highlights_for_api(qs):
-    """select_related / prefetch so HighlightSerializer avoids N+1 on document preset colors."""
-    return qs.select_related('note', 'document__highlight_preset').prefetch_related(
-        'document__highlight_preset__colors'
-    )
+    """Note in the same query; the document's lens id as _preset_id (colours come from the preset registry)."""
+    return qs.select_related('note').annotate(_preset_id=F('document__highlight_preset_id'))
+
+
+def _resolve_highlight_color(preset, color_key):
+    """Return (color_key, display_name) for a new highlight. Keys missing from the lens fall back to its first colour."""
+    if preset is None:
+        return color_key, None
+    return preset.resolve(color_key)
+
+
+# Keyset orderings; each ends with id so the cursor is unique. Backed by composite indexes.
+LIBRARY_ORDERING = ('-created_at', 'id')
+HIGHLIGHT_ORDERING = ('page_number', 'created_at', 'id')
+HIGHLIGHT_POSITION_ORDERING = (
+    'page_number', F('bbox_top').asc(nulls_last=True), F('bbox_left').asc(nulls_last=True), 'id',
+)
+DOCUMENT_ORDERING = ('-updated_at', 'id')
+
+def _page_window(request):
+    """(page_from, page_to) from ?page_from=&page_to= (inclusive, either may be open), or None if not requested."""
+    params = request.query_params
+    if 'page_from' not in params and 'page_to' not in params:
+        return None
+    bounds = []
+    for name in ('page_from', 'page_to'):
+        raw = params.get(name)
+        if raw in (None, ''):
+            bounds.append(None)
+            continue
+        try:
+            bounds.append(int(raw))
+        except (TypeError, ValueError):
+            raise ValidationError({name: [f'{name} must be an integer.']})
+    return tuple(bounds)
+
+
+def _viewport(request):
+    """
+    (page, left, top, right, bottom) from ?viewport=page,left,top,right,bottom in PDF units,
+    or None if not requested. Coordinates must be finite with left <= right and top <= bottom.
+    """
+    raw = request.query_params.get('viewport')
+    if raw in (None, ''):
+        return None
+    parts = raw.split(',')
+    try:
+        if len(parts) != 5:
+            raise ValueError
+        page = int(parts[0])
+        left, top, right, bottom = (float(p) for p in parts[1:])
+        if not all(math.isfinite(v) for v in (left, top, right, bottom)) or left > right or top > bottom:
+            raise ValueError
+    except ValueError:
+        raise ValidationError({'viewport': ['viewport must be page,left,top,right,bottom.']})
+    return page, left, top, right, bottom
+
+
+def _highlight_ordering(request):
+    """Ordering for highlight lists: reading order by default, ?order=position for top-to-bottom within a page."""
+    order = request.query_params.get('order')
+    if order in (None, '', 'created'):
+        return HIGHLIGHT_ORDERING
+    if order != 'position':
+        raise ValidationError({'order': ['order must be "created" or "position".']})
+    if keyset_requested(request):
+        raise ValidationError({'order': ['order=position cannot be combined with cursor pagination.']})
+    return HIGHLIGHT_POSITION_ORDERING
+
+
+def _use_sql_json(request):
+    """Build large lists in SQL (Postgres) when the client negotiated plain JSON."""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and renderer.format == 'json' and sql_json.available()
+
+
+class _RawJSON:
+    """JSON text from the database, spliced into _json_response output as is."""
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _json_response(data, headers=None):
+    """application/json response for data (a list of JSON text, or a dict whose values may be _RawJSON)."""
+    if isinstance(data, _RawJSON):
+        body = data.text
+    else:
+        renderer = JSONRenderer()
+        body = '{%s}' % ','.join(
+            '"%s":%s' % (key, value.text if isinstance(value, _RawJSON) else renderer.render(value).decode())
+            for key, value in data.items()
+        )
+    response = HttpResponse(body.encode(), content_type='application/json')
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def _etag(*parts):
+    """Strong ETag over JSON-serialisable parts."""
+    return quote_etag(hashlib.sha256(JSONRenderer().render(parts)).hexdigest()[:32])
+
+
+def _etag_matches(request, etag):
+    """If-None-Match contains etag (weak or strong, since GZip middleware weakens ETags)."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or etag in (t.removeprefix('W/') for t in tags)
+
+
+CHANGE_CURSOR_HEADER = 'X-Highlights-Cursor'
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+CHANGE_FEED_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 2000  # highlights per database fetch and per flushed block of NDJSON lines
+MAX_CHANGE_FEED_PAGE_SIZE = 2000
+
+
+def _change_feed_response(request, serialize, **scope):
+    """
+    Shared body of the change-feed endpoints. Without ?since, returns only the current
+    cursor (fetch it before doing a full load). serialize(ids) renders upserted highlights.
+    """
+    raw_since = request.query_params.get('since')
+    if raw_since in (None, ''):
+        return Response({
+            'cursor': changes.latest_cursor(**scope),
+            'has_more': False,
+            'highlights': [],
+            'deleted': [],
+        })
+    try:
+        since = int(raw_since)
+        limit = int(request.query_params.get('limit') or CHANGE_FEED_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return Response(
+            {'detail': 'since and limit must be integers.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    limit = max(1, min(limit, MAX_CHANGE_FEED_PAGE_SIZE))
+    upserted, deleted, cursor, has_more = changes.changes_since(max(since, 0), limit, **scope)
+    return Response({
+        'cursor': cursor,
+        'has_more': has_more,
+        'highlights': serialize(upserted) if upserted else [],
+        'deleted': deleted,
+    })
 
 
 MAX_CUSTOM_LENSES = 5
 MAX_OVERALL_LENSES = 5
 MAX_COLORS_PER_LENS = 5
+MAX_BULK_DOCUMENTS = 100
+MAX_BATCH_OPERATIONS = 500
+
+# Document fields carried over when a document is copied into another project.
+# Stored bytes are reused: S3 copies point at the same content-addressed key, and
+# Postgres-stored PDFs are copied inside the database (pdf_file is never loaded).
+_COPIED_DOCUMENT_FIELDS = (
+    'pdf_hash', 'filename', 'color', 'file_size', 'storage_location',
+    's3_key', 'highlight_preset_id', 'color_labels',
+)
+
+
+# Columns each DocumentViewSet detail action reads (the pk is always loaded). Actions not
+# listed (list, retrieve, create, update, bootstrap) load the serializer's full row.
+_DOCUMENT_ACTION_FIELDS = {
+    'destroy': (),
+    'remove': ('deleted_at', 'project__user_id'),
+    'pdf': ('deleted_at', 'storage_location', 'pdf_file', 's3_key', 'pdf_hash'),
+    'upload_pdf': ('deleted_at', 'pdf_hash'),
+    'share': ('public_share_token',),
+    'highlights': ('highlight_preset_id', 'project__user_id'),
+    'update_highlight': (),
+    'batch_highlights': ('highlight_preset_id', 'project__user_id'),
+    'highlight_changes': (),
+    'aggregate_counts': ('highlight_preset_id',),
+}
 
 
 class HighlightPresetViewSet(viewsets.ModelViewSet):
@@ -111,23 +320,23 @@ class HighlightPresetViewSet(viewsets.ModelViewSet):
                 {'hex': ['A valid hex colour (e.g. #FBBF24) is required.']},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        if preset.colors.filter(key=key).exists():
+        existing = preset.colors.aggregate(total=Count('id'), taken=Count('id', filter=Q(key=key)))
+        if existing['taken']:
             return Response(
                 {'key': [f'A colour with key "{key}" already exists in this lens.']},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        if preset.colors.count() >= MAX_COLORS_PER_LENS:
+        if existing['total'] >= MAX_COLORS_PER_LENS:
             return Response(
                 {'detail': f'Lenses are limited to {MAX_COLORS_PER_LENS} colours.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        sort_order = preset.colors.count()
         color = PresetColor.objects.create(
             preset=preset,
             key=key,
             display_name=display_name,
             hex=hex_val,
-            sort_order=sort_order,
+            sort_order=existing['total'],
         )
         return Response(PresetColorSerializer(color).data, status=status.HTTP_201_CREATED)
 
@@ -153,46 +362,46 @@ class ProjectViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, HasActivePlanAccess]
 
     def get_queryset(self):
-        return (
-            Project.objects.filter(user=self.request.user)
-            .annotate(
-                document_count=Count('documents', distinct=True),
-                annotation_count=Count('documents__highlights', distinct=True),
-            )
-        )
+        return Project.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            changes.record_deletes(
+                instance.user_id,
+                Highlight.objects.filter(document__project=instance).values_list('document_id', 'id'),
+            )
+            instance.delete()
+
 
 class DocumentViewSet(viewsets.ModelViewSet):
     serializer_class = DocumentSerializer
     permission_classes = [IsAuthenticated, HasActivePlanAccess]
 
     def get_queryset(self):
-        qs = (
-            Document.objects.filter(project__user=self.request.user)
-            .defer('pdf_file')
-            .select_related('highlight_preset', 'project')
-            .prefetch_related('highlight_preset__colors', 'document_colors__color')
-            .annotate(_annotation_count=Count('highlights'))
-        )
+        qs = Document.objects.filter(project__user=self.request.user)
+        fields = _DOCUMENT_ACTION_FIELDS.get(self.action)
+        if fields is not None:
+            # Detail actions: ownership check plus the columns the action reads, unordered
+            qs = qs.only(*fields)
+            if any('__' in f for f in fields):
+                qs = qs.select_related('project')
+        else:
+            qs = qs.defer('pdf_file').select_related('project').order_by(*DOCUMENT_ORDERING)
         project_id = self.request.query_params.get('project')
         if project_id:
             qs = qs.filter(project_id=project_id)
         return qs
 
     def destroy(self, request, *args, **kwargs):
-        """Soft-delete: keep document row and highlights/notes; clear PDF bytes."""
+        """Soft-delete: keep document row and highlights/notes; clear PDF bytes.
+        The S3 object (if any) is left for `manage.py reconcile_s3`, since other documents may share it."""
         doc = self.get_object()
         doc.deleted_at = timezone.now()
         doc.pdf_file = None
         doc.file_size = 0
-        if doc.storage_location == StorageLocation.S3 and doc.s3_key:
-            try:
-                s3_storage.delete_pdf(doc.s3_key)
-            except Exception:
-                pass
         doc.storage_location = StorageLocation.POSTGRES
         doc.s3_key = None
         doc.save(update_fields=['deleted_at', 'pdf_file', 'file_size', 'storage_location', 's3_key'])
@@ -207,9 +416,220 @@ class DocumentViewSet(viewsets.ModelViewSet):
                 {'detail': 'Only removed PDFs can be permanently removed. Delete the document first.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        doc.delete()
+        with transaction.atomic():
+            counters.documents_leaving(
+                Document.objects.select_for_update().filter(pk=doc.pk).only('project_id', 'annotation_count')
+            )
+            changes.record_deletes(request.user.pk, doc.highlights.values_list('document_id', 'id'))
+            doc.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def _bulk_target(self, request):
+        """Validate a move/copy payload. Returns (target project, requested ids, error response)."""
+        raw_ids = request.data.get('document_ids')
+        if not isinstance(raw_ids, list) or not raw_ids:
+            return None, None, Response(
+                {'document_ids': ['A non-empty list of document ids is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(raw_ids) > MAX_BULK_DOCUMENTS:
+            return None, None, Response(
+                {'document_ids': [f'At most {MAX_BULK_DOCUMENTS} documents can be processed at once.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            if any(isinstance(pk, bool) for pk in raw_ids):
+                raise TypeError
+            document_ids = list(dict.fromkeys(int(pk) for pk in raw_ids))
+        except (TypeError, ValueError):
+            return None, None, Response(
+                {'document_ids': ['Document ids must be integers.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        project_id = request.data.get('project')
+        try:
+            if isinstance(project_id, bool):
+                raise TypeError
+            project_id = int(project_id) if project_id not in (None, '') else None
+        except (TypeError, ValueError):
+            return None, None, Response(
+                {'project': ['Project id must be an integer.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        project = None
+        if project_id:
+            project = Project.objects.filter(user=request.user, pk=project_id).first()
+        if not project:
+            return None, None, Response(
+                {'project': ['Project not found.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return project, document_ids, None
+
+    @action(detail=False, methods=['post'], url_path='move')
+    def move(self, request):
+        """Move documents (with their highlights and notes) into another project. No PDF bytes are transferred."""
+        project, document_ids, error = self._bulk_target(request)
+        if error:
+            return error
+        docs = {
+            d.pk: d for d in
+            Document.objects.filter(project__user=request.user, pk__in=document_ids)
+            .only('id', 'project_id', 'pdf_hash')
+        }
+        taken = set(
+            Document.objects.filter(project=project, pdf_hash__in=[d.pdf_hash for d in docs.values()])
+            .values_list('pdf_hash', flat=True)
+        )
+        results = []
+        to_move = []
+        for pk in document_ids:
+            doc = docs.get(pk)
+            if not doc:
+                results.append({'id': pk, 'status': 'not_found'})
+            elif doc.project_id == project.pk:
+                results.append({'id': pk, 'status': 'skipped', 'detail': 'Already in this project.'})
+            elif doc.pdf_hash in taken:
+                results.append({'id': pk, 'status': 'conflict', 'detail': 'This PDF is already in the target project.'})
+            else:
+                taken.add(doc.pdf_hash)
+                to_move.append(pk)
+                results.append({'id': pk, 'status': 'moved', 'document': pk})
+        if to_move:
+            try:
+                with transaction.atomic():
+                    moving = list(
+                        Document.objects.select_for_update().filter(pk__in=to_move)
+                        .only('project_id', 'annotation_count')
+                    )
+                    counters.documents_leaving(moving)
+                    Document.objects.filter(pk__in=to_move).update(project=project, updated_at=timezone.now())
+                    # Keep the denormalised owner in step (a no-op while moves stay within one account)
+                    Highlight.objects.filter(document_id__in=to_move).exclude(user_id=project.user_id).update(
+                        user_id=project.user_id
+                    )
+                    counters.documents_arrived(project.pk, moving)
+                    changes.record_moved(project.user_id, to_move)
+            except IntegrityError:
+                return Response(
+                    {'detail': 'The target project changed while moving. Please try again.'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+        return Response({'project': project.pk, 'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='copy')
+    def copy(self, request):
+        """Copy documents into another project, reusing stored PDF bytes. Highlights and notes are copied unless include_highlights is false."""
+        project, document_ids, error = self._bulk_target(request)
+        if error:
+            return error
+        include_highlights = request.data.get('include_highlights', True) not in (False, 'false', '0', 0)
+        docs = {
+            d.pk: d for d in
+            Document.objects.filter(project__user=request.user, pk__in=document_ids)
+            .only('id', 'deleted_at', *_COPIED_DOCUMENT_FIELDS)
+        }
+        taken = set(
+            Document.objects.filter(project=project, pdf_hash__in=[d.pdf_hash for d in docs.values()])
+            .values_list('pdf_hash', flat=True)
+        )
+        results = []
+        sources = []
+        for pk in document_ids:
+            doc = docs.get(pk)
+            if not doc:
+                results.append({'id': pk, 'status': 'not_found'})
+            elif doc.deleted_at:
+                results.append({'id': pk, 'status': 'skipped', 'detail': 'Removed PDFs cannot be copied.'})
+            elif doc.pdf_hash in taken:
+                results.append({'id': pk, 'status': 'conflict', 'detail': 'This PDF is already in the target project.'})
+            else:
+                taken.add(doc.pdf_hash)
+                sources.append(doc)
+                results.append({'id': pk, 'status': 'copied'})
+        if sources:
+            try:
+                with transaction.atomic():
+                    new_ids = self._copy_documents(sources, project, include_highlights, request.user.pk)
+            except IntegrityError:
+                return Response(
+                    {'detail': 'The target project changed while copying. Please try again.'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            for row in results:
+                if row['status'] == 'copied':
+                    row['document'] = new_ids[row['id']]
+        return Response({'project': project.pk, 'results': results}, status=status.HTTP_200_OK)
+
+    def _copy_documents(self, sources, project, include_highlights, user_id):
+        """Clone document rows (and optionally highlights/notes) with bulk inserts. Returns {source id: new id}."""
+        clones = Document.objects.bulk_create([
+            Document(project=project, **{f: getattr(src, f) for f in _COPIED_DOCUMENT_FIELDS})
+            for src in sources
+        ])
+        new_ids = {src.pk: clone.pk for src, clone in zip(sources, clones)}
+        in_database = [src.pk for src in sources if src.storage_location == StorageLocation.POSTGRES]
+        if in_database:
+            # UPDATE ... SET pdf_file = (SELECT pdf_file FROM source): pdf_hash is unique among the sources
+            Document.objects.filter(pk__in=[new_ids[pk] for pk in in_database]).update(pdf_file=Subquery(
+                Document.objects.filter(pk__in=in_database, pdf_hash=OuterRef('pdf_hash')).values('pdf_file')[:1]
+            ))
+        counters.documents_added(project.pk, len(clones))
+        library_cache.bump(project.user_id)
+        if not include_highlights:
+            return new_ids
+        originals = list(
+            Highlight.objects.filter(document_id__in=new_ids)
+            .select_related('note')
+            .order_by('pk')
+        )
+        copies = Highlight.objects.bulk_create([
+            Highlight(
+                document_id=new_ids[h.document_id],
+                user_id=project.user_id,
+                page_number=h.page_number,
+                position_data=h.position_data,
+                color_id=h.color_id,
+                color_key=h.color_key,
+                color_display_name=h.color_display_name,
+                highlighted_text=h.highlighted_text,
+                **{f: getattr(h, f) for f in BBOX_FIELDS},
+            )
+            for h in originals
+        ])
+        notes = []
+        for original, copy in zip(originals, copies):
+            note = getattr(original, 'note', None)
+            if note is not None:
+                notes.append(Note(highlight=copy, content=note.content))
+        Note.objects.bulk_create(notes)
+        copied = {}
+        for copy in copies:
+            copied[copy.document_id] = copied.get(copy.document_id, 0) + 1
+        counters.highlights_changed(copied)
+        changes.record_upserts(user_id, copies)
+        return new_ids
+
+    def list(self, request, *args, **kwargs):
+        """
+        With ?shape=normalized, documents carry effective_preset (an id) instead of
+        highlight_preset_detail, and the response is {results, presets} with presets keyed by id.
+        """
+        normalized = _normalized(request)
+        paginated = keyset_requested(request)
+        if not paginated and not normalized:
+            return super().list(request, *args, **kwargs)
+        docs = self.filter_queryset(self.get_queryset())
+        if paginated:
+            docs, next_cursor = keyset_page(docs, request, DOCUMENT_ORDERING, ('updated_at',))
+        context = {**self.get_serializer_context(), 'normalized': normalized}
+        data = {'results': self.get_serializer(docs, many=True, context=context).data}
+        if normalized:
+            data['presets'] = side_loaded_presets({d['effective_preset'] for d in data['results']})
+        if paginated:
+            data['next_cursor'] = next_cursor
+        return Response(data)
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         from django.utils import timezone
@@ -217,21 +637,6 @@ class DocumentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
-    def perform_update(self, serializer):
-        instance = serializer.save()
-        # Sync DocumentColor: keys in payload stay (with optional custom_name), others removed
-        if 'color_labels' in self.request.data:
-            raw = self.request.data.get('color_labels')
-            if isinstance(raw, dict):
-                for color in Color.objects.all():
-                    if color.key in raw:
-                        custom_name = (raw.get(color.key) or '').strip() if isinstance(raw.get(color.key), str) else ''
-                        dc, _ = DocumentColor.objects.get_or_create(document=instance, color=color, defaults={'custom_name': ''})
-                        dc.custom_name = custom_name
-                        dc.save()
-                    else:
-                        DocumentColor.objects.filter(document=instance, color=color).delete()
-
     def create(self, request, *args, **kwargs):
         project_id = request.data.get('project')
         uploaded_file = request.FILES.get('file')
@@ -309,14 +714,15 @@ class DocumentViewSet(viewsets.ModelViewSet):
             'color': doc_color or None,
             'file_size': file_size,
             'storage_location': storage_location,
-            'pdf_file': pdf_file,
-            's3_key': s3_key,
         }
         if 'highlight_preset' in request.data:
             data['highlight_preset'] = request.data.get('highlight_preset')
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            # pdf_file / s3_key are not serializer fields; pass them straight to the model
+            serializer.save(pdf_file=pdf_file, s3_key=s3_key)
+            counters.documents_added(project.pk)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'], url_path='pdf')
@@ -405,20 +811,12 @@ class DocumentViewSet(viewsets.ModelViewSet):
         doc = self.get_object()
         if request.method == 'POST':
             page_number = request.data.get('page_number')
-            position_data = request.data.get('position_data') or {}
+            try:
+                position_data = normalize_position_data(request.data.get('position_data') or {})
+            except ValueError as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
             color_key = (request.data.get('color') or 'yellow').strip()
-            preset = doc.get_effective_preset()
-            color_display_name = None
-            if preset:
-                pc = preset.colors.filter(key=color_key).first()
-                if pc:
-                    color_display_name = pc.display_name
-                elif not preset.colors.filter(key=color_key).exists():
-                    color_key = next((c.key for c in preset.colors.all()), 'yellow')
-                    pc = preset.colors.filter(key=color_key).first()
-                    if pc:
-                        color_display_name = pc.display_name
-            legacy_color = Color.objects.filter(key=color_key).first()
+            color_key, color_display_name = _resolve_highlight_color(doc.get_effective_preset(), color_key)
             highlighted_text = (request.data.get('highlighted_text') or '').strip()
             if page_number is None:
                 return Response(
@@ -432,25 +830,118 @@ class DocumentViewSet(viewsets.ModelViewSet):
                     {'detail': 'page_number must be an integer.'},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            highlight = Highlight.objects.create(
-                document=doc,
-                page_number=page_number,
-                position_data=position_data,
-                color=legacy_color,
-                color_key=color_key,
-                color_display_name=color_display_name,
-                highlighted_text=highlighted_text or '',
-            )
             comment = (request.data.get('comment') or '').strip()
-            if comment:
-                Note.objects.create(highlight=highlight, content=comment)
+            with transaction.atomic():
+                highlight = Highlight.objects.create(
+                    document=doc,
+                    user_id=doc.project.user_id,
+                    page_number=page_number,
+                    position_data=position_data,
+                    **bbox_fields(position_data),
+                    color_key=color_key,
+                    color_display_name=color_display_name,
+                    highlighted_text=highlighted_text or '',
+                )
+                if comment:
+                    Note.objects.create(highlight=highlight, content=comment)
+                counters.highlights_changed({doc.pk: 1})
+                changes.record_upserts(request.user.pk, [highlight])
             serializer = HighlightSerializer(
                 _highlights_for_api(Highlight.objects.filter(pk=highlight.pk)).get()
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        highlights = _highlights_for_api(doc.highlights).all()
-        serializer = HighlightSerializer(highlights, many=True)
-        return Response(serializer.data)
+        cursor = changes.latest_cursor(document_id=doc.pk)
+        headers = {CHANGE_CURSOR_HEADER: str(cursor)}
+        packed_rects = _packed_rects(request)
+        ordering = _highlight_ordering(request)
+        qs = doc.highlights.all()
+        viewport = _viewport(request)
+        if viewport is not None:
+            page, left, top, right, bottom = viewport
+            qs = qs.filter(
+                page_number=page,
+                bbox_top__lte=bottom, bbox_bottom__gte=top,
+                bbox_left__lte=right, bbox_right__gte=left,
+            )
+        page_window = _page_window(request)
+        if page_window is not None or keyset_requested(request):
+            data = {}
+            if page_window is not None:
+                page_from, page_to = page_window
+                if page_from is not None:
+                    qs = qs.filter(page_number__gte=page_from)
+                if page_to is not None:
+                    qs = qs.filter(page_number__lte=page_to)
+                # Counts for every page, so the client knows where to lazily load overlays
+                data['page_counts'] = dict(
+                    doc.highlights.order_by().values_list('page_number')
+                    .annotate(n=Count('id')).values_list('page_number', 'n')
+                )
+            rows = qs.values(*HIGHLIGHT_ROW_FIELDS)
+            if keyset_requested(request):
+                rows, next_cursor = keyset_page(rows, request, ordering, ('created_at',))
+            else:
+                rows, next_cursor = rows.order_by(*ordering), None
+            data['results'] = highlight_rows(rows, packed_rects)
+            data['next_cursor'] = next_cursor
+            return Response(data, headers=headers)
+        if not packed_rects and _use_sql_json(request):
+            text, _ = sql_json.highlights_json(qs, ordering)
+            return _json_response(_RawJSON(text), headers=headers)
+        rows = qs.order_by(*ordering).values(*HIGHLIGHT_ROW_FIELDS)
+        return Response(highlight_rows(rows, packed_rects), headers=headers)
+
+    @action(detail=True, methods=['get'], url_path='bootstrap')
+    def bootstrap(self, request, pk=None):
+        """
+        Everything the viewer and summary pages need in one response: the document (with its
+        effective lens in highlight_preset_detail), its highlights with notes, the change-feed
+        cursor and the /auth/me/ payload with billing flags. Send If-None-Match to get 304
+        when none of these changed; the highlights query is skipped in that case.
+        """
+        doc = get_object_or_404(
+            Document.objects.filter(project__user=request.user).defer('pdf_file'),
+            pk=pk,
+        )
+        self.check_object_permissions(request, doc)
+        Document.objects.filter(pk=doc.pk).update(last_opened_at=timezone.now())
+        document = self.get_serializer(doc).data
+        # Changes on every open; left out so the ETag stays stable between opens
+        document.pop('last_opened_at', None)
+        cursor = changes.latest_cursor(document_id=doc.pk)
+        account = me_payload(request.user)
+        packed_rects = _packed_rects(request)
+        etag = _etag(document, cursor, account, packed_rects)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache', CHANGE_CURSOR_HEADER: str(cursor)}
+        if _etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            for name, value in headers.items():
+                response[name] = value
+            return response
+        data = {'document': document, 'cursor': cursor, 'account': account}
+        if not packed_rects and _use_sql_json(request):
+            text, _ = sql_json.highlights_json(doc.highlights.all(), HIGHLIGHT_ORDERING)
+            return _json_response({**data, 'highlights': _RawJSON(text)}, headers=headers)
+        rows = doc.highlights.order_by(*HIGHLIGHT_ORDERING).values(*HIGHLIGHT_ROW_FIELDS)
+        data['highlights'] = highlight_rows(rows, packed_rects)
+        return Response(data, headers=headers)
+
+    @action(detail=True, methods=['get'], url_path='highlights/changes')
+    def highlight_changes(self, request, pk=None):
+        """Highlights created/updated since ?since=<cursor>, plus ids deleted since then."""
+        doc = self.get_object()
+        return _change_feed_response(
+            request,
+            lambda ids: highlight_rows(
+                doc.highlights.filter(pk__in=ids).values(*HIGHLIGHT_ROW_FIELDS), _packed_rects(request)
+            ),
+            document_id=doc.pk,
+        )
+
+    @action(detail=True, methods=['get'], url_path='aggregates')
+    def aggregate_counts(self, request, pk=None):
+        """Highlight counts per colour and page, note count and last activity (no highlight bodies)."""
+        return Response(aggregates.document_aggregates(self.get_object()))
 
     @action(detail=True, methods=['patch', 'delete'], url_path=r'highlights/(?P<highlight_pk>[^/.]+)')
     def update_highlight(self, request, pk=None, highlight_pk=None):
@@ -459,80 +950,401 @@ class DocumentViewSet(viewsets.ModelViewSet):
         if not highlight:
             return Response({'detail': 'Highlight not found.'}, status=status.HTTP_404_NOT_FOUND)
         if request.method == 'DELETE':
-            highlight.delete()
+            with transaction.atomic():
+                _, removed = Highlight.objects.filter(pk=highlight.pk).delete()
+                counters.highlights_changed({doc.pk: -removed.get(Highlight._meta.label, 0)})
+                changes.record_deletes(request.user.pk, [(doc.pk, highlight.pk)])
             return Response(status=status.HTTP_204_NO_CONTENT)
         note_content = request.data.get('note') if 'note' in request.data else request.data.get('comment')
         if note_content is not None:
             note_content = (note_content or '').strip()
-            try:
-                note = highlight.note
-                if note_content:
-                    note.content = note_content
-                    note.save()
-                else:
-                    note.delete()
-            except Note.DoesNotExist:
-                if note_content:
-                    Note.objects.create(highlight=highlight, content=note_content)
+            with transaction.atomic():
+                try:
+                    note = highlight.note
+                    if note_content:
+                        note.content = note_content
+                        note.save()
+                    else:
+                        note.delete()
+                except Note.DoesNotExist:
+                    if note_content:
+                        Note.objects.create(highlight=highlight, content=note_content)
+                changes.record_upserts(request.user.pk, [highlight])
         fresh = _highlights_for_api(doc.highlights).filter(pk=highlight.pk).first()
         serializer = HighlightSerializer(fresh)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['post'], url_path='highlights/batch')
+    def batch_highlights(self, request, pk=None):
+        """
+        Apply an ordered list of highlight operations to this document in one transaction.
+
+        Each operation is one of:
+          {"op": "create", "page_number", "position_data", "color", "highlighted_text", "comment"}
+          {"op": "update", "id", "color"?, "note"?}
+          {"op": "note", "id", "note"}          (empty note removes it)
+          {"op": "delete", "id"}
+        Returns the created/updated highlights (in operation order) and the deleted ids.
+        Nothing is written if any operation is invalid. At most MAX_BATCH_OPERATIONS creates,
+        updates and notes per request; deletes are not capped (they run as one DELETE), so a
+        lens switch or bulk delete can clear a document of any size in one transaction.
+        """
+        doc = self.get_object()
+        operations = request.data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return Response(
+                {'operations': ['A non-empty list of operations is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if sum(1 for op in operations if not isinstance(op, dict) or op.get('op') != 'delete') > MAX_BATCH_OPERATIONS:
+            return Response(
+                {'operations': [f'At most {MAX_BATCH_OPERATIONS} create, update or note operations can be sent at once.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        def invalid(index, message):
+            return Response(
+                {'detail': f'Operation {index}: {message}', 'operation': index},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        referenced = set()
+        for i, op in enumerate(operations):
+            if not isinstance(op, dict) or op.get('op') not in ('create', 'update', 'note', 'delete'):
+                return invalid(i, 'op must be one of create, update, note, delete.')
+            if op['op'] != 'create':
+                try:
+                    referenced.add(int(op.get('id')))
+                except (TypeError, ValueError):
+                    return invalid(i, 'id must be an integer.')
+
+        existing = {
+            h.pk: h for h in doc.highlights.filter(pk__in=referenced).select_related('note')
+        }
+        preset = doc.get_effective_preset()
+
+        now = timezone.now()
+        created = []       # (Highlight, comment)
+        changed = {}       # pk -> Highlight whose colour changed
+        notes = {}         # pk -> note content ('' = remove) for existing highlights
+        deleted = []
+        affected = []      # Highlight objects in operation order (created or updated)
+        for i, op in enumerate(operations):
+            kind = op['op']
+            if kind == 'create':
+                try:
+                    page_number = int(op.get('page_number'))
+                except (TypeError, ValueError):
+                    return invalid(i, 'page_number must be an integer.')
+                color_key, color_display_name = _resolve_highlight_color(
+                    preset, (op.get('color') or 'yellow').strip()
+                )
+                try:
+                    position_data = normalize_position_data(op.get('position_data') or {})
+                except ValueError as exc:
+                    return invalid(i, str(exc))
+                highlight = Highlight(
+                    document=doc,
+                    user_id=doc.project.user_id,
+                    page_number=page_number,
+                    position_data=position_data,
+                    **bbox_fields(position_data),
+                    color_key=color_key,
+                    color_display_name=color_display_name,
+                    highlighted_text=(op.get('highlighted_text') or '').strip(),
+                )
+                created.append((highlight, (op.get('comment') or '').strip()))
+                affected.append(highlight)
+                continue
+            highlight = existing.get(int(op['id']))
+            if highlight is None or highlight.pk in deleted:
+                return invalid(i, 'Highlight not found.')
+            if kind == 'delete':
+                deleted.append(highlight.pk)
+                changed.pop(highlight.pk, None)
+                notes.pop(highlight.pk, None)
+                continue
+            if kind == 'update' and op.get('color'):
+                highlight.color_key, highlight.color_display_name = _resolve_highlight_color(
+                    preset, str(op['color']).strip()
+                )
+                highlight.color = None  # legacy FK would still name the old colour
+                highlight.updated_at = now
+                changed[highlight.pk] = highlight
+            if kind == 'note' or 'note' in op:
+                notes[highlight.pk] = (op.get('note') or '').strip()
+            if highlight not in affected:
+                affected.append(highlight)
+
+        with transaction.atomic():
+            removed = {}
+            if deleted:
+                _, removed = Highlight.objects.filter(pk__in=deleted).delete()
+            if created:
+                Highlight.objects.bulk_create([h for h, _ in created])
+            counters.highlights_changed({doc.pk: len(created) - removed.get(Highlight._meta.label, 0)})
+            if changed:
+                Highlight.objects.bulk_update(
+                    list(changed.values()), ['color', 'color_key', 'color_display_name', 'updated_at']
+                )
+            new_notes = [Note(highlight=h, content=comment) for h, comment in created if comment]
+            updated_notes = []
+            removed_notes = []
+            for highlight_pk, content in notes.items():
+                note = getattr(existing[highlight_pk], 'note', None)
+                if note is None:
+                    if content:
+                        new_notes.append(Note(highlight=existing[highlight_pk], content=content))
+                elif content:
+                    note.content = content
+                    note.updated_at = now
+                    updated_notes.append(note)
+                else:
+                    removed_notes.append(note.pk)
+            if removed_notes:
+                Note.objects.filter(pk__in=removed_notes).delete()
+            if updated_notes:
+                Note.objects.bulk_update(updated_notes, ['content', 'updated_at'])
+            if new_notes:
+                Note.objects.bulk_create(new_notes)
+            changes.record_deletes(request.user.pk, [(doc.pk, pk) for pk in deleted])
+            changes.record_upserts(request.user.pk, [h for h in affected if h.pk not in deleted])
+
+        affected_ids = [h.pk for h in affected if h.pk not in deleted]
+        fresh = {
+            h.pk: h for h in _highlights_for_api(doc.highlights.filter(pk__in=affected_ids))
+        }
+        return Response(
+            {
+                'highlights': HighlightSerializer([fresh[pk] for pk in affected_ids if pk in fresh], many=True).data,
+                'deleted': deleted,
+            },
+            status=status.HTTP_200_OK,
+        )
+
 
 class LibraryView(APIView):
-    """Return all highlights for the user across all documents, with document/project context."""
+    """
+    Return all highlights for the user across all documents, with document/project context.
+    With search parameters (see documents/search.py) return one ranked page of matches instead.
+    The full JSON response is cached per user (see documents/library_cache.py) and carries an
+    ETag; send If-None-Match to get 304 while nothing in it changed.
+
+    ?shape=normalized (full or paginated responses) returns rows with ids and keys only, plus
+    documents, projects and presets maps keyed by id (see serializers.normalized_library_rows).
+
+    Accept: application/x-ndjson (or ?stream=1) streams the full Library instead: a first line
+    {"projects": [...], "total_highlights": n} (n from the stored project counters), then one
+    highlight per line, read from the database in chunks so worker memory does not grow with
+    the library.
+    """
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
 
     def get(self, request):
+        normalized = _normalized(request)
+        if search.search_requested(request):
+            if normalized:
+                raise ValidationError({'shape': ['shape=normalized is not available for search results.']})
+            return self._search(request)
+        if request.accepted_renderer.format == 'ndjson' or request.query_params.get('stream') in ('1', 'true'):
+            if normalized:
+                raise ValidationError({'shape': ['shape=normalized cannot be combined with streaming.']})
+            return self._stream(request)
+        paginated = keyset_requested(request)
+        if not paginated and request.accepted_renderer.format == 'json':
+            return self._cached(request, normalized)
+        cursor = changes.latest_cursor(user_id=request.user.pk)
         # Single query: highlights with document, project, note (avoids N+1 on these)
-        highlights = list(
-            Highlight.objects
-            .filter(document__project__user=request.user)
-            .select_related('document__project', 'note')
-            .order_by('-created_at')
+        qs = Highlight.objects.filter(user=request.user)
+        fields = NORMALIZED_LIBRARY_ROW_FIELDS if normalized else LIBRARY_ROW_FIELDS
+        next_cursor = None
+        if paginated:
+            highlights, next_cursor = keyset_page(
+                qs.values(*fields), request, LIBRARY_ORDERING, ('created_at',)
+            )
+        else:
+            highlights = list(qs.order_by(*LIBRARY_ORDERING).values(*fields))
+        projects = self._projects(request)
+        data = self._data(request, highlights, projects, normalized)
+        data['total_highlights'] = len(highlights)
+        if paginated:
+            data['total_highlights'] = sum(p['annotation_count'] for p in projects)
+            data['next_cursor'] = next_cursor
+        return Response(data, headers={CHANGE_CURSOR_HEADER: str(cursor)})
+
+    def _projects(self, request):
+        return list(
+            Project.objects.filter(user=request.user)
+            .values('id', 'name', 'color', 'document_count', 'annotation_count')
         )
 
-        # Batch-fetch all presets (with colors) in 1–2 queries instead of 1 per unique preset
-        preset_ids = set()
-        need_system = False
-        for h in highlights:
-            pid = h.document.highlight_preset_id
-            if pid:
-                preset_ids.add(pid)
+    def _data(self, request, rows, projects, normalized):
+        """Response body for .values() rows (without total_highlights) in the requested shape."""
+        if not normalized:
+            return {'highlights': library_rows(rows), 'projects': projects}
+        highlights = normalized_library_rows(rows)
+        documents = side_loaded_documents(request.user, {h['document_id'] for h in highlights})
+        return {
+            'highlights': highlights,
+            'documents': documents,
+            'projects': {p['id']: p for p in projects},
+            'presets': side_loaded_presets({d['effective_preset'] for d in documents.values()}),
+        }
+
+    def _cached(self, request, normalized):
+        """
+        The full Library as JSON from library_cache, rendered on a miss. The cached gzip body
+        is sent as is to clients that accept gzip.
+        """
+        user_id = request.user.pk
+        shape = 'normalized' if normalized else 'full'
+        current = library_cache.versions(user_id)
+        etag = _etag('library', shape, current)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if _etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            body = None
+            entry = library_cache.get(user_id, shape, current)
+            if entry is None:
+                cursor, body = self._render_json(request, normalized)
+                compressed = library_cache.put(user_id, shape, current, cursor, body)
             else:
-                need_system = True
+                cursor, compressed = entry
+            headers[CHANGE_CURSOR_HEADER] = str(cursor)
+            if _ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+                response = HttpResponse(compressed, content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+                # Another byte encoding of the same JSON
+                headers['ETag'] = f'W/{etag}'
+            else:
+                response = HttpResponse(body or gzip.decompress(compressed), content_type='application/json')
+        for name, value in headers.items():
+            response[name] = value
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
 
-        preset_map = {}
-        if preset_ids:
-            for p in HighlightPreset.objects.filter(pk__in=preset_ids).prefetch_related('colors'):
-                preset_map[p.id] = p
-        if need_system:
-            sp = HighlightPreset.objects.filter(user__isnull=True).prefetch_related('colors').order_by('name').first()
-            if sp:
-                preset_map['_system'] = sp
+    def _stream(self, request):
+        cursor = changes.latest_cursor(user_id=request.user.pk)
+        projects = self._projects(request)
+        qs = Highlight.objects.filter(user=request.user)
 
-        for h in highlights:
-            pid = h.document.highlight_preset_id
-            h._preset = preset_map.get(pid) or preset_map.get('_system')
+        def chunks():
+            if sql_json.available():
+                for texts in sql_json.library_json_lines(qs, LIBRARY_ORDERING, STREAM_CHUNK_SIZE):
+                    yield ''.join(f'{text}\n' for text in texts).encode()
+                return
+            renderer = JSONRenderer()
+            rows = qs.order_by(*LIBRARY_ORDERING).values(*LIBRARY_ROW_FIELDS).iterator(chunk_size=STREAM_CHUNK_SIZE)
+            while chunk := list(islice(rows, STREAM_CHUNK_SIZE)):
+                yield b''.join(renderer.render(row) + b'\n' for row in library_rows(chunk))
 
-        serializer = LibraryHighlightSerializer(highlights, many=True)
+        def lines():
+            total = sum(p['annotation_count'] for p in projects)
+            yield JSONRenderer().render({'projects': projects, 'total_highlights': total}) + b'\n'
+            yield from chunks()
 
-        projects = list(
-            Project.objects.filter(user=request.user)
-            .annotate(
-                document_count=Count('documents', distinct=True),
-                annotation_count=Count('documents__highlights', distinct=True),
-            )
-            .values('id', 'name', 'color', 'document_count', 'annotation_count')
-        )
+        response = StreamingHttpResponse(lines(), content_type=NDJSONRenderer.media_type)
+        response[CHANGE_CURSOR_HEADER] = str(cursor)
+        return response
+
+    def _render_json(self, request, normalized):
+        """(change cursor, JSON bytes) of the full Library."""
+        cursor = changes.latest_cursor(user_id=request.user.pk)
+        qs = Highlight.objects.filter(user=request.user)
+        if not normalized and sql_json.available():
+            text, count = sql_json.library_json(qs, LIBRARY_ORDERING)
+            data = {'highlights': _RawJSON(text), 'projects': self._projects(request)}
+        else:
+            fields = NORMALIZED_LIBRARY_ROW_FIELDS if normalized else LIBRARY_ROW_FIELDS
+            rows = list(qs.order_by(*LIBRARY_ORDERING).values(*fields))
+            data = self._data(request, rows, self._projects(request), normalized)
+            count = len(rows)
+        data['total_highlights'] = count
+        return cursor, _json_response(data).content
+
+    def _search(self, request):
+        """
+        ?q= (full text over highlight text and notes), ?color=, ?project=, ?document= (comma
+        lists), ?created_after= / ?created_before= (ISO dates, inclusive, or datetimes), ?page=,
+        ?page_size=. Results are ranked when q is given, newest first otherwise; facets count
+        matches per colour and per project.
+        """
+        params = search.parse_params(request)
+        data = search.library_search(Highlight.objects.filter(user=request.user), params, LIBRARY_ORDERING)
+        data['projects'] = self._projects(request)
+        return Response(data)
 
+
+class LibraryTermsView(APIView):
+    """Completions for the Library search box: ?prefix= (the last word is completed), ?limit=."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        prefix = request.query_params.get('prefix') or ''
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'limit': ['Must be an integer.']}, status=status.HTTP_400_BAD_REQUEST)
         return Response({
-            'highlights': serializer.data,
-            'projects': projects,
-            'total_highlights': len(highlights),
+            'prefix': prefix,
+            'terms': terms.completions(request.user.pk, prefix, max(limit, 1)),
         })
 
 
+class SavedSearchViewSet(viewsets.ModelViewSet):
+    """Saved Library searches. Result counts are stored and only recounted after the user's highlights change."""
+    serializer_class = SavedSearchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        searches = search.refresh_saved(request.user.pk, self.get_queryset())
+        return Response(self.get_serializer(searches, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        search.refresh_saved(request.user.pk, [instance])
+        return Response(self.get_serializer(instance).data)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        key = (data.get('query', ''), data.get('colors', []), data.get('projects', []))
+        with transaction.atomic():
+            # Saving the same search again replaces it under the new name
+            same = [s.pk for s in self.get_queryset() if (s.query, s.colors, s.projects) == key]
+            if same:
+                SavedSearch.objects.filter(pk__in=same).delete()
+            instance = serializer.save(user=self.request.user)
+        search.refresh_saved(self.request.user.pk, [instance])
+
+    def perform_update(self, serializer):
+        if {'query', 'colors', 'projects'} & set(serializer.validated_data):
+            instance = serializer.save(count_cursor=None)
+        else:
+            instance = serializer.save()
+        search.refresh_saved(self.request.user.pk, [instance])
+
+
+class LibraryChangesView(APIView):
+    """Library highlights created/updated since ?since=<cursor>, plus ids deleted since then."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        def serialize(ids):
+            return library_rows(
+                Highlight.objects
+                .filter(pk__in=ids, user=request.user)
+                .order_by('-created_at')
+                .values(*LIBRARY_ROW_FIELDS)
+            )
+
+        return _change_feed_response(request, serialize, user_id=request.user.pk)
+
+
 class PublicDocumentSummaryView(APIView):
     """Public, read-only view of a shared document and its highlights, addressed by opaque token."""
 
@@ -542,16 +1354,19 @@ class PublicDocumentSummaryView(APIView):
         token = (token or '').strip()
         doc = (
             Document.objects.filter(public_share_token=token, deleted_at__isnull=True)
-            .select_related('highlight_preset', 'project')
-            .prefetch_related('highlight_preset__colors', 'document_colors__color')
+            .select_related('project')
             .defer('pdf_file')
             .first()
         )
         if not doc:
             return Response({'detail': 'Public document not found.'}, status=status.HTTP_404_NOT_FOUND)
         serializer = DocumentSerializer(doc, context={'request': request})
-        highlights = _highlights_for_api(doc.highlights).all()
-        highlights_data = HighlightSerializer(highlights, many=True).data
+        if _use_sql_json(request):
+            text, _ = sql_json.highlights_json(doc.highlights.all(), HIGHLIGHT_ORDERING)
+            return _json_response({'document': serializer.data, 'highlights': _RawJSON(text)})
+        highlights_data = highlight_rows(
+            doc.highlights.order_by(*HIGHLIGHT_ORDERING).values(*HIGHLIGHT_ROW_FIELDS)
+        )
         return Response(
             {
                 'document': serializer.data,
@@ -0,0 +1,125 @@
+"""
+API renderers and parsers.
+
+JSONRenderer / JSONParser are drop-in replacements for DRF's that encode and decode
+with orjson when it is installed. Output matches DRF's compact JSON: datetimes, dates,
+decimals, UUIDs and lazy strings go through DRF's JSONEncoder, so values are spelled
+the same; the one byte-level difference is float exponents (1e16 rather than 1e+16),
+which decode to the same value. Anything orjson cannot encode (an indent request, integers over 64 bits)
+falls back to the stdlib path.
+
+MessagePackRenderer serves application/msgpack (or ?format=msgpack) when msgpack is
+installed; settings only registers it in that case. Dict keys are spelled as JSON
+spells them (page_counts' int keys become strings), so both formats decode to the same
+payload and msgpack readers with strict map keys (the default) accept it.
+
+NDJSONRenderer (application/x-ndjson) is opted into by views that stream; they write the
+lines themselves and the renderer only covers their non-streamed responses (errors).
+
+Measure: python manage.py benchmark_api --suite renderers
+"""
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+# Dicts such as page_counts have int keys; datetimes go to DRF's encoder (ms precision, 'Z')
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF's JSONRenderer, encoded with orjson when available."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None
+            or not api_settings.COMPACT_JSON
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            body = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as DRF: keep the output valid inside <script> JavaScript
+        if b'\xe2\x80\xa8' in body or b'\xe2\x80\xa9' in body:
+            body = body.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return body
+
+
+class JSONParser(parsers.JSONParser):
+    """DRF's JSONParser, decoded with orjson for UTF-8 bodies."""
+
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+def _json_key(key):
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, (int, float)):
+        return json.dumps(key)
+    return str(key)
+
+
+def _with_json_keys(value):
+    """value with every dict key spelled as JSON would spell it."""
+    if isinstance(value, dict):
+        return {_json_key(key): _with_json_keys(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_with_json_keys(item) for item in value]
+    return value
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """Compact binary encoding of the same data the JSON renderer would produce."""
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(_with_json_keys(data), use_bin_type=True, default=_encoder.default)
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """Newline-delimited JSON: one compact JSON value per line."""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return JSONRenderer().render(data) + b'\n'
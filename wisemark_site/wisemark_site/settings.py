@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import importlib.util
 import os
 from pathlib import Path
 
@@ -85,7 +86,19 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    # orjson-backed JSON (same output as DRF's); MessagePack for Accept: application/msgpack
+    'DEFAULT_RENDERER_CLASSES': [
+        'wisemark_site.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'wisemark_site.renderers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+if importlib.util.find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('wisemark_site.renderers.MessagePackRenderer')
 
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
@@ -165,6 +178,40 @@ else:
         },
     }
 
+# Build the largest highlight list responses in SQL on Postgres (documents/sql_json.py).
+SQL_JSON_LISTS = os.environ.get('SQL_JSON_LISTS', 'True').lower() in ('1', 'true', 'yes')
+
+
+# Cache
+# Must be shared by all gunicorn workers: cache version tokens (documents.presets,
+# documents.library_cache) live here. REDIS_URL set → Redis (needs the redis package).
+# Without it, DEBUG gets a per-process memory cache (fine for runserver) and production
+# uses the database cache table (created by manage.py createcachetable in start.sh), since
+# per-worker or temp-dir caches would serve stale Library data.
+
+_redis_url = (os.environ.get('REDIS_URL') or '').strip()
+
+if _redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _redis_url,
+        },
+    }
+elif DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators